@@ -0,0 +1,94 @@
+"""
+Measure the delivery rate of the insights worker against a local HTTP sink,
+for different batch sizes.
+
+Payloads get logged from the calling thread (as the sync insights manager
+does), and the rate covers the time until the sink has received all of
+them.
+
+Usage::
+
+    python benchmarks/insights_worker.py [--events N] [--parallelism N]
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+from aiohttp import web
+
+from tempo.insights.records import InsightsRecord
+from tempo.insights.worker import start_insights_worker_from_sync
+from tempo.serve.metadata import InsightsTypes
+
+BATCH_SIZES = [1, 10, 100]
+
+
+class _Sink:
+    def __init__(self):
+        self.events = 0
+        self.url = ""
+        self._ready = threading.Event()
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.events += len(body) if isinstance(body, list) else 1
+        return web.Response()
+
+    def start(self):
+        threading.Thread(target=asyncio.run, args=(self._serve(),), daemon=True).start()
+        self._ready.wait()
+
+    async def _serve(self):
+        app = web.Application()
+        app.router.add_post("/", self._handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]  # type: ignore
+        self.url = f"http://127.0.0.1:{port}/"
+        self._ready.set()
+
+        await asyncio.Event().wait()
+
+
+def _bench(sink: _Sink, batch_size: int, args: argparse.Namespace) -> float:
+    queue = start_insights_worker_from_sync(
+        worker_endpoint=sink.url, batch_size=batch_size, parallelism=args.parallelism, window_time=args.window_time
+    )
+    payload = InsightsRecord(request_id="foo", data={"outputs": [1.0] * 10}, insights_type=InsightsTypes.INFER_REQUEST)
+
+    sink.events = 0
+    start = time.perf_counter()
+    for _ in range(args.events):
+        queue.put(payload)
+
+    while sink.events < args.events:
+        time.sleep(0.001)
+
+    return args.events / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--parallelism", type=int, default=1)
+    parser.add_argument("--window-time", type=int, default=10, help="batching window in milliseconds")
+    args = parser.parse_args()
+
+    sink = _Sink()
+    sink.start()
+
+    print(f"{'batch size':>10} {'events/s':>12} {'speedup':>8}")
+    baseline = None
+    for batch_size in BATCH_SIZES:
+        rate = _bench(sink, batch_size, args)
+        if baseline is None:
+            baseline = rate
+
+        print(f"{batch_size:>10} {rate:>12.0f} {rate / baseline:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
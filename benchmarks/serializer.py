@@ -0,0 +1,62 @@
+"""
+Compare the protocol serializers when encoding a request and decoding it back.
+
+The ``json`` baseline matches the previous code path (i.e. ``tolist()``
+followed by the standard library ``json`` module), while ``orjson`` writes the
+arrays straight from their buffers.
+
+Usage::
+
+    python benchmarks/serializer.py [--repeat N]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from tempo.protocols.v2 import V2Protocol
+from tempo.serve.metadata import ModelDataArg, ModelDataArgs
+from tempo.serve.serializer import JSONSerializer, ORJSONSerializer
+
+PAYLOAD_SIZES = {"1KB": 1024, "1MB": 1024 ** 2, "50MB": 50 * 1024 ** 2}
+SERIALIZERS = {"json": JSONSerializer(), "orjson": ORJSONSerializer()}
+
+
+def _roundtrip(protocol: V2Protocol, payload: np.ndarray, tys: ModelDataArgs):
+    body = protocol.encode_request(payload)
+    request = protocol.serializer.loads(body)
+    protocol.from_protocol_request(request, tys)
+    return len(body)
+
+
+def _bench(protocol: V2Protocol, payload: np.ndarray, repeat: int):
+    tys = ModelDataArgs(args=[ModelDataArg(ty=np.ndarray)])
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body_size = _roundtrip(protocol, payload, tys)
+        timings.append(time.perf_counter() - start)
+
+    return min(timings), body_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'payload':>8} {'serializer':>10} {'body size':>12} {'best (ms)':>12} {'speedup':>8}")
+    for size_name, size in PAYLOAD_SIZES.items():
+        payload = np.random.randn(size // 8)
+        baseline = None
+        for serializer_name, serializer in SERIALIZERS.items():
+            protocol = V2Protocol(serializer=serializer)
+            best, body_size = _bench(protocol, payload, args.repeat)
+            if baseline is None:
+                baseline = best
+
+            print(f"{size_name:>8} {serializer_name:>10} {body_size:>12} {best * 1000:>12.2f} {baseline / best:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Measure the throughput of the Redis state backend against the number of
+nodes its keys get sharded across.
+
+By default, each node is a local stand-in which, like a Redis server,
+serves one command at a time (taking ``--service-us`` each) after a network
+round trip of ``--rtt-us``.
+Both are simulated by sleeping, so that the GIL doesn't serialise nodes.
+Real Redis instances can be used instead by passing their addresses.
+
+Usage::
+
+    python benchmarks/state_sharding.py [--clients N] [--ops N]
+    python benchmarks/state_sharding.py --nodes localhost:7000,localhost:7001,...
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional
+
+from tempo.serve.metadata import StateOptions, StateTypes
+from tempo.state.sharding import ShardedRedis
+from tempo.state.state import RedisState
+
+
+class _StandInNode:
+    def __init__(self, rtt: float, service_time: float):
+        self._rtt = rtt
+        self._service_time = service_time
+        self._lock = threading.Lock()
+        self._values: dict = {}
+
+    def _serve(self) -> None:
+        time.sleep(self._rtt)
+        with self._lock:
+            time.sleep(self._service_time)
+
+    def set(self, key: str, value: Any, px: Optional[int] = None) -> bool:
+        self._serve()
+        self._values[key] = value
+        return True
+
+    def get(self, key: str) -> Any:
+        self._serve()
+        return self._values.get(key)
+
+
+def _create_state(names: List[str], args: argparse.Namespace) -> RedisState:
+    state = RedisState(StateOptions(state_type=StateTypes.REDIS, key_prefix="bench-", nodes=names))
+    if not args.nodes:
+        clients = [_StandInNode(args.rtt_us / 1e6, args.service_us / 1e6) for _ in names]
+        state._internal_state = ShardedRedis(names, clients=clients)  # type: ignore
+
+    return state
+
+
+def _bench(state: RedisState, args: argparse.Namespace) -> float:
+    def _run(client: int):
+        for idx in range(args.ops):
+            key = f"key-{client}-{idx % 100}"
+            if idx % 4 == 0:
+                state.set(key, "x")
+            else:
+                state.get(key)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as executor:
+        list(executor.map(_run, range(args.clients)))
+
+    return args.clients * args.ops / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=str, default="", help="comma-separated host:port of Redis nodes")
+    parser.add_argument("--max-nodes", type=int, default=8, help="number of stand-in nodes to go up to")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--ops", type=int, default=500, help="operations per client")
+    parser.add_argument("--rtt-us", type=float, default=100)
+    parser.add_argument("--service-us", type=float, default=200)
+    args = parser.parse_args()
+
+    names = args.nodes.split(",") if args.nodes else [f"stand-in-{idx}:6379" for idx in range(args.max_nodes)]
+    node_counts = [count for count in (1, 2, 4, 8, 16) if count < len(names)] + [len(names)]
+
+    print(f"{'nodes':>6} {'ops/s':>12} {'speedup':>8}")
+    baseline = None
+    for count in node_counts:
+        throughput = _bench(_create_state(names[:count], args), args)
+        if baseline is None:
+            baseline = throughput
+
+        print(f"{count:>6} {throughput:>12.0f} {throughput / baseline:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
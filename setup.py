@@ -56,7 +56,8 @@ setup(
         "mlserver",
         "janus",
         "aiohttp",
-        "redis",
+        "redis>=4.2.0",
+        "orjson",
     ],
     tests_require=["pytest", "pytest-cov", "pytest-xdist", "pytest-lazy-fixture"],
     zip_safe=False,
@@ -1,9 +1,12 @@
 from inspect import iscoroutinefunction
-from typing import Any, Dict
+from typing import Any, Dict, Tuple
 
 import aiohttp
 
-from tempo.serve.base import ModelSpec
+from tempo.protocols.v2 import BinaryContentType, InferenceHeaderContentLength, V2Protocol
+from tempo.serve.base import CallPlan, ModelSpec
+from tempo.serve.batching import AsyncBatcher
+from tempo.serve.metadata import ClientTransport
 
 from ..errors import InvalidUserFunction, UndefinedCustomImplementation
 
@@ -19,34 +22,91 @@ class _AsyncMixin:
                 )
 
         self._client_session = None
+        # gRPC channels (and their stubs) by target and client options
+        self._grpc_stubs: Dict[Tuple, Tuple[Any, Any]] = {}
 
     @property
     def _session(self) -> aiohttp.ClientSession:
         if self._client_session is None:
-            # TODO: Delete at some point
             self._client_session = aiohttp.ClientSession(raise_for_status=True)
 
         return self._client_session
 
+    async def close(self):
+        """
+        Close the HTTP session and gRPC channels used to call the model
+        remotely.
+        """
+        if self._client_session is not None:
+            await self._client_session.close()
+            self._client_session = None
+
+        grpc_stubs, self._grpc_stubs = self._grpc_stubs, {}
+        for channel, _ in grpc_stubs.values():
+            await channel.close()
+
     async def remote_with_spec(self, model_spec: ModelSpec, *args, **kwargs):
-        remoter = self._create_remote(model_spec)  # type: ignore
+        call_plan = self._get_call_plan(model_spec)  # type: ignore
+        if call_plan.transport == ClientTransport.GRPC:
+            return await self._infer_grpc(model_spec, call_plan, *args, **kwargs)
+
         prot = model_spec.protocol
-        ingress_options = model_spec.runtime_options.ingress_options
 
-        req = prot.to_protocol_request(*args, **kwargs)
-        endpoint = remoter.get_endpoint_spec(model_spec)
-        headers = remoter.get_headers(model_spec)
-        response_raw = await self._session.post(
-            endpoint, json=req, headers=headers, verify_ssl=ingress_options.verify_ssl
+        endpoint = call_plan.endpoint
+        headers = call_plan.headers
+        if isinstance(prot, V2Protocol) and prot.binary_data:
+            body, header_length = prot.to_binary_request(*args, **kwargs)
+            headers = {
+                **headers,
+                "Content-Type": BinaryContentType,
+                InferenceHeaderContentLength: str(header_length),
+            }
+        else:
+            body = prot.encode_request(*args, **kwargs)
+            headers = {**headers, "Content-Type": prot.serializer.content_type}
+        response_raw = await self._session.post(endpoint, data=body, headers=headers, verify_ssl=call_plan.verify_ssl)
+
+        response_body = await response_raw.read()
+        response_header_length = response_raw.headers.get(InferenceHeaderContentLength)
+        if response_header_length is not None:
+            response_json = V2Protocol.decode_binary(response_body, int(response_header_length))
+        else:
+            response_json = prot.serializer.loads(response_body)
+        return call_plan.codec_plan.decode_response(response_json)
+
+    async def _infer_grpc(self, model_spec: ModelSpec, call_plan: CallPlan, *args, **kwargs):
+        # Imported lazily, as loading the gRPC stubs is slow
+        from tempo.serve.grpc import (
+            GRPCInferenceServiceStub,
+            create_aio_channel,
+            decode_infer_response,
+            encode_infer_request,
+            get_deadline,
+            get_metadata,
+        )
+
+        client_options = model_spec.runtime_options.client_options
+        if call_plan.pool_key not in self._grpc_stubs:
+            channel = create_aio_channel(call_plan.endpoint, call_plan.secure, client_options)
+            self._grpc_stubs[call_plan.pool_key] = (channel, GRPCInferenceServiceStub(channel))
+
+        _, stub = self._grpc_stubs[call_plan.pool_key]
+        request = model_spec.protocol.to_raw_request(*args, **kwargs)
+        infer_response = await stub.ModelInfer(
+            encode_infer_request(request, model_spec.model_details.name),
+            metadata=get_metadata(call_plan.headers),
+            timeout=get_deadline(client_options),
         )
 
-        response_json = await response_raw.json()
-        output_schema = model_spec.model_details.outputs
-        return prot.from_protocol_response(response_json, output_schema)
+        return call_plan.codec_plan.decode_response(decode_infer_response(infer_response))
 
     async def predict(self, *args, **kwargs):
         # TODO: Decouple to support multiple transports (e.g. Kafka, gRPC)
         model_spec = self._get_model_spec(None)
+        batcher = self._get_batcher(model_spec, AsyncBatcher)  # type: ignore
+        if batcher is not None:
+            return await batcher.submit(*args, **kwargs)
+
         return await self.remote_with_spec(model_spec, *args, **kwargs)
 
     async def __call__(self, *args, **kwargs) -> Any:
@@ -54,25 +114,10 @@ class _AsyncMixin:
         return await future
 
     async def request(self, req: Dict) -> Dict:
-        # TODO: Decouple to avoid duplicating code
         if self._user_func is None:  # type: ignore
             raise UndefinedCustomImplementation(self.details.name)  # type: ignore
 
-        prot = self.model_spec.protocol  # type: ignore
-        req_converted = prot.from_protocol_request(req, self.details.inputs)  # type: ignore
-
-        if type(req_converted) == dict:
-            response = await self(**req_converted)
-        elif type(req_converted) == list or type(req_converted) == tuple:
-            response = await self(*req_converted)
-        else:
-            response = await self(req_converted)
-
-        if type(response) == dict:
-            response_converted = prot.to_protocol_response(self.details, **response)  # type: ignore
-        elif type(response) == list or type(response) == tuple:
-            response_converted = prot.to_protocol_response(self.details, *response)  # type: ignore
-        else:
-            response_converted = prot.to_protocol_response(self.details, response)  # type: ignore
-
-        return response_converted
+        codec_plan = self._get_codec_plan(self.model_spec)  # type: ignore
+        args, kwargs = codec_plan.decode_request(req)
+        response = await self(*args, **kwargs)
+        return codec_plan.encode_response(response)
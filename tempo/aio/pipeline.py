@@ -16,3 +16,10 @@ class Pipeline(_AsyncMixin, _Pipeline):  # type: ignore
 
         # TODO: Do we need to convert models to async models on-the-fly?
         self.models = PipelineModels(**self.models.__dict__)
+
+    async def close(self):
+        await super().close()
+        for model in self.models.values():
+            tempo_model = model.get_tempo()
+            if isinstance(tempo_model, _AsyncMixin):
+                await tempo_model.close()
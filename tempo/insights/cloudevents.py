@@ -1,5 +1,5 @@
 import os
-from typing import Dict
+from typing import Any, Dict
 
 CLOUDEVENTS_HEADER_ID = "Ce-Id"
 CLOUDEVENTS_HEADER_SPECVERSION = "Ce-Specversion"
@@ -13,6 +13,8 @@ CLOUDEVENTS_HEADER_INFERENCE_SERVICE = "Ce-Inferenceservicename"
 CLOUDEVENTS_HEADER_NAMESPACE = "Ce-Namespace"
 CLOUDEVENTS_HEADER_ENDPOINT = "Ce-Endpoint"
 
+CLOUDEVENTS_BATCH_CONTENT_TYPE = "application/cloudevents-batch+json"
+
 ENV_SDEP_NAME = "SELDON_DEPLOYMENT_ID"
 ENV_PREDICTOR_NAME = "PREDICTOR_ID"
 ENV_MODEL_NAME = "PREDICTIVE_UNIT_ID"
@@ -60,3 +62,30 @@ def get_cloudevent_headers(request_id: str, ce_type: str) -> Dict:
         CLOUDEVENTS_HEADER_ENDPOINT: env_predictor_name,
     }
     return ce
+
+
+def get_cloudevent(request_id: str, ce_type: str, data: Any) -> Dict:
+    """Retrieve a cloud event in structured mode (i.e. with its attributes
+    alongside its data), as sent within batches
+
+    Parameters
+    ----------
+    request_id
+     String containing the ID of the request the event refers to.
+    ce_type
+     String containing the value from the InsightsTypes class value.
+    data
+     JSON-serialisable data of the event.
+
+    Returns
+    -------
+    Dictionary containing the attributes names as keys and respective values
+    accordingly, with the data under the ``data`` key
+    """
+
+    # In structured mode, attribute names are the lowercased header names
+    # without their ``Ce-`` prefix
+    ce = {name[len("Ce-") :].lower(): value for name, value in get_cloudevent_headers(request_id, ce_type).items()}
+    ce["datacontenttype"] = "application/json"
+    ce["data"] = data
+    return ce
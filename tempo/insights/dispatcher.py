@@ -0,0 +1,205 @@
+"""
+Process-wide dispatcher of insights payloads.
+
+Rather than each (sync) insights manager starting its own thread, event
+loop and HTTP session, they all share a single background event loop, with
+one pooled session per endpoint.
+Managers with the same worker options also share the same queue and
+worker tasks (i.e. a channel), which get stopped once the last manager
+using them is closed.
+Pending payloads get flushed when the process exits.
+"""
+import asyncio
+import atexit
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import aiohttp
+import janus
+
+from ..serve.metadata import InsightsSinkTypes
+from ..utils import logger
+from .worker import InsightsStats, get_sink_name, start_worker
+
+# Time (in seconds) to wait for pending payloads to get sent when closing a
+# channel or exiting the process
+DEFAULT_FLUSH_TIMEOUT = 5.0
+
+
+class InsightsChannel:
+    def __init__(self, key: Tuple, worker_endpoint: str, queue: janus.Queue, stats: InsightsStats):
+        self.key = key
+        self.worker_endpoint = worker_endpoint
+        self.queue = queue
+        self.stats = stats
+        self.refs = 0
+        self.task: Optional[asyncio.Task] = None
+
+
+class InsightsDispatcher:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._channels: Dict[Tuple, InsightsChannel] = {}
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+        self._pid = os.getpid()
+
+    def acquire(self, worker_endpoint: str, max_queue_size: int = 0, **worker_kwargs) -> InsightsChannel:
+        """
+        Get the channel for the given endpoint and worker options, starting
+        it if needed.
+        Every call must be matched by a call to :meth:`release`.
+        """
+        key = (worker_endpoint, max_queue_size, tuple(sorted(worker_kwargs.items())))
+        with self._lock:
+            self._reset_after_fork()
+            channel = self._channels.get(key)
+            if channel is None:
+                self._start_loop()
+                channel = self._run(self._open(key, worker_endpoint, max_queue_size, worker_kwargs))
+                self._channels[key] = channel
+
+            channel.refs += 1
+            return channel
+
+    def release(self, channel: InsightsChannel, timeout: float = DEFAULT_FLUSH_TIMEOUT):
+        """
+        Release a channel, which gets flushed and stopped once no longer
+        used, along with the event loop once no channels are left.
+        """
+        with self._lock:
+            if self._channels.get(channel.key) is not channel:
+                # e.g. released after a fork or a shutdown
+                return
+
+            channel.refs -= 1
+            if channel.refs > 0:
+                return
+
+            del self._channels[channel.key]
+            self._run(self._close(channel, timeout))
+            if not self._channels:
+                self._stop_loop()
+
+    def flush(self, timeout: float = DEFAULT_FLUSH_TIMEOUT):
+        """
+        Wait for up to ``timeout`` seconds for the pending payloads of every
+        channel to get sent.
+        """
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                return
+
+            self._run(self._flush(list(self._channels.values()), timeout))
+
+    def shutdown(self, timeout: float = DEFAULT_FLUSH_TIMEOUT):
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                return
+
+            channels = list(self._channels.values())
+            self._channels = {}
+            self._run(self._flush(channels, timeout))
+            for channel in channels:
+                self._run(self._close(channel, timeout=0))
+
+            self._stop_loop()
+
+    @property
+    def num_channels(self) -> int:
+        return len(self._channels)
+
+    def _start_loop(self):
+        if self._loop is not None:
+            return
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="tempo-insights", daemon=True)
+        self._thread.start()
+
+    def _stop_loop(self):
+        loop, thread = self._loop, self._thread
+        if loop is None:
+            return
+
+        self._run(self._close_sessions())
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()  # type: ignore
+        loop.close()
+
+        self._loop = None
+        self._thread = None
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()  # type: ignore
+
+    async def _open(self, key: Tuple, worker_endpoint: str, max_queue_size: int, worker_kwargs: dict):
+        logger.debug(f"Insights dispatcher opening channel to {worker_endpoint} with params {worker_kwargs}")
+        sink_name = get_sink_name(
+            worker_kwargs.get("sink_type", InsightsSinkTypes.HTTP), worker_endpoint, worker_kwargs.get("spool_path", "")
+        )
+        stats = InsightsStats(sink_name)
+        channel = InsightsChannel(key, worker_endpoint, janus.Queue(maxsize=max_queue_size), stats)
+
+        session = self._sessions.get(worker_endpoint)
+        if session is None:
+            session = aiohttp.ClientSession()
+            self._sessions[worker_endpoint] = session
+
+        channel.task = asyncio.create_task(
+            start_worker(
+                channel.queue.async_q,  # type: ignore
+                worker_endpoint,
+                stats=channel.stats,
+                session=session,
+                **worker_kwargs,
+            )
+        )
+        return channel
+
+    async def _close(self, channel: InsightsChannel, timeout: float):
+        if timeout > 0:
+            await self._flush([channel], timeout)
+
+        channel.task.cancel()  # type: ignore
+        await asyncio.gather(channel.task, return_exceptions=True)  # type: ignore
+        channel.queue.close()
+        await channel.queue.wait_closed()
+
+        if all(other.worker_endpoint != channel.worker_endpoint for other in self._channels.values()):
+            session = self._sessions.pop(channel.worker_endpoint, None)
+            if session is not None:
+                await session.close()
+
+    async def _flush(self, channels, timeout: float):
+        try:
+            await asyncio.wait_for(asyncio.gather(*[channel.queue.async_q.join() for channel in channels]), timeout)
+        except asyncio.TimeoutError:
+            pending = sum(channel.queue.async_q.qsize() for channel in channels)
+            logger.warning(f"Timed out flushing insights payloads, with {pending} payload(s) still pending")
+
+    async def _close_sessions(self):
+        sessions = list(self._sessions.values())
+        self._sessions = {}
+        for session in sessions:
+            await session.close()
+
+    def _reset_after_fork(self):
+        # The loop's thread doesn't survive a fork
+        pid = os.getpid()
+        if pid != self._pid:
+            self._loop = None
+            self._thread = None
+            self._channels = {}
+            self._sessions = {}
+            self._pid = pid
+
+
+_dispatcher = InsightsDispatcher()
+atexit.register(_dispatcher.shutdown)
+
+
+def get_dispatcher() -> InsightsDispatcher:
+    return _dispatcher
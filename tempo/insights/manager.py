@@ -1,11 +1,28 @@
 import asyncio
-from typing import Any
+from typing import Any, Dict, Optional
 
 from tempo.magic import t
 
-from ..serve.metadata import DEFAULT_INSIGHTS_TYPE, InsightRequestModes, InsightsPayload, InsightsTypes
+from ..serve.metadata import (
+    DEFAULT_INSIGHTS_TYPE,
+    InsightRequestModes,
+    InsightsOverflowPolicies,
+    InsightsSamplingTypes,
+    InsightsSinkTypes,
+    InsightsTypes,
+)
 from ..utils import logger
-from .worker import start_insights_worker_from_async, start_insights_worker_from_sync
+from .dispatcher import InsightsChannel, get_dispatcher
+from .records import InsightsRecord
+from .sampling import InsightsSampler
+from .worker import InsightsStats, get_sink_name, put_async, put_sync, start_insights_worker_from_async
+
+
+def _get_running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
 
 
 class InsightsManager:
@@ -18,20 +35,52 @@ class InsightsManager:
         window_time: int = None,
         in_asyncio: bool = False,
         mode_type: InsightRequestModes = None,
+        max_queue_size: int = 10000,
+        overflow_policy: InsightsOverflowPolicies = InsightsOverflowPolicies.DROP_OLDEST,
+        overflow_timeout: float = 0.01,
+        backoff_factor: float = 0.1,
+        max_backoff: float = 10.0,
+        request_timeout: float = 10.0,
+        sample_rate: float = 1.0,
+        sampling_type: InsightsSamplingTypes = InsightsSamplingTypes.RANDOM,
+        max_events_per_second: Optional[float] = None,
+        sink_type: InsightsSinkTypes = InsightsSinkTypes.HTTP,
+        spool_path: str = "",
+        spool_max_bytes: int = 16 * 1024 * 1024,
+        spool_max_age: float = 300.0,
+        spool_forward_interval: float = 10.0,
     ):
         self._mode_type = mode_type
-        args = (
-            worker_endpoint,
-            batch_size,
-            parallelism,
-            retries,
-            window_time,
+        self._sampler = InsightsSampler(sample_rate, sampling_type, max_events_per_second)
+        self._overflow_policy = overflow_policy
+        self._overflow_timeout = overflow_timeout
+        self.stats = InsightsStats(get_sink_name(sink_type, worker_endpoint, spool_path))
+        self._channel: Optional[InsightsChannel] = None
+        args = dict(
+            worker_endpoint=worker_endpoint,
+            batch_size=batch_size,
+            parallelism=parallelism,
+            retries=retries,
+            window_time=window_time,
+            max_queue_size=max_queue_size,
+            backoff_factor=backoff_factor,
+            max_backoff=max_backoff,
+            request_timeout=request_timeout,
+            sink_type=InsightsSinkTypes(sink_type).value,
+            spool_path=spool_path,
+            spool_max_bytes=spool_max_bytes,
+            spool_max_age=spool_max_age,
+            spool_forward_interval=spool_forward_interval,
         )
         logger.info(f"Initialising Insights Manager with Args: {args}")
-        if worker_endpoint:
+        is_spool = InsightsSinkTypes(sink_type) == InsightsSinkTypes.SPOOL
+        if is_spool and not spool_path:
+            raise ValueError("A spool_path is required to spool insights payloads")
+
+        if worker_endpoint or is_spool:
             if in_asyncio:
                 logger.debug("Initialising async insights worker")
-                self._q = start_insights_worker_from_async(*args)
+                self._q = start_insights_worker_from_async(**args, stats=self.stats)
 
                 def log(
                     self,
@@ -39,13 +88,16 @@ class InsightsManager:
                     insights_type: InsightsTypes = DEFAULT_INSIGHTS_TYPE,
                 ):
                     payload = self._to_payload(data, insights_type=insights_type)
-                    asyncio.create_task(self._q.put(payload))
+                    put_async(self._q, payload, self.stats, self._overflow_policy, self._overflow_timeout)
 
                 self.log = log.__get__(self, self.__class__)  # type: ignore
                 logger.debug("Async worker set up")
             else:
                 logger.debug("Initialising sync insights worker")
-                self._q = start_insights_worker_from_sync(*args)  # type: ignore
+                # Sync managers share the process-wide dispatcher
+                self._channel = get_dispatcher().acquire(**args)
+                self._q = self._channel.queue.sync_q  # type: ignore
+                self.stats = self._channel.stats
 
                 def log(
                     self,
@@ -53,19 +105,46 @@ class InsightsManager:
                     insights_type: InsightsTypes = DEFAULT_INSIGHTS_TYPE,
                 ):
                     payload = self._to_payload(data, insights_type=insights_type)
-                    self._q.put(payload)
+                    loop = None
+                    if self._overflow_policy == InsightsOverflowPolicies.BLOCK:
+                        # Logging from an event loop (e.g. MLServer's) must
+                        # never block it
+                        loop = _get_running_loop()
+
+                    put_sync(self._q, payload, self.stats, self._overflow_policy, self._overflow_timeout, loop)
 
                 self.log = log.__get__(self, self.__class__)  # type: ignore
                 logger.debug("Sync worker set up")
         else:
             logger.warning("Insights Manager not initialised as empty URL provided.")
 
-    def _to_payload(self, data: Any, insights_type: InsightsTypes = DEFAULT_INSIGHTS_TYPE) -> InsightsPayload:
-        return InsightsPayload(
-            data=data,
-            request_id=t.payload.request_id,  # pylint: disable=no-member
-            insights_type=insights_type,
-        )
+    def close(self):
+        """
+        Stop using the process-wide insights dispatcher, which flushes the
+        pending payloads if no other manager shares them.
+        """
+        if self._channel is not None:
+            get_dispatcher().release(self._channel)
+            self._channel = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get a snapshot of the metrics of the insights pipeline (see
+        :meth:`InsightsStats.snapshot`).
+        """
+        return self.stats.snapshot()
+
+    def sample(self, request_id: Optional[str] = None) -> bool:
+        """
+        Decide whether the inference request and response payloads of a
+        request should get logged.
+        """
+        return self._sampler.sample(request_id)
+
+    def _to_payload(self, data: Any, insights_type: InsightsTypes = DEFAULT_INSIGHTS_TYPE) -> InsightsRecord:
+        # Only a reference to the data gets enqueued, as the worker encodes
+        # it later on
+        return InsightsRecord(t.payload.request_id, data, insights_type)  # pylint: disable=no-member
 
     def log(self, data, insights_type: InsightsTypes = DEFAULT_INSIGHTS_TYPE):
         """
@@ -0,0 +1,107 @@
+"""
+Metrics of the insights pipeline.
+
+Besides keeping them in memory (see :class:`Buckets`), metrics get
+exported to Prometheus on its default registry (i.e. the one served by
+MLServer), if ``prometheus_client`` is installed.
+Each metric is labelled by the ``sink`` the payloads get sent to (i.e. the
+insights endpoint or the spool path).
+"""
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Optional, Sequence
+
+# Upper bounds of the send latency (in seconds) and batch size histograms
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+COUNTERS = {
+    "enqueued": "Number of insights payloads enqueued",
+    "dequeued": "Number of insights payloads dequeued by the worker",
+    "sent": "Number of insights payloads sent",
+    "dropped": "Number of insights payloads dropped as the queue was full",
+    "retries": "Number of retried attempts to send insights payloads",
+    "dead_letters": "Number of insights payloads given up on after exhausting their retries",
+    "forwarded": "Number of spooled insights payloads forwarded to the insights endpoint",
+}
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram
+
+    _counters: Optional[Dict[str, Any]] = {
+        name: Counter(f"tempo_insights_{name}", description, ["sink"]) for name, description in COUNTERS.items()
+    }
+    _send_errors = Counter(
+        "tempo_insights_send_errors",
+        "Number of failed attempts to send insights payloads, by status code or error",
+        ["sink", "error"],
+    )
+    _send_latency = Histogram(
+        "tempo_insights_send_latency_seconds",
+        "Latency of the attempts to send batches of insights payloads",
+        ["sink"],
+        buckets=LATENCY_BUCKETS,
+    )
+    _batch_size = Histogram(
+        "tempo_insights_batch_size",
+        "Number of insights payloads per batch",
+        ["sink"],
+        buckets=BATCH_SIZE_BUCKETS,
+    )
+    _queue_depth = Gauge("tempo_insights_queue_depth", "Number of insights payloads waiting to be sent", ["sink"])
+except ImportError:
+    _counters = None
+
+
+class Buckets:
+    """
+    Histogram of observations, counted within fixed upper ``bounds``.
+    """
+
+    def __init__(self, bounds: Sequence[float]):
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self._counts[bisect_left(self._bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def dict(self) -> Dict[str, Any]:
+        # Buckets are cumulative, as in Prometheus
+        buckets = {}
+        total = 0
+        for bound, count in zip(list(self._bounds) + ["+Inf"], self._counts):
+            total += count
+            buckets[str(bound)] = total
+
+        mean = self.sum / self.count if self.count else 0.0
+        return {"count": self.count, "sum": self.sum, "mean": mean, "max": self.max, "buckets": buckets}
+
+
+class PrometheusMetrics:
+    """
+    Prometheus metrics of a single sink.
+    """
+
+    def __init__(self, sink: str):
+        self._sink = sink
+        self.counters = {name: counter.labels(sink=sink) for name, counter in _counters.items()}  # type: ignore
+        self.send_latency = _send_latency.labels(sink=sink)
+        self.batch_size = _batch_size.labels(sink=sink)
+
+    def send_error(self, error: str):
+        _send_errors.labels(sink=self._sink, error=error).inc()
+
+    def set_queue_depth(self, get_depth: Callable[[], int]):
+        _queue_depth.labels(sink=self._sink).set_function(get_depth)
+
+
+def get_prometheus_metrics(sink: str) -> Optional[PrometheusMetrics]:
+    if _counters is None or not sink:
+        return None
+
+    return PrometheusMetrics(sink)
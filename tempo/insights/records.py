@@ -0,0 +1,60 @@
+"""
+Records of the insights payloads, as enqueued for the worker.
+
+Logging a payload only puts a record on the queue, which holds references
+to the logged data (e.g. decoded numpy arrays or pydantic models) as is.
+Records only get encoded as JSON by the worker, off the request path, so
+the logged data shouldn't get modified after logging it.
+"""
+import json
+from enum import Enum
+from typing import Any, Dict
+
+import numpy as np
+from pydantic import BaseModel
+
+from ..serve.metadata import DEFAULT_INSIGHTS_TYPE, InsightsTypes
+
+
+class InsightsRecord:
+    __slots__ = ("request_id", "data", "_insights_type")
+
+    def __init__(self, request_id: str = "", data: Any = None, insights_type: Any = DEFAULT_INSIGHTS_TYPE):
+        self.request_id = request_id
+        self.data = data
+        self._insights_type = insights_type
+
+    @property
+    def insights_type(self) -> str:
+        insights_type = self._insights_type
+        if isinstance(insights_type, Enum):
+            return insights_type.value
+
+        return InsightsTypes(insights_type).value
+
+    def dict(self) -> Dict[str, Any]:
+        return {"request_id": self.request_id, "data": self.data, "insights_type": self.insights_type}
+
+    def __repr__(self) -> str:
+        return f"InsightsRecord(request_id={self.request_id!r}, insights_type={self.insights_type!r})"
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+
+    if isinstance(obj, np.generic):
+        return obj.item()
+
+    if isinstance(obj, BaseModel):
+        return obj.dict()
+
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(data: Any) -> bytes:
+    """
+    Encode logged data as JSON, including any numpy arrays and pydantic
+    models within it.
+    """
+    return json.dumps(data, default=_default).encode()
@@ -0,0 +1,70 @@
+"""
+Sampling of the inference requests whose payloads get logged as insights.
+"""
+import random
+import threading
+import time
+import zlib
+from typing import Optional
+
+from ..serve.metadata import InsightsSamplingTypes
+
+
+class TokenBucket:
+    """
+    Rate limiter allowing up to ``rate`` events per second, with bursts of
+    up to ``burst`` events (defaulting to a second's worth).
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self._rate = rate
+        self._capacity = burst if burst is not None else max(rate, 1)
+        self._tokens = self._capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._last) * self._rate)
+            self._last = now
+
+            if self._tokens < 1:
+                return False
+
+            self._tokens -= 1
+            return True
+
+
+class InsightsSampler:
+    """
+    Decides whether a request gets logged.
+    A ``sample_rate`` fraction of requests gets sampled, either at random
+    or, with ``REQUEST_ID`` sampling, by hashing their request ID (so that
+    every replica, and every model of a pipeline, samples the same
+    requests).
+    Sampled requests are then capped to ``max_events_per_second``.
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 1.0,
+        sampling_type: InsightsSamplingTypes = InsightsSamplingTypes.RANDOM,
+        max_events_per_second: Optional[float] = None,
+    ):
+        self._sample_rate = sample_rate
+        self._sampling_type = InsightsSamplingTypes(sampling_type)
+        self._rate_limiter = TokenBucket(max_events_per_second) if max_events_per_second is not None else None
+
+    def sample(self, request_id: Optional[str] = None) -> bool:
+        if self._sample_rate < 1 and not self._sample_by_rate(request_id):
+            return False
+
+        return self._rate_limiter is None or self._rate_limiter.acquire()
+
+    def _sample_by_rate(self, request_id: Optional[str]) -> bool:
+        if self._sampling_type == InsightsSamplingTypes.REQUEST_ID and request_id:
+            # Unlike `hash()`, CRC32 is stable across processes
+            return zlib.crc32(request_id.encode("utf-8")) < self._sample_rate * 2 ** 32
+
+        return random.random() < self._sample_rate
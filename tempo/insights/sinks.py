@@ -0,0 +1,283 @@
+"""
+Destinations of the insights payloads sent by the worker.
+
+Besides POSTing them to the insights endpoint, payloads can get appended to
+a local, compressed spool, which gets rotated by size or age and replayed
+to the endpoint later on (see :func:`tempo.insights.worker.replay_spool`).
+"""
+import asyncio
+import fcntl
+import gzip
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import IO, Any, List, Optional
+
+import aiohttp
+
+from .cloudevents import CLOUDEVENTS_BATCH_CONTENT_TYPE, get_cloudevent, get_cloudevent_headers
+from .records import InsightsRecord, dumps
+
+SPOOL_FILE_PREFIX = "insights-"
+SPOOL_FILE_SUFFIX = ".jsonl.gz"
+# Suffix of the spool file still being written to, which doesn't get
+# replayed until it's rotated
+SPOOL_OPEN_SUFFIX = ".open"
+# Suffix of the spool files set aside as they couldn't be read
+SPOOL_CORRUPT_SUFFIX = ".corrupt"
+
+
+class InsightsSinkError(Exception):
+    def __init__(self, message: str, retryable: bool = True, status: Optional[int] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.status = status
+
+
+class InsightsSink:
+    """
+    Base class of the sinks, which send (or store) batches of payloads,
+    raising an error if they couldn't.
+    """
+
+    async def send(self, batch: List[InsightsRecord]):
+        raise NotImplementedError()
+
+    async def close(self):
+        pass
+
+
+def _is_retryable(status: int) -> bool:
+    return status == 429 or status >= 500
+
+
+class HTTPSink(InsightsSink):
+    """
+    Sends payloads to the insights endpoint as CloudEvents, either one per
+    request (in binary mode) or in batch mode.
+    """
+
+    def __init__(
+        self,
+        worker_endpoint: str,
+        session: aiohttp.ClientSession,
+        batch_mode: bool = False,
+        request_timeout: Optional[float] = None,
+    ):
+        self.worker_endpoint = worker_endpoint
+        self._session = session
+        self._batch_mode = batch_mode
+        self._timeout = aiohttp.ClientTimeout(total=request_timeout)
+
+    async def send(self, batch: List[InsightsRecord]):
+        if not self._batch_mode:
+            payload = batch[0]
+            headers = get_cloudevent_headers(payload.request_id, payload.insights_type)
+            headers["Content-Type"] = "application/json"
+            data = dumps(payload.data)
+        else:
+            headers = {"Content-Type": CLOUDEVENTS_BATCH_CONTENT_TYPE}
+            data = dumps([get_cloudevent(payload.request_id, payload.insights_type, payload.data) for payload in batch])
+
+        async with self._session.post(self.worker_endpoint, data=data, headers=headers, timeout=self._timeout) as res:
+            if res.status >= 300:
+                raise InsightsSinkError(
+                    f"error code {res.status}", retryable=_is_retryable(res.status), status=res.status
+                )
+
+
+class SpoolSink(InsightsSink):
+    """
+    Appends payloads (as JSON lines) to gzip-compressed files under
+    ``path``, which get rotated once ``max_bytes`` (uncompressed) have been
+    written to them, or once they are ``max_age`` seconds old.
+    Writes happen on the default executor, so that disk I/O never blocks
+    the event loop.
+    Files left open by processes which crashed get recovered (i.e. rotated)
+    when the sink gets created.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 16 * 1024 * 1024,
+        max_age: float = 300.0,
+        compresslevel: int = 6,
+    ):
+        self.path = path
+        self._max_bytes = max_bytes
+        self._max_age = max_age
+        self._compresslevel = compresslevel
+
+        self._lock = threading.Lock()
+        self._raw_file: Optional[IO[bytes]] = None
+        self._file: Optional[IO[bytes]] = None
+        self._file_path = ""
+        self._written = 0
+        self._opened_at = 0.0
+
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            if name.startswith(SPOOL_FILE_PREFIX) and name.endswith(SPOOL_FILE_SUFFIX + SPOOL_OPEN_SUFFIX):
+                recover_spool_file(os.path.join(path, name))
+
+    async def send(self, batch: List[InsightsRecord]):
+        await asyncio.get_running_loop().run_in_executor(None, self.write, batch)
+
+    async def close(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.rotate)
+
+    def write(self, batch: List[InsightsRecord]):
+        lines = b"".join(_to_line(payload) for payload in batch)
+        with self._lock:
+            if self._file is None:
+                self._open()
+
+            self._file.write(lines)  # type: ignore
+            self._written += len(lines)
+            if self._written >= self._max_bytes or self._is_expired():
+                self._rotate()
+
+    def rotate(self):
+        """
+        Close the current spool file (if any), making it available to
+        replay.
+        """
+        with self._lock:
+            self._rotate()
+
+    def rotate_if_expired(self):
+        with self._lock:
+            if self._file is not None and self._is_expired():
+                self._rotate()
+
+    def _is_expired(self) -> bool:
+        return time.time() - self._opened_at >= self._max_age
+
+    def _open(self):
+        # Spool files sort in the order they were opened in, and don't
+        # clash across processes sharing the same path
+        self._opened_at = time.time()
+        name = f"{SPOOL_FILE_PREFIX}{time.time_ns():020d}-{os.getpid()}{SPOOL_FILE_SUFFIX}"
+        self._file_path = os.path.join(self.path, name)
+        self._raw_file = _open_locked(self._file_path + SPOOL_OPEN_SUFFIX, "wb")
+        self._file = gzip.GzipFile(fileobj=self._raw_file, mode="wb", compresslevel=self._compresslevel)
+        self._written = 0
+
+    def _rotate(self):
+        if self._file is None:
+            return
+
+        self._file.close()
+        os.rename(self._file_path + SPOOL_OPEN_SUFFIX, self._file_path)
+        # Only release the lock once the file has been renamed
+        self._raw_file.close()  # type: ignore
+        self._file = None
+        self._raw_file = None
+
+
+class MemorySink(InsightsSink):
+    """
+    Keeps the last ``maxlen`` payloads in memory, e.g. to inspect them in
+    tests.
+    """
+
+    def __init__(self, maxlen: int = 10000):
+        self._payloads: deque = deque(maxlen=maxlen)
+
+    async def send(self, batch: List[InsightsRecord]):
+        self._payloads.extend(batch)
+
+    @property
+    def payloads(self) -> List[InsightsRecord]:
+        return list(self._payloads)
+
+
+def _to_line(payload: InsightsRecord) -> bytes:
+    return dumps(payload.dict()) + b"\n"
+
+
+def _open_locked(file_path: str, mode: str) -> IO[bytes]:
+    # Spool files get locked while open, so that they can be told apart from
+    # the ones left open by a crashed process
+    f = open(file_path, mode)
+    fcntl.flock(f, fcntl.LOCK_EX)
+    return f  # type: ignore
+
+
+def get_spool_files(path: str) -> List[str]:
+    """
+    List the spool files under ``path`` which are ready to replay, oldest
+    first.
+    """
+    if not os.path.isdir(path):
+        return []
+
+    names = sorted(
+        name for name in os.listdir(path) if name.startswith(SPOOL_FILE_PREFIX) and name.endswith(SPOOL_FILE_SUFFIX)
+    )
+    return [os.path.join(path, name) for name in names]
+
+
+def read_spool_file(file_path: str) -> List[InsightsRecord]:
+    with gzip.open(file_path, "rb") as f:
+        return [InsightsRecord(**json.loads(line)) for line in f if line.strip()]
+
+
+def write_spool_file(file_path: str, payloads: List[Any]):
+    tmp_path = file_path + SPOOL_OPEN_SUFFIX
+    with _open_locked(tmp_path, "wb") as raw_file:
+        with gzip.GzipFile(fileobj=raw_file, mode="wb") as f:
+            f.writelines(_to_line(payload) for payload in payloads)
+
+        os.replace(tmp_path, file_path)
+
+
+def recover_spool_file(open_path: str) -> bool:
+    """
+    Rotate a spool file left open by a crashed process, keeping the payloads
+    which were fully written to it.
+    Files still open by a running process are left alone.
+
+    Returns
+    -------
+    Whether the file was recovered.
+    """
+    try:
+        raw_file = open(open_path, "rb+")
+    except FileNotFoundError:
+        return False
+
+    with raw_file:
+        try:
+            fcntl.flock(raw_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+
+        # Empty files may have just been created, and not locked yet, by a
+        # running process. Otherwise, the file may have been rotated by its
+        # owner before getting locked here.
+        if os.fstat(raw_file.fileno()).st_size == 0 or not os.path.exists(open_path):
+            return False
+
+        payloads: List[InsightsRecord] = []
+        try:
+            for line in gzip.GzipFile(fileobj=raw_file, mode="rb"):
+                payloads.append(InsightsRecord(**json.loads(line)))
+        except Exception:
+            # The file got cut short, most likely in the middle of a payload
+            pass
+
+        if not payloads:
+            os.remove(open_path)
+            return False
+
+        raw_file.seek(0)
+        raw_file.truncate()
+        with gzip.GzipFile(fileobj=raw_file, mode="wb") as f:
+            f.writelines(_to_line(payload) for payload in payloads)
+
+        os.rename(open_path, open_path[: -len(SPOOL_OPEN_SUFFIX)])
+        return True
@@ -1,113 +1,605 @@
 import asyncio
+import os
+import random
 import threading
+import time
+from typing import Any, Dict, List, Optional
 
 import aiohttp
 import janus
 
+from ..serve.metadata import InsightsOverflowPolicies, InsightsSinkTypes
 from ..utils import logger
-from .cloudevents import get_cloudevent_headers
+from .metrics import BATCH_SIZE_BUCKETS, COUNTERS, LATENCY_BUCKETS, Buckets, get_prometheus_metrics
+from .records import InsightsRecord
+from .sinks import (
+    SPOOL_CORRUPT_SUFFIX,
+    HTTPSink,
+    InsightsSink,
+    InsightsSinkError,
+    SpoolSink,
+    get_spool_files,
+    read_spool_file,
+    write_spool_file,
+)
+
+
+class _BatchCollector:
+    """
+    Collects payloads from the queue into batches of up to ``batch_size``,
+    waiting for at most ``window_time`` (in milliseconds) after the first
+    payload of each batch.
+    A ``window_time`` of zero only batches payloads which are already
+    queued.
+    """
+
+    def __init__(self, q_in: janus._AsyncQueueProxy, batch_size: int = 1, window_time: Optional[int] = None):
+        self._q_in = q_in
+        self._batch_size = max(batch_size, 1)
+        self._window = (window_time or 0) / 1000
+        # Pending `get()` left over by a window closing, which gets awaited
+        # on the next batch instead of cancelled, so that its payload isn't
+        # lost
+        self._pending: Optional[asyncio.Future] = None
+
+    async def next_batch(self) -> List[InsightsRecord]:
+        batch = [await self._get()]
+        deadline = asyncio.get_running_loop().time() + self._window
+        while len(batch) < self._batch_size:
+            payload = self._get_nowait()
+            if payload is None:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+
+                payload = await self._get(timeout=remaining)
+                if payload is None:
+                    break
+
+            batch.append(payload)
+
+        return batch
+
+    async def _get(self, timeout: Optional[float] = None) -> Optional[InsightsRecord]:
+        if self._pending is None:
+            self._pending = asyncio.ensure_future(self._q_in.get())
+
+        done, _ = await asyncio.wait({self._pending}, timeout=timeout)
+        if not done:
+            return None
+
+        return self._pop_pending()
+
+    def _get_nowait(self) -> Optional[InsightsRecord]:
+        if self._pending is not None:
+            return self._pop_pending() if self._pending.done() else None
+
+        try:
+            return self._q_in.get_nowait()
+        except asyncio.QueueEmpty:
+            return None
+
+    def cancel(self):
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
+
+    def _pop_pending(self) -> InsightsRecord:
+        pending, self._pending = self._pending, None
+        return pending.result()  # type: ignore
+
+
+class InsightsStats:
+    """
+    Metrics of the insights payloads which got enqueued, dequeued by the
+    worker, delivered, dropped on enqueue as the queue was full, or given
+    up on (i.e. dead letters) after exhausting their retries, along with
+    the send errors and latencies and the sizes of the batches.
+    Payloads sent to a spool get counted again once forwarded.
+    Stats with a ``sink`` name also get exported to Prometheus.
+    """
+
+    def __init__(self, sink: str = ""):
+        self.enqueued = 0
+        self.dequeued = 0
+        self.sent = 0
+        self.forwarded = 0
+        self.dropped = 0
+        self.retries = 0
+        self.dead_letters = 0
+        self.send_errors: Dict[str, int] = {}
+        self.send_latency = Buckets(LATENCY_BUCKETS)
+        self.batch_size = Buckets(BATCH_SIZE_BUCKETS)
+        self._queue: Any = None
+        self._lock = threading.Lock()
+        self._prometheus = get_prometheus_metrics(sink)
+
+        # Counts as of the last snapshot, to work out the rates since then
+        self._last_snapshot = (time.monotonic(), 0, 0)
+
+    def incr(self, name: str, amount: int = 1):
+        # Payloads get enqueued and sent from different threads
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+        if self._prometheus is not None:
+            self._prometheus.counters[name].inc(amount)
+
+    def observe_batch(self, size: int):
+        with self._lock:
+            self.dequeued += size
+            self.batch_size.observe(size)
+
+        if self._prometheus is not None:
+            self._prometheus.counters["dequeued"].inc(size)
+            self._prometheus.batch_size.observe(size)
+
+    def observe_send(self, latency: float, error: Optional[str] = None):
+        with self._lock:
+            self.send_latency.observe(latency)
+            if error is not None:
+                self.send_errors[error] = self.send_errors.get(error, 0) + 1
+
+        if self._prometheus is not None:
+            self._prometheus.send_latency.observe(latency)
+            if error is not None:
+                self._prometheus.send_error(error)
+
+    def set_queue(self, q: Any):
+        self._queue = q
+        if self._prometheus is not None:
+            self._prometheus.set_queue_depth(q.qsize)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def dict(self) -> Dict[str, int]:
+        return {name: getattr(self, name) for name in COUNTERS}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get a snapshot of the metrics, including the rates (per second) at
+        which payloads got enqueued and dequeued since the previous
+        snapshot.
+        """
+        now = time.monotonic()
+        with self._lock:
+            snapshot: Dict[str, Any] = self.dict()
+            snapshot["queue_depth"] = self.queue_depth
+            snapshot["send_errors"] = dict(self.send_errors)
+            snapshot["send_latency"] = self.send_latency.dict()
+            snapshot["batch_size"] = self.batch_size.dict()
+
+            last_time, last_enqueued, last_dequeued = self._last_snapshot
+            elapsed = now - last_time
+            snapshot["enqueue_rate"] = (self.enqueued - last_enqueued) / elapsed if elapsed > 0 else 0.0
+            snapshot["dequeue_rate"] = (self.dequeued - last_dequeued) / elapsed if elapsed > 0 else 0.0
+            self._last_snapshot = (now, self.enqueued, self.dequeued)
+
+        return snapshot
+
+
+def put_sync(
+    q: janus._SyncQueueProxy,
+    payload: InsightsRecord,
+    stats: InsightsStats,
+    overflow_policy: InsightsOverflowPolicies = InsightsOverflowPolicies.DROP_OLDEST,
+    overflow_timeout: float = 0.0,
+    loop: Optional[asyncio.AbstractEventLoop] = None,
+):
+    """
+    Enqueue a payload from a synchronous caller, applying the overflow
+    policy if the queue is full.
+    ``BLOCK`` waits for up to ``overflow_timeout`` seconds for a free slot
+    before dropping the payload.
+    Callers running on an event ``loop`` never block, as ``BLOCK`` then
+    waits on the loop's default executor instead.
+    """
+    overflow_policy = InsightsOverflowPolicies(overflow_policy)
+    if overflow_policy == InsightsOverflowPolicies.BLOCK:
+        if loop is not None:
+            try:
+                q.put_nowait(payload)
+            except janus.SyncQueueFull:
+                loop.run_in_executor(None, put_sync, q, payload, stats, overflow_policy, overflow_timeout)
+                return
+
+            stats.incr("enqueued")
+            return
+
+        try:
+            q.put(payload, timeout=overflow_timeout)
+        except janus.SyncQueueFull:
+            stats.incr("dropped")
+            return
+
+        stats.incr("enqueued")
+        return
+
+    while True:
+        try:
+            q.put_nowait(payload)
+            stats.incr("enqueued")
+            return
+        except janus.SyncQueueFull:
+            if overflow_policy == InsightsOverflowPolicies.DROP_NEWEST:
+                stats.incr("dropped")
+                return
+
+        _drop_oldest(q, stats)
+
+
+def put_async(
+    q: janus._AsyncQueueProxy,
+    payload: InsightsRecord,
+    stats: InsightsStats,
+    overflow_policy: InsightsOverflowPolicies = InsightsOverflowPolicies.DROP_OLDEST,
+    overflow_timeout: float = 0.0,
+):
+    """
+    Enqueue a payload from the event loop, without ever awaiting on the
+    caller's side (i.e. ``BLOCK`` waits on a separate task).
+    """
+    overflow_policy = InsightsOverflowPolicies(overflow_policy)
+    while True:
+        try:
+            q.put_nowait(payload)
+            stats.incr("enqueued")
+            return
+        except asyncio.QueueFull:
+            if overflow_policy == InsightsOverflowPolicies.DROP_NEWEST:
+                stats.incr("dropped")
+                return
+
+            if overflow_policy == InsightsOverflowPolicies.BLOCK:
+                asyncio.create_task(_put_with_timeout(q, payload, stats, overflow_timeout))
+                return
+
+        _drop_oldest(q, stats)
+
+
+async def _put_with_timeout(q: janus._AsyncQueueProxy, payload: InsightsRecord, stats: InsightsStats, timeout: float):
+    try:
+        await asyncio.wait_for(q.put(payload), timeout)
+    except asyncio.TimeoutError:
+        stats.incr("dropped")
+        return
+
+    stats.incr("enqueued")
+
+
+def _drop_oldest(q: Any, stats: InsightsStats):
+    try:
+        q.get_nowait()
+    except (janus.SyncQueueEmpty, asyncio.QueueEmpty):
+        # Emptied by the worker in the meantime
+        return
+
+    q.task_done()
+    stats.incr("dropped")
+
+
+def _get_backoff(attempt: int, backoff_factor: float, max_backoff: float) -> float:
+    # Exponential backoff with "full jitter", which spreads out the retries
+    # of different replicas
+    return random.uniform(0, min(max_backoff, backoff_factor * 2 ** attempt))
+
+
+async def _send_with_retries(
+    sink: InsightsSink,
+    batch: List[InsightsRecord],
+    stats: InsightsStats,
+    retries: int = 3,
+    backoff_factor: float = 0.1,
+    max_backoff: float = 10.0,
+) -> Any:
+    """
+    Send a batch to the sink, retrying up to ``retries`` times with
+    exponential backoff.
+
+    Returns
+    -------
+    The error of the last attempt, or ``None`` if the batch got sent.
+    """
+    error: Any = None
+    for attempt in range(retries + 1):
+        if attempt > 0:
+            stats.incr("retries")
+            await asyncio.sleep(_get_backoff(attempt - 1, backoff_factor, max_backoff))
+
+        start = time.perf_counter()
+        try:
+            await sink.send(batch)
+            stats.observe_send(time.perf_counter() - start)
+            return None
+        except InsightsSinkError as err:
+            error = err
+            retryable = err.retryable
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as err:
+            error = err
+            retryable = True
+        except Exception as err:
+            # e.g. payloads which can't be serialised, which won't succeed
+            # on a retry either
+            error = err
+            retryable = False
+
+        stats.observe_send(time.perf_counter() - start, error=_get_error_name(error))
+        if not retryable:
+            break
+
+    return error
+
+
+def _get_error_name(error: Exception) -> str:
+    if isinstance(error, InsightsSinkError) and error.status is not None:
+        return str(error.status)
+
+    return type(error).__name__
+
+
+async def _send_batch(sink: InsightsSink, batch: List[InsightsRecord], stats: InsightsStats, **retry_kwargs):
+    error = await _send_with_retries(sink, batch, stats, **retry_kwargs)
+    if error is None:
+        stats.incr("sent", len(batch))
+        return
+
+    stats.incr("dead_letters", len(batch))
+    logger.error(f"Dropping {len(batch)} payload(s) after failing to send them to insights sink ({error}): {batch}")
+
+
+async def replay_spool(
+    path: str,
+    worker_endpoint: str,
+    batch_size: int = 1,
+    retries: int = 3,
+    backoff_factor: float = 0.1,
+    max_backoff: float = 10.0,
+    request_timeout: float = 10.0,
+    session: aiohttp.ClientSession = None,
+    stats: InsightsStats = None,
+) -> int:
+    """
+    Send the payloads spooled under ``path`` to the insights endpoint,
+    removing each spool file once fully sent.
+    Replay stops at the first batch which can't be sent, leaving it (and
+    the ones after it) spooled for a later replay.
+    Send errors, latencies and retries get recorded on ``stats``, if given.
+
+    Returns
+    -------
+    The number of payloads sent.
+    """
+    if session is None:
+        async with aiohttp.ClientSession() as session:
+            return await replay_spool(
+                path, worker_endpoint, batch_size, retries, backoff_factor, max_backoff, request_timeout, session, stats
+            )
+
+    loop = asyncio.get_running_loop()
+    sink = HTTPSink(worker_endpoint, session, batch_mode=batch_size > 1, request_timeout=request_timeout)
+    if stats is None:
+        stats = InsightsStats()
+
+    sent = 0
+    for file_path in get_spool_files(path):
+        # Claim the file, in case other processes replay the same spool
+        claimed_path = f"{file_path}.{os.getpid()}"
+        try:
+            os.rename(file_path, claimed_path)
+        except FileNotFoundError:
+            continue
+
+        try:
+            try:
+                payloads = await loop.run_in_executor(None, read_spool_file, claimed_path)
+            except Exception as err:
+                # Set corrupt files aside, so that they don't block (or
+                # break) the replay of the rest of the spool
+                logger.error(f"Quarantining corrupt insights spool file {file_path} ({err})")
+                os.rename(claimed_path, file_path + SPOOL_CORRUPT_SUFFIX)
+                continue
+
+            for idx in range(0, len(payloads), batch_size):
+                batch = payloads[idx : idx + batch_size]
+                error = await _send_with_retries(sink, batch, stats, retries, backoff_factor, max_backoff)
+                if error is not None:
+                    logger.warning(f"Stopping replay of insights spool at {file_path} ({error})")
+                    await loop.run_in_executor(None, write_spool_file, file_path, payloads[idx:])
+                    os.remove(claimed_path)
+                    return sent
+
+                sent += len(batch)
+        except BaseException:
+            # e.g. cancelled on shutdown, which leaves the whole file to
+            # replay later on
+            if os.path.exists(claimed_path):
+                os.rename(claimed_path, file_path)
+            raise
+
+        os.remove(claimed_path)
+
+    return sent
+
+
+async def _forward_spool(sink: SpoolSink, worker_endpoint: str, interval: float, stats: InsightsStats, **replay_kwargs):
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await loop.run_in_executor(None, sink.rotate_if_expired)
+            forwarded = await replay_spool(sink.path, worker_endpoint, stats=stats, **replay_kwargs)
+        except Exception as err:
+            # Errors with the spool shouldn't stop the request workers, which
+            # get gathered along with the forwarder
+            logger.error(f"Failed to forward insights spool at {sink.path} ({err})")
+            continue
+
+        stats.incr("forwarded", forwarded)
+
+
+def get_sink_name(sink_type: InsightsSinkTypes, worker_endpoint: str, spool_path: str) -> str:
+    """
+    Get the name the metrics of a sink get labelled with.
+    """
+    if InsightsSinkTypes(sink_type) == InsightsSinkTypes.SPOOL:
+        return spool_path
+
+    return worker_endpoint
+
+
+def _get_sink(
+    sink_type: InsightsSinkTypes,
+    worker_endpoint: str,
+    session: aiohttp.ClientSession,
+    batch_mode: bool,
+    request_timeout: float,
+    spool_path: str,
+    spool_max_bytes: int,
+    spool_max_age: float,
+) -> InsightsSink:
+    if InsightsSinkTypes(sink_type) == InsightsSinkTypes.SPOOL:
+        return SpoolSink(spool_path, max_bytes=spool_max_bytes, max_age=spool_max_age)
+
+    return HTTPSink(worker_endpoint, session, batch_mode=batch_mode, request_timeout=request_timeout)
 
 
 async def start_worker(
     q_in: janus.Queue,
     worker_endpoint: str,
     parallelism: int = 1,
-    batch_size: int = 1,  # TODO
-    retries: int = 3,  # TODO
-    window_time: int = None,  # TODO
+    batch_size: int = 1,
+    retries: int = 3,
+    window_time: int = None,
+    backoff_factor: float = 0.1,
+    max_backoff: float = 10.0,
+    request_timeout: float = 10.0,
+    stats: InsightsStats = None,
+    session: aiohttp.ClientSession = None,
+    sink_type: InsightsSinkTypes = InsightsSinkTypes.HTTP,
+    spool_path: str = "",
+    spool_max_bytes: int = 16 * 1024 * 1024,
+    spool_max_age: float = 300.0,
+    spool_forward_interval: float = 10.0,
+    sink: InsightsSink = None,
 ):
+    """
+    Start ``parallelism`` tasks sending the payloads from the queue to the
+    given ``sink``, or to the one set by ``sink_type`` otherwise (i.e.
+    either to the insights endpoint, over ``session`` if given or a
+    session of their own otherwise, or to a spool under ``spool_path``).
+    With a ``batch_size`` greater than one, payloads get sent in batches
+    (as CloudEvents in batch mode), flushed once full or once
+    ``window_time`` milliseconds have passed since their first payload.
+    Failed requests get retried up to ``retries`` times, with exponential
+    backoff.
+    Spooled payloads get forwarded to the insights endpoint (if any) every
+    ``spool_forward_interval`` seconds.
+    """
     logger.debug("Insights Worker Starting Requests Functions")
+    if stats is None:
+        stats = InsightsStats(get_sink_name(sink_type, worker_endpoint, spool_path))
 
-    async def _start_request_worker():
-        async with aiohttp.ClientSession() as session:
+    stats.set_queue(q_in)
+    retry_kwargs = dict(retries=retries, backoff_factor=backoff_factor, max_backoff=max_backoff)
+
+    async def _start_request_worker(sink: InsightsSink):
+        collector = _BatchCollector(q_in, batch_size, window_time)
+        try:
             while True:
-                payload = await q_in.get()
-                headers = get_cloudevent_headers(payload.request_id, payload.insights_type)
-                try:
-                    async with session.post(worker_endpoint, json=payload.data, headers=headers) as response:
-                        if response.status >= 300:
-                            logger.error(
-                                f"Error code {response.status} sending "
-                                f"payload to insights URI. Data: {payload}, {headers}"
-                            )
-                except aiohttp.ClientConnectorError:
-                    logger.exception("Exception raised sending request to insights URI")
-                q_in.task_done()
-
-    for _ in range(parallelism):
-        asyncio.create_task(_start_request_worker())
-
-    logger.debug("Insights Worker Waiting for worker tasks")
-    await asyncio.gather(*asyncio.all_tasks())
+                batch = await collector.next_batch()
+                stats.observe_batch(len(batch))  # type: ignore
+                await _send_batch(sink, batch, stats, **retry_kwargs)  # type: ignore
+                for _ in batch:
+                    q_in.task_done()
+        finally:
+            collector.cancel()
+
+    async def _start_request_workers(session: aiohttp.ClientSession):
+        worker_sink = sink
+        if worker_sink is None:
+            worker_sink = _get_sink(
+                sink_type,
+                worker_endpoint,
+                session,
+                batch_size > 1,
+                request_timeout,
+                spool_path,
+                spool_max_bytes,
+                spool_max_age,
+            )
+
+        tasks = [asyncio.create_task(_start_request_worker(worker_sink)) for _ in range(parallelism)]
+        if isinstance(worker_sink, SpoolSink) and worker_endpoint:
+            forwarder = _forward_spool(
+                worker_sink,
+                worker_endpoint,
+                spool_forward_interval,
+                stats,  # type: ignore
+                batch_size=batch_size,
+                request_timeout=request_timeout,
+                session=session,
+                **retry_kwargs,
+            )
+            tasks.append(asyncio.create_task(forwarder))
+
+        logger.debug("Insights Worker Waiting for worker tasks")
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if sink is None:
+                await worker_sink.close()
+
+    if session is not None:
+        await _start_request_workers(session)
+        return
+
+    async with aiohttp.ClientSession() as session:
+        await _start_request_workers(session)
 
 
 def start_insights_worker_from_async(
-    worker_endpoint: str,
-    parallelism: int = 1,
-    batch_size: int = 1,  # TODO
-    retries: int = 3,  # TODO
-    window_time: int = None,  # TODO
+    worker_endpoint: str, max_queue_size: int = 0, **worker_kwargs
 ) -> janus._AsyncQueueProxy:
+    """
+    Start the insights worker on the running event loop.
+    The returned queue holds up to ``max_queue_size`` payloads (or is
+    unbounded if zero).
+    """
+    queue: janus.Queue = janus.Queue(maxsize=max_queue_size)
 
-    queue: janus.Queue = janus.Queue()
-
-    args = (
-        queue.async_q,
-        worker_endpoint,
-        parallelism,
-        batch_size,
-        retries,
-        window_time,
-    )
-    logger.debug(f"Insights Worker starting insights worker from ASYNC with params {args}")
+    logger.debug(f"Insights Worker starting insights worker from ASYNC with params {worker_kwargs}")
 
-    asyncio.create_task(start_worker(*args))  # type: ignore
+    asyncio.create_task(start_worker(queue.async_q, worker_endpoint, **worker_kwargs))  # type: ignore
 
     return queue.async_q
 
 
-def sync_init_loop_queue(
-    event,
-    worker_endpoint,
-    parallelism,
-    batch_size,
-    retries,
-    window_time,
-):
+def sync_init_loop_queue(event, worker_endpoint, max_queue_size, worker_kwargs):
     async def inner_loop():
-        event.queue = janus.Queue()
+        event.queue = janus.Queue(maxsize=max_queue_size)
         event.set()
 
-        await start_worker(
-            event.queue.async_q,
-            worker_endpoint,
-            parallelism,
-            batch_size,
-            retries,
-            window_time,
-        )
+        await start_worker(event.queue.async_q, worker_endpoint, **worker_kwargs)
 
     asyncio.run(inner_loop())
 
 
 def start_insights_worker_from_sync(
-    worker_endpoint: str = "",
-    batch_size: int = 1,
-    parallelism: int = 1,
-    retries: int = 3,
-    output_file_path: str = None,
-    window_time: int = None,
+    worker_endpoint: str = "", max_queue_size: int = 0, **worker_kwargs
 ) -> janus._SyncQueueProxy:
-
+    """
+    Start the insights worker on its own thread and event loop.
+    The returned queue holds up to ``max_queue_size`` payloads (or is
+    unbounded if zero).
+    """
     event = threading.Event()
-    args = (
-        event,
-        worker_endpoint,
-        parallelism,
-        batch_size,
-        retries,
-        window_time,
-    )
+    args = (event, worker_endpoint, max_queue_size, worker_kwargs)
     logger.debug(f"Insights Worker starting insights worker from sync with params {args}")
     thread = threading.Thread(target=sync_init_loop_queue, args=args)
     # Setting daemon to avoid hanging when process killed
@@ -1,6 +1,13 @@
+import asyncio
+import contextvars
+import functools
+import gc
 import json
+import multiprocessing
 import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from inspect import iscoroutinefunction
+from typing import Any, Callable, Optional
 
 from mlserver import MLModel
 from mlserver.types import InferenceRequest, InferenceResponse
@@ -8,14 +15,36 @@ from mlserver.utils import get_model_uri
 
 from tempo.magic import PayloadContext, TempoContextWrapper, tempo_context
 
+from .aio.mixin import _AsyncMixin
 from .insights.manager import InsightsManager
 from .insights.wrapper import InsightsWrapper
 from .serve.base import BaseModel
+from .serve.batching import AsyncBatcher
 from .serve.constants import ENV_TEMPO_RUNTIME_OPTIONS
 from .serve.loader import load
-from .serve.metadata import InsightRequestModes, InsightsTypes, ModelFramework, dict_to_runtime
+from .serve.metadata import ExecutorTypes, InsightRequestModes, InsightsTypes, ModelFramework, dict_to_runtime
 from .serve.utils import PredictMethodAttr
-from .state.state import BaseState
+from .state.state import AsyncRedisState, BaseState, CachedRedisState
+
+try:
+    from prometheus_client import Gauge
+
+    _executor_queue_depth = Gauge(
+        "tempo_executor_queue_depth",
+        "Number of requests dispatched to the model's executor which haven't completed yet",
+        ["model"],
+    )
+except ImportError:
+    _executor_queue_depth = None
+
+_log_request_modes = {InsightRequestModes.ALL, InsightRequestModes.REQUEST}
+_log_response_modes = {InsightRequestModes.ALL, InsightRequestModes.RESPONSE}
+
+# Model loaded by each worker process of a process pool executor
+_worker_model: Optional[BaseModel] = None
+# Barrier shared by the forked worker processes, used to start all of them
+# at once
+_worker_barrier: Any = None
 
 
 def _needs_init(model: BaseModel):
@@ -26,6 +55,91 @@ def _needs_init(model: BaseModel):
     return is_class and has_annotation and not is_bound
 
 
+def _load_model(model_uri: str) -> BaseModel:
+    model = load(model_uri)
+    model.details.local_folder = model_uri
+
+    if model.details.platform == ModelFramework.TempoPipeline:
+        # If pipeline, call children models remotely
+        model.set_remote(True)
+
+    if _needs_init(model):
+        instance = model._K()
+        # Make sure that the model is the instance's model (and not the
+        # class attribute)
+        model = instance.get_tempo()
+
+    if model._load_func:
+        model._load_func()
+
+    return model
+
+
+def _load_runtime(model: BaseModel):
+    rt_options_str = os.getenv(ENV_TEMPO_RUNTIME_OPTIONS)
+    if rt_options_str:
+        rt_options = dict_to_runtime(json.loads(rt_options_str))
+        model.set_runtime_options_override(rt_options)
+
+
+def _get_runtime_options(model: BaseModel):
+    runtime_options = model.runtime_options_override
+    if not runtime_options:
+        runtime_options = model.model_spec.runtime_options
+
+    return runtime_options
+
+
+def _init_worker(model_uri: str):
+    model = _load_model(model_uri)
+    _load_runtime(model)
+    _init_worker_model(model)
+
+
+def _init_forked_worker(model: BaseModel, barrier: Any):
+    global _worker_barrier
+
+    # The model was already loaded by the parent process before forking, and
+    # gets inherited (rather than pickled) through the initializer's args
+    _init_worker_model(model)
+    _worker_barrier = barrier
+
+
+def _init_worker_model(model: Any):
+    global _worker_model
+
+    # Connections and background workers can't be shared with the parent
+    # process. Workers call the model outside of any event loop, so their
+    # insights can't go through an asyncio worker.
+    runtime_options = _get_runtime_options(model)
+    insights_params = {**runtime_options.insights_options.dict(), "in_asyncio": False}
+    model.insights_manager = InsightsManager(**insights_params)
+    model.state = BaseState.from_conf(runtime_options.state_options)
+
+    _worker_model = model
+
+
+def _worker_ready() -> bool:
+    # Block until every worker holds one of these calls, so that each of them
+    # gets picked up by a different process
+    _worker_barrier.wait()
+    return True
+
+
+def _worker_request(request_dict: dict) -> dict:
+    model: Any = _worker_model
+    payload_context = PayloadContext(request_id=request_dict.get("id"), request=request_dict)
+    tempo_wrapper = TempoContextWrapper(payload_context, InsightsWrapper(model.insights_manager), model.state)
+    tempo_context.set(tempo_wrapper)
+
+    return model.request(request_dict)
+
+
+def _worker_call(*args, **kwargs) -> Any:
+    model: Any = _worker_model
+    return model(*args, **kwargs)
+
+
 class InferenceRuntime(MLModel):
     async def load(self) -> bool:
         self._model = await self._load_model()
@@ -34,51 +148,100 @@ class InferenceRuntime(MLModel):
         await self._load_state()
 
         self._is_coroutine = iscoroutinefunction(self._model.request)
+        await self._load_executor()
+        await self._load_batcher()
 
         self.ready = True
         return self.ready
 
     async def _load_model(self) -> BaseModel:
-        model_uri = await get_model_uri(self._settings)
-
-        model = load(model_uri)
-        model.details.local_folder = model_uri
-
-        if model.details.platform == ModelFramework.TempoPipeline:
-            # If pipeline, call children models remotely
-            model.set_remote(True)
-
-        if _needs_init(model):
-            instance = model._K()
-            # Make sure that the model is the instance's model (and not the
-            # class attribute)
-            model = instance.get_tempo()
-
-        if model._load_func:
-            model._load_func()
-
-        return model
+        self._model_uri = await get_model_uri(self._settings)
+        return _load_model(self._model_uri)
 
     async def _load_state(self):
-        runtime_options = self._model.runtime_options_override
-        if not runtime_options:
-            runtime_options = self._model.model_spec.runtime_options
-
+        runtime_options = _get_runtime_options(self._model)
         self.state = BaseState.from_conf(runtime_options.state_options)
 
     async def _load_insights(self):
-        runtime_options = self._model.runtime_options_override
-        if not runtime_options:
-            runtime_options = self._model.model_spec.runtime_options
+        runtime_options = _get_runtime_options(self._model)
         insights_params = runtime_options.insights_options.dict()
 
         self.insights_manager = InsightsManager(**insights_params)
+        self._insights_mode = InsightRequestModes(runtime_options.insights_options.mode_type)
+
+    async def _load_batcher(self):
+        batching_options = _get_runtime_options(self._model).batching_options
+
+        self._batcher = None
+        if batching_options.max_batch_size > 1 and self._model._user_func is not None:
+            self._batcher = AsyncBatcher(self._call_model, batching_options)
 
     async def _load_runtime(self):
-        rt_options_str = os.getenv(ENV_TEMPO_RUNTIME_OPTIONS)
-        if rt_options_str:
-            rt_options = dict_to_runtime(json.loads(rt_options_str))
-            self._model.set_runtime_options_override(rt_options)
+        _load_runtime(self._model)
+
+    async def _load_executor(self):
+        executor_options = _get_runtime_options(self._model).executor_options
+        executor_type = ExecutorTypes(executor_options.executor_type)
+
+        self._executor: Optional[Executor] = None
+        self._executor_queue_depth = 0
+        self._gc_frozen = False
+        if self._is_coroutine:
+            # Async models already run on the event loop
+            return
+
+        if executor_type == ExecutorTypes.THREAD:
+            self._executor = ThreadPoolExecutor(max_workers=executor_options.max_workers)
+        elif executor_type == ExecutorTypes.PROCESS:
+            self._executor = ProcessPoolExecutor(
+                max_workers=executor_options.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self._model_uri,),
+            )
+        elif executor_type == ExecutorTypes.FORK:
+            await self._fork_workers(executor_options.max_workers)
+
+    async def _fork_workers(self, max_workers: Optional[int]):
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+
+        # Move the loaded model out of the GC's reach, so that collections
+        # in the workers don't touch (and thus copy) its memory pages
+        gc.freeze()
+        self._gc_frozen = True
+
+        mp_context = multiprocessing.get_context("fork")
+        self._executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=mp_context,
+            initializer=_init_forked_worker,
+            initargs=(self._model, mp_context.Barrier(max_workers)),
+        )
+        # Fork all workers now, while the model is freshly loaded, as the
+        # executor would otherwise spawn them on demand while serving
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self._executor, _worker_ready) for _ in range(max_workers)])
+
+    async def unload(self) -> bool:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+        if self._gc_frozen:
+            gc.unfreeze()
+            self._gc_frozen = False
+
+        if isinstance(self.state, AsyncRedisState):
+            await self.state.close()
+        elif isinstance(self.state, CachedRedisState):
+            self.state.close()
+
+        if isinstance(self._model, _AsyncMixin):
+            await self._model.close()
+
+        self.insights_manager.close()
+        return True
 
     async def predict(self, request: InferenceRequest) -> InferenceResponse:
 
@@ -90,21 +253,65 @@ class InferenceRuntime(MLModel):
         tempo_wrapper = TempoContextWrapper(payload_context, insights_wrapper, self.state)
         tempo_context.set(tempo_wrapper)
 
-        response_dict = self._model.request(request_dict)
-        if self._is_coroutine:
-            response_dict = await response_dict  # type: ignore
+        response_dict = await self._request(request_dict)
 
         # TODO: Ensure model_version is added by mlserver
         response_dict["model_version"] = "NOTIMPLEMENTED"
 
-        # TODO: Move to functions declared upfront with logic contained to avoid if
-        if self._model.get_insights_mode == InsightRequestModes.ALL:
-            insights_wrapper.log(request_dict, insights_type=InsightsTypes.INFER_REQUEST)
-            insights_wrapper.log(response_dict, insights_type=InsightsTypes.INFER_RESPONSE)
-        else:
-            if self._model.get_insights_mode == InsightRequestModes.REQUEST or insights_wrapper.set_log_request:
+        log_request = self._insights_mode in _log_request_modes or insights_wrapper.set_log_request
+        log_response = self._insights_mode in _log_response_modes or insights_wrapper.set_log_response
+        # Unsampled requests skip building any insights payload
+        if (log_request or log_response) and self.insights_manager.sample(request.id):
+            if log_request:
                 insights_wrapper.log(request_dict, insights_type=InsightsTypes.INFER_REQUEST)
-            if self._model.get_insights_mode == InsightRequestModes.RESPONSE or insights_wrapper.set_log_response:
+            if log_response:
                 insights_wrapper.log(response_dict, insights_type=InsightsTypes.INFER_RESPONSE)
 
         return InferenceResponse(**response_dict)
+
+    async def _request(self, request_dict: dict) -> dict:
+        if self._batcher is None:
+            if self._is_coroutine:
+                return await self._model.request(request_dict)  # type: ignore
+
+            return await self._run_sync(self._model.request, _worker_request, request_dict)
+
+        # Concurrent requests get merged into a single call to the model,
+        # which runs within the context of the first request of the batch
+        codec_plan = self._model._get_codec_plan(self._model.model_spec)
+        args, kwargs = codec_plan.decode_request(request_dict)
+        response = await self._batcher.submit(*args, **kwargs)
+        return codec_plan.encode_response(response)
+
+    async def _call_model(self, *args, **kwargs):
+        if self._is_coroutine:
+            return await self._model(*args, **kwargs)
+
+        return await self._run_sync(self._model, _worker_call, *args, **kwargs)
+
+    async def _run_sync(self, func: Callable, worker_func: Callable, *args, **kwargs) -> Any:
+        """
+        Call a synchronous method of the model, dispatching it to the
+        executor (if any) so that it doesn't block the event loop.
+        Worker processes hold their own copy of the model, so they run
+        ``worker_func`` instead.
+        """
+        if self._executor is None:
+            return func(*args, **kwargs)
+
+        if isinstance(self._executor, ProcessPoolExecutor):
+            call = functools.partial(worker_func, *args, **kwargs)
+        else:
+            # Executor threads don't inherit the request's context
+            call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+
+        self._set_executor_queue_depth(1)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+        finally:
+            self._set_executor_queue_depth(-1)
+
+    def _set_executor_queue_depth(self, delta: int):
+        self._executor_queue_depth += delta
+        if _executor_queue_depth is not None:
+            _executor_queue_depth.labels(model=self.name).set(self._executor_queue_depth)
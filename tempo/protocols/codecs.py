@@ -0,0 +1,122 @@
+"""
+Codecs used to encode non-tensor values (e.g. strings, bytes or
+dictionaries) as V2 ``BYTES`` tensors.
+
+Each codec is registered against the Python type it handles, and is
+advertised on the wire through the ``content_type`` parameter of the tensor,
+so that the other end can pick the right parser.
+"""
+import abc
+import base64
+from io import StringIO
+from typing import Any, Dict, Optional, Type
+
+import orjson
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+
+class BytesCodec(abc.ABC):
+    content_type: str = ""
+
+    @abc.abstractmethod
+    def encode(self, data: Any) -> str:
+        pass
+
+    @abc.abstractmethod
+    def decode(self, encoded: Any) -> Any:
+        pass
+
+
+class StringCodec(BytesCodec):
+    content_type = "str"
+
+    def encode(self, data: str) -> str:
+        return data
+
+    def decode(self, encoded: Any) -> str:
+        if isinstance(encoded, (bytes, bytearray, memoryview)):
+            return bytes(encoded).decode("utf-8")
+        return encoded
+
+
+class Base64Codec(BytesCodec):
+    content_type = "base64"
+
+    def encode(self, data: bytes) -> str:
+        return base64.b64encode(data).decode("ascii")
+
+    def decode(self, encoded: Any) -> bytes:
+        return base64.b64decode(encoded)
+
+
+class JSONCodec(BytesCodec):
+    content_type = "json"
+
+    def encode(self, data: Any) -> str:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY).decode("utf-8")
+
+    def decode(self, encoded: Any) -> Any:
+        return orjson.loads(encoded)
+
+
+class PandasCodec(BytesCodec):
+    def __init__(self, typ: str = "frame"):
+        self.typ = typ
+        self.content_type = f"pd.{typ}.json"
+
+    def encode(self, data: Any) -> str:
+        return data.to_json(orient="split")
+
+    def decode(self, encoded: Any) -> Any:
+        if isinstance(encoded, (bytes, bytearray, memoryview)):
+            encoded = bytes(encoded).decode("utf-8")
+
+        return pd.read_json(StringIO(encoded), orient="split", typ=self.typ)
+
+
+_codecs_by_type: Dict[Type, BytesCodec] = {}
+_codecs_by_content_type: Dict[str, BytesCodec] = {}
+
+
+def register_bytes_codec(ty: Type, codec: BytesCodec):
+    _codecs_by_type[ty] = codec
+    _codecs_by_content_type[codec.content_type] = codec
+
+
+def find_codec_by_type(ty: Optional[Type]) -> Optional[BytesCodec]:
+    if ty is None:
+        return None
+
+    # Resolve generics (e.g. `Dict[str, int]`) to their origin type
+    ty = getattr(ty, "__origin__", ty)
+    codec = _codecs_by_type.get(ty)
+    if codec is not None:
+        return codec
+
+    if isinstance(ty, type):
+        for registered_ty, codec in _codecs_by_type.items():
+            if issubclass(ty, registered_ty):
+                return codec
+
+    return None
+
+
+def find_codec_by_content_type(content_type: Optional[str]) -> Optional[BytesCodec]:
+    if content_type is None:
+        return None
+
+    return _codecs_by_content_type.get(content_type)
+
+
+register_bytes_codec(str, StringCodec())
+register_bytes_codec(bytes, Base64Codec())
+register_bytes_codec(dict, JSONCodec())
+register_bytes_codec(list, JSONCodec())
+
+if pd is not None:
+    register_bytes_codec(pd.DataFrame, PandasCodec(typ="frame"))
+    register_bytes_codec(pd.Series, PandasCodec(typ="series"))
@@ -16,6 +16,15 @@ class SeldonProtocol(Protocol):
         return "/api/v1.0/health/status"
 
     def to_protocol_request(self, *args, **kwargs) -> Dict:
+        return self._create_request(False, *args, **kwargs)
+
+    def encode_request(self, *args, **kwargs) -> bytes:
+        # Let the serializer write the arrays straight from their buffers if
+        # it can
+        request = self._create_request(self.serializer.supports_numpy, *args, **kwargs)
+        return self.serializer.dumps(request)
+
+    def _create_request(self, keep_np: bool, *args, **kwargs) -> Dict:
         if not len(args) + len(kwargs) == 1:
             raise ValueError("Seldon protocol can only take a single input")
 
@@ -31,7 +40,7 @@ class SeldonProtocol(Protocol):
         elif raw_type == list:
             return {"data": {"ndarray": raw}}
         elif raw_type == np.ndarray:
-            return {"data": {"ndarray": raw.tolist()}}
+            return {"data": {"ndarray": raw if keep_np else raw.tolist()}}
 
         raise ValueError(f"Unknown input type {raw_type}")
 
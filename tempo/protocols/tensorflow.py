@@ -1,4 +1,4 @@
-from typing import Any, Dict, List, Optional, Type, Union
+from typing import Any, Callable, Dict, List, Optional, Type, Union
 
 import numpy as np
 
@@ -24,6 +24,17 @@ class TensorflowProtocol(Protocol):
         return f"/v1/models/{model_details.name}"
 
     def to_protocol_request(self, *args, **kwargs) -> Dict:
+        return self._create_request(TensorflowProtocol.create_v1_from_np, *args, **kwargs)
+
+    def encode_request(self, *args, **kwargs) -> bytes:
+        if not self.serializer.supports_numpy:
+            return super().encode_request(*args, **kwargs)
+
+        # Let the serializer write the arrays straight from their buffers
+        request = self._create_request(lambda arr, name=None: arr, *args, **kwargs)
+        return self.serializer.dumps(request)
+
+    def _create_request(self, create_from_np: Callable[..., Any], *args, **kwargs) -> Dict:
         if len(args) > 0 and len(kwargs.values()) > 0:
             raise ValueError("KFserving V1 protocol only supports either named or unamed arguments but not both")
 
@@ -33,13 +44,13 @@ class TensorflowProtocol(Protocol):
                 raw_type = type(raw)
 
                 if raw_type == np.ndarray:
-                    inputs.append(TensorflowProtocol.create_v1_from_np(raw))
+                    inputs.append(create_from_np(raw))
         else:
             for (name, raw) in kwargs.items():
                 raw_type = type(raw)
 
                 if raw_type == np.ndarray:
-                    inputs.append(TensorflowProtocol.create_v1_from_np(raw, name))
+                    inputs.append(create_from_np(raw, name))
                 else:
                     raise ValueError(f"Unknown input type {raw_type}")
 
@@ -1,13 +1,28 @@
+import json
 from ast import literal_eval
-from typing import Any, Dict, Optional, Type
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union
 
+import attr
 import numpy as np
 
+try:
+    from ml_dtypes import bfloat16
+except ImportError:
+    bfloat16 = None
+
+from tempo.protocols.codecs import StringCodec, find_codec_by_content_type, find_codec_by_type
 from tempo.serve.metadata import ModelDataArgs, ModelDetails
-from tempo.serve.protocol import Protocol
+from tempo.serve.protocol import CodecPlan, Protocol, to_call_args
 
 _REQUEST_NUMPY_CONTENT_TYPE = {"content_type": "np"}
 
+# Binary tensor data extension, as implemented by KServe / Triton. See
+# https://github.com/triton-inference-server/server/blob/main/docs/protocol/extension_binary_data.md
+InferenceHeaderContentLength = "Inference-Header-Content-Length"
+BinaryContentType = "application/octet-stream"
+_BINARY_DATA_SIZE = "binary_data_size"
+_BINARY_DATA_OUTPUT = "binary_data_output"
+
 _v2tymap: Dict[str, np.dtype] = {
     "BOOL": np.dtype("bool"),
     "UINT8": np.dtype("uint8"),
@@ -18,30 +33,143 @@ _v2tymap: Dict[str, np.dtype] = {
     "INT16": np.dtype("int16"),
     "INT32": np.dtype("int32"),
     "INT64": np.dtype("int64"),
-    "FP16": np.dtype("float32"),
+    "FP16": np.dtype("float16"),
     "FP32": np.dtype("float32"),
     "FP64": np.dtype("float64"),
 }
 
+if bfloat16 is not None:
+    _v2tymap["BF16"] = np.dtype(bfloat16)
+
+_string_codec = StringCodec()
+
 _nptymap = dict([(value, key) for key, value in _v2tymap.items()])
-_nptymap[np.dtype("float32")] = "FP32"  # Ensure correct mapping for ambiguous type
+
+# Allowed downcasts for the wire precision policy
+_wire_downcasts = {
+    "FP64": {"FP32", "FP16", "BF16"},
+    "FP32": {"FP16", "BF16"},
+}
 
 
+@attr.s(auto_attribs=True)
 class V2Protocol(Protocol):
+    """
+    KFServing V2 protocol.
+
+    Parameters
+    ----------
+    binary_data
+     Send numpy arrays using the binary tensor data extension (i.e. a JSON
+     header followed by the raw little-endian buffers) instead of JSON lists.
+     Requires the server to support the extension (e.g. Triton).
+    wire_precision
+     Downcasts to apply to floating point arrays before sending them, as a
+     mapping from the array's datatype to the one used on the wire (e.g.
+     ``{"FP64": "FP32"}``). Supported targets are ``FP32``, ``FP16`` and
+     ``BF16`` (the latter requires ``ml_dtypes``).
+    """
+
+    binary_data: bool = False
+    wire_precision: Dict[str, str] = attr.ib(factory=dict)
+
+    @wire_precision.validator
+    def _check_wire_precision(self, attribute, value):
+        for datatype, wire_datatype in value.items():
+            if wire_datatype not in _wire_downcasts.get(datatype, set()):
+                raise ValueError(f"Unsupported wire precision downcast from {datatype} to {wire_datatype}")
+
+            if wire_datatype not in _v2tymap:
+                raise ValueError(f"Wire precision {wire_datatype} requires the ml_dtypes package")
+
+    def to_wire(self, arr: np.ndarray) -> np.ndarray:
+        """
+        Apply the wire precision policy to an array.
+        """
+        if not self.wire_precision:
+            return arr
+
+        wire_datatype = self.wire_precision.get(_nptymap.get(arr.dtype, ""))
+        if wire_datatype is None:
+            return arr
+
+        return arr.astype(_v2tymap[wire_datatype])
+
     @staticmethod
     def create_v2_from_np(arr: np.ndarray, name: str) -> Dict:
-        if arr.dtype in _nptymap:
+        if _is_string_array(arr):
+            return V2Protocol.create_v2_from_strings(arr, name)
+        elif arr.dtype in _nptymap:
+            datatype = _nptymap[arr.dtype]
+            if datatype == "BF16":
+                arr = arr.astype(np.float32)
             return {
                 "name": name,
-                "datatype": _nptymap[arr.dtype],
+                "datatype": datatype,
                 "data": arr.flatten().tolist(),
                 "shape": list(arr.shape),
             }
         else:
             raise ValueError(f"Unknown numpy type {arr.dtype}")
 
+    @staticmethod
+    def create_v2_from_strings(strings: Union[np.ndarray, List[str]], name: str) -> Dict:
+        """
+        Encode a list or array of strings as a single BYTES tensor, with one
+        element per string.
+        """
+        if isinstance(strings, np.ndarray):
+            shape = list(strings.shape)
+            if strings.dtype.kind == "S":
+                strings = np.char.decode(strings, "utf-8")
+            data = [elem.decode("utf-8") if isinstance(elem, bytes) else elem for elem in strings.reshape(-1).tolist()]
+        else:
+            shape = [len(strings)]
+            data = strings
+
+        return {
+            "name": name,
+            "datatype": "BYTES",
+            "data": data,
+            "shape": shape,
+            "parameters": {"content_type": StringCodec.content_type},
+        }
+
+    @staticmethod
+    def create_binary_from_np(arr: np.ndarray, name: str) -> Tuple[Dict, memoryview]:
+        if arr.dtype not in _nptymap:
+            raise ValueError(f"Unknown numpy type {arr.dtype}")
+
+        # Only copies if the array is non-contiguous or big-endian
+        buf = np.ascontiguousarray(arr, dtype=arr.dtype.newbyteorder("<"))
+        raw = memoryview(buf.reshape(-1).view(np.uint8))
+        return {
+            "name": name,
+            "datatype": _nptymap[arr.dtype],
+            "shape": list(arr.shape),
+            "parameters": {_BINARY_DATA_SIZE: raw.nbytes},
+        }, raw
+
     @staticmethod
     def create_v2_from_any(data: Any, name: str) -> Dict:
+        if _is_string_list(data):
+            return V2Protocol.create_v2_from_strings(data, name)
+
+        codec = find_codec_by_type(type(data))
+        if codec is not None:
+            try:
+                return {
+                    "name": name,
+                    "datatype": "BYTES",
+                    "data": [codec.encode(data)],
+                    "shape": [1],
+                    "parameters": {"content_type": codec.content_type},
+                }
+            except TypeError:
+                # Values the codec can't represent (e.g. dicts with non-string
+                # keys in JSON) fall back to the legacy format
+                pass
+
         if isinstance(data, str):
             b = list(bytes(data, "utf-8"))
         else:
@@ -55,16 +183,69 @@ class V2Protocol(Protocol):
 
     @staticmethod
     def convert_from_bytes(output: dict, ty: Optional[Type]) -> Any:
+        data = output["data"]
+        parameters = output.get("parameters") or {}
+        codec = find_codec_by_content_type(parameters.get("content_type"))
+        is_array_ty = getattr(ty, "__origin__", ty) is list or ty == np.ndarray
+        if codec is None and _is_encoded_list(data):
+            if len(data) == 1 and isinstance(data[0], bytes) and not is_array_ty:
+                # Raw contents (i.e. from gRPC or the binary extension) of a
+                # single element, which may hold a value in the legacy format
+                data = data[0]
+            else:
+                # String elements without a content type (e.g. coming from a
+                # non-Tempo client), so rely on the declared type
+                codec = find_codec_by_type(ty)
+                if codec is None or is_array_ty:
+                    codec = _string_codec
+
+        if isinstance(codec, StringCodec):
+            return V2Protocol.convert_from_strings(data, output.get("shape"), ty)
+
+        if codec is not None:
+            if isinstance(data, list):
+                data = data[0]
+            return codec.decode(data)
+
+        # Legacy format, where the value is sent as a list of the bytes of its
+        # `repr()`
         if ty == str:
-            return bytearray(output["data"]).decode("UTF-8")
+            return bytearray(data).decode("UTF-8")
         else:
-            py_str = bytearray(output["data"]).decode("UTF-8")
+            py_str = bytearray(data).decode("UTF-8")
             return literal_eval(py_str)
 
     @staticmethod
-    def create_np_from_v2(data: list, ty: str, shape: list) -> np.ndarray:
-        if ty in _v2tymap:
+    def convert_from_strings(data: Any, shape: Optional[List[int]], ty: Optional[Type]) -> Any:
+        if not isinstance(data, list):
+            data = [data]
+
+        if ty == str:
+            return _string_codec.decode(data[0])
+
+        if ty == np.ndarray:
+            if len(data) > 0 and not isinstance(data[0], str):
+                arr = np.char.decode(np.array(data, dtype=bytes), "utf-8")
+            else:
+                arr = np.array(data, dtype=str)
+            return arr.reshape(shape if shape is not None else -1)
+
+        return [_string_codec.decode(elem) for elem in data]
+
+    @staticmethod
+    def create_np_from_v2(data: Any, ty: str, shape: list) -> np.ndarray:
+        if ty == "BF16" and ty not in _v2tymap:
+            # Without ml_dtypes, expose the raw bfloat16 bits as uint16
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                return np.frombuffer(data, dtype="<u2").reshape(shape)
+            return float32_to_bfloat16_bits(np.array(data, dtype=np.float32)).reshape(shape)
+        elif ty in _v2tymap:
             npty = _v2tymap[ty]
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                # Raw buffer from the binary extension: view it without
+                # copying (note that the resulting array is read-only if the
+                # underlying buffer is)
+                return np.frombuffer(data, dtype=npty.newbyteorder("<")).reshape(shape)
             arr = np.array(data, dtype=npty)
             arr.shape = tuple(shape)
             return arr
@@ -78,6 +259,51 @@ class V2Protocol(Protocol):
         return f"/v2/models/{model_details.name}/ready"
 
     def to_protocol_request(self, *args, **kwargs) -> Dict:
+        return self._create_request(V2Protocol.create_v2_from_np, *args, **kwargs)
+
+    def encode_request(self, *args, **kwargs) -> bytes:
+        if not self.serializer.supports_numpy:
+            return super().encode_request(*args, **kwargs)
+
+        # Let the serializer write the arrays straight from their buffers
+        request = self._create_request(_create_v2_from_np_buffer, *args, **kwargs)
+        return self.serializer.dumps(request)
+
+    def to_binary_request(self, *args, **kwargs) -> Tuple[bytes, int]:
+        """
+        Encode the request using the binary tensor data extension.
+
+        Returns
+        -------
+        The request body and the length of its JSON header, to be sent as
+        the ``Inference-Header-Content-Length`` HTTP header.
+        """
+        buffers: List[memoryview] = []
+
+        def _create_binary(arr: np.ndarray, name: str) -> Dict:
+            if _is_string_array(arr):
+                # Strings are sent as part of the JSON header
+                return V2Protocol.create_v2_from_strings(arr, name)
+
+            tensor, buf = V2Protocol.create_binary_from_np(arr, name)
+            buffers.append(buf)
+            return tensor
+
+        request = self._create_request(_create_binary, *args, **kwargs)
+        parameters = request.setdefault("parameters", {})
+        parameters[_BINARY_DATA_OUTPUT] = True
+        return V2Protocol.encode_binary(request, buffers)
+
+    def to_raw_request(self, *args, **kwargs) -> Dict:
+        """
+        Encode the request keeping the data of each numeric tensor as a raw
+        little-endian buffer (e.g. to send it as ``raw_input_contents``
+        over gRPC).
+        String tensors are kept as a list of elements.
+        """
+        return self._create_request(_create_v2_raw_from_np, *args, **kwargs)
+
+    def _create_request(self, create_from_np: Callable[[np.ndarray, str], Dict], *args, **kwargs) -> Dict:
         # if len(args) > 0:
         #    raise ValueError("KFserving V2 protocol only supports named arguments")
 
@@ -90,31 +316,65 @@ class V2Protocol(Protocol):
         args_num = 0
         numpy_args_num = 0
         if len(args) > 0:
-            for idx, raw in enumerate(args):
-                raw_type = type(raw)
-                args_num += 1
-                if raw_type == np.ndarray:
-                    numpy_args_num += 1
-                    inputs.append(V2Protocol.create_v2_from_np(raw, "input-" + str(idx)))
-                else:
-                    inputs.append(V2Protocol.create_v2_from_any(raw, "input-" + str(idx)))
+            named_args = [("input-" + str(idx), raw) for idx, raw in enumerate(args)]
         else:
-            for (name, raw) in kwargs.items():
-                raw_type = type(raw)
-                args_num += 1
-                if raw_type == np.ndarray:
-                    numpy_args_num += 1
-                    inputs.append(V2Protocol.create_v2_from_np(raw, name))
-                else:
-                    inputs.append(V2Protocol.create_v2_from_any(raw, name))
+            named_args = list(kwargs.items())
+
+        for (name, raw) in named_args:
+            raw_type = type(raw)
+            args_num += 1
+            if raw_type == np.ndarray:
+                numpy_args_num += 1
+                inputs.append(create_from_np(self.to_wire(raw), name))
+            else:
+                inputs.append(V2Protocol.create_v2_from_any(raw, name))
 
         request_ret = {"inputs": inputs}
-        np_inference_request_enabled = {"parameters": _REQUEST_NUMPY_CONTENT_TYPE}
+        np_inference_request_enabled = {"parameters": dict(_REQUEST_NUMPY_CONTENT_TYPE)}
         if args_num == numpy_args_num == 1:
             return {**request_ret, **np_inference_request_enabled}
 
         return request_ret
 
+    @staticmethod
+    def encode_binary(payload: Dict, buffers: List[memoryview]) -> Tuple[bytes, int]:
+        header = json.dumps(payload).encode("utf-8")
+        return b"".join([header, *buffers]), len(header)
+
+    @staticmethod
+    def decode_binary(body: bytes, header_length: int) -> Dict:
+        """
+        Split a body encoded with the binary tensor data extension into its
+        JSON header, replacing the ``data`` of each binary tensor with a
+        zero-copy view over its slice of the body.
+        """
+        view = memoryview(body)
+        payload = json.loads(bytes(view[:header_length]))
+        offset = header_length
+        for tensor in payload.get("inputs", []) + payload.get("outputs", []):
+            parameters = tensor.get("parameters") or {}
+            size = parameters.get(_BINARY_DATA_SIZE)
+            if size is None:
+                continue
+
+            tensor["data"] = V2Protocol.decode_raw(tensor["datatype"], view[offset : offset + size])
+            offset += size
+
+        return payload
+
+    @staticmethod
+    def decode_raw(datatype: str, raw: memoryview) -> Any:
+        """
+        Decode the raw contents of a tensor, as sent by the binary extension
+        or gRPC.
+        Numeric tensors are kept as a view over the buffer, which gets
+        converted without copying.
+        """
+        if datatype == "BYTES":
+            return _split_binary_bytes(raw)
+
+        return raw
+
     @staticmethod
     def get_ty(name: str, idx: int, tys: ModelDataArgs) -> Optional[Type]:
         ty = tys[name]
@@ -130,52 +390,195 @@ class V2Protocol(Protocol):
             raw_type = type(raw)
 
             if raw_type == np.ndarray:
-                outputs.append(V2Protocol.create_v2_from_np(raw, "output" + str(idx)))
+                outputs.append(V2Protocol.create_v2_from_np(self.to_wire(raw), "output" + str(idx)))
             else:
                 outputs.append(V2Protocol.create_v2_from_any(raw, "output" + str(idx)))
         for name, raw in kwargs.items():
             raw_type = type(raw)
 
             if raw_type == np.ndarray:
-                shape = list(raw.shape)
-                data = raw.flatten().tolist()
-                outputs.append({"name": name, "datatype": "FP32", "shape": shape, "data": data})
+                outputs.append(V2Protocol.create_v2_from_np(self.to_wire(raw), name))
             else:
                 outputs.append(V2Protocol.create_v2_from_any(raw, name))
         return {"model_name": model_details.name, "outputs": outputs}
 
     def from_protocol_request(self, res: Dict, tys: ModelDataArgs) -> Any:
-        inp = {}
-        for idx, input in enumerate(res["inputs"]):
-            ty = V2Protocol.get_ty(input["name"], idx, tys)
-
-            if input["datatype"] == "BYTES":
-                inp[input["name"]] = V2Protocol.convert_from_bytes(input, ty)
-            elif ty == np.ndarray:
-                arr = V2Protocol.create_np_from_v2(input["data"], input["datatype"], input["shape"])
-                inp[input["name"]] = arr
-            else:
-                raise ValueError(f"Unknown ty {ty} in conversion")
-
+        inp = V2Protocol.decode_tensors(res["inputs"], *_resolve_tys(tys))
         if len(inp) == 1:
             return list(inp.values())[0]
         else:
             return inp
 
     def from_protocol_response(self, res: Dict, tys: ModelDataArgs) -> Any:
-        out = {}
-        for idx, output in enumerate(res["outputs"]):
-            ty = V2Protocol.get_ty(output["name"], idx, tys)
+        out = V2Protocol.decode_tensors(res["outputs"], *_resolve_tys(tys))
+        if len(out) == 1:
+            return list(out.values())[0]
+        else:
+            return out
 
-            if output["datatype"] == "BYTES":
-                out[output["name"]] = V2Protocol.convert_from_bytes(output, ty)
+    @staticmethod
+    def decode_tensors(tensors: List[Dict], tys_by_name: Dict[str, Type], tys_by_idx: List[Type]) -> Dict[str, Any]:
+        decoded = {}
+        for idx, tensor in enumerate(tensors):
+            name = tensor["name"]
+            ty = tys_by_name.get(name)
+            if ty is None:
+                ty = tys_by_idx[idx] if idx < len(tys_by_idx) else np.ndarray
+
+            if tensor["datatype"] == "BYTES":
+                decoded[name] = V2Protocol.convert_from_bytes(tensor, ty)
             elif ty == np.ndarray:
-                arr = V2Protocol.create_np_from_v2(output["data"], output["datatype"], output["shape"])
-                out[output["name"]] = arr
+                decoded[name] = V2Protocol.create_np_from_v2(tensor["data"], tensor["datatype"], tensor["shape"])
             else:
                 raise ValueError(f"Unknown ty {ty} in conversion")
 
+        return decoded
+
+    def compile(self, model_details: ModelDetails) -> "V2CodecPlan":
+        return V2CodecPlan(self, model_details)
+
+
+class V2CodecPlan(CodecPlan):
+    """
+    Codec plan for the V2 protocol, which resolves the declared types by name
+    and index upfront, so that decoding a payload doesn't need to scan the
+    model's :class:`tempo.serve.metadata.ModelDataArgs`.
+    """
+
+    def __init__(self, protocol: V2Protocol, model_details: ModelDetails):
+        super().__init__(protocol, model_details)
+        self._inputs = _resolve_tys(model_details.inputs)
+        self._outputs = _resolve_tys(model_details.outputs)
+
+        # Models with a single input always get it passed positionally, so we
+        # can skip the checks on the decoded value
+        self._single_input = len(self._inputs[1]) == 1
+
+        # Lists of strings declared as a single output (e.g. `List[str]`)
+        # shouldn't be split into multiple outputs
+        output_tys = self._outputs[1]
+        self._single_list_output = len(output_tys) == 1 and output_tys[0] is list
+
+    def decode_request(self, req: Dict) -> Tuple[tuple, dict]:
+        inp = V2Protocol.decode_tensors(req["inputs"], *self._inputs)
+        if len(inp) == 1:
+            value = next(iter(inp.values()))
+            if self._single_input:
+                return (value,), {}
+            return to_call_args(value)
+
+        return (), inp
+
+    def encode_response(self, response: Any) -> Dict:
+        if self._single_list_output and _is_string_list(response):
+            return self.protocol.to_protocol_response(self.model_details, response)
+
+        return super().encode_response(response)
+
+    def decode_response(self, res: Dict) -> Any:
+        out = V2Protocol.decode_tensors(res["outputs"], *self._outputs)
         if len(out) == 1:
-            return list(out.values())[0]
-        else:
-            return out
+            return next(iter(out.values()))
+        return out
+
+
+def _resolve_tys(tys: ModelDataArgs) -> Tuple[Dict[str, Type], List[Type]]:
+    tys_by_name: Dict[str, Type] = {}
+    for arg in tys.args:
+        # Keep the first match, as `ModelDataArgs` does
+        if arg.name is not None and arg.name not in tys_by_name:
+            tys_by_name[arg.name] = arg.ty
+
+    tys_by_idx = [arg.ty if arg.ty is not None else np.ndarray for arg in tys.args]
+    return tys_by_name, tys_by_idx
+
+
+def _create_v2_from_np_buffer(arr: np.ndarray, name: str) -> Dict:
+    # Same as `V2Protocol.create_v2_from_np`, but keeping the flattened array
+    # for serializers which support numpy
+    if _is_string_array(arr):
+        return V2Protocol.create_v2_from_strings(arr, name)
+
+    if arr.dtype not in _nptymap:
+        raise ValueError(f"Unknown numpy type {arr.dtype}")
+
+    datatype = _nptymap[arr.dtype]
+    if datatype in ("FP16", "BF16"):
+        # Half precision values are exactly representable as float32, which
+        # serializers can write natively
+        arr = arr.astype(np.float32)
+
+    return {
+        "name": name,
+        "datatype": datatype,
+        "data": arr.reshape(-1),
+        "shape": list(arr.shape),
+    }
+
+
+def _create_v2_raw_from_np(arr: np.ndarray, name: str) -> Dict:
+    if _is_string_array(arr):
+        return V2Protocol.create_v2_from_strings(arr, name)
+
+    tensor, raw = V2Protocol.create_binary_from_np(arr, name)
+    del tensor["parameters"]
+    tensor["data"] = raw
+    return tensor
+
+
+def join_binary_bytes(elems: List[bytes]) -> bytes:
+    """
+    Serialise the elements of a BYTES tensor into its raw representation,
+    i.e. each element prefixed by its length as a 4-byte little-endian
+    integer.
+    """
+    return b"".join(len(elem).to_bytes(4, "little") + elem for elem in elems)
+
+
+def float32_to_bfloat16_bits(arr: np.ndarray) -> np.ndarray:
+    """
+    Convert a float32 array into the raw bits of its bfloat16 representation
+    (rounding to nearest even), as a uint16 array.
+    """
+    bits = arr.astype(np.float32).view(np.uint32)
+    rounding = ((bits >> 16) & 1) + 0x7FFF
+    return ((bits + rounding) >> 16).astype(np.uint16)
+
+
+def bfloat16_bits_to_float32(arr: np.ndarray) -> np.ndarray:
+    """
+    Convert the raw bits of a bfloat16 array (as uint16) into float32.
+    """
+    return (arr.astype(np.uint32) << 16).view(np.float32)
+
+
+def _is_string_array(arr: np.ndarray) -> bool:
+    if arr.dtype.kind in ("U", "S"):
+        return True
+
+    # Object arrays may hold anything, so only those made up of strings can
+    # be sent as BYTES
+    return arr.dtype.kind == "O" and all(isinstance(elem, (str, bytes)) for elem in arr.flat)
+
+
+def _is_string_list(data: Any) -> bool:
+    return isinstance(data, list) and len(data) > 0 and all(isinstance(elem, str) for elem in data)
+
+
+def _is_encoded_list(data: Any) -> bool:
+    # Note that the legacy format sends a list of ints instead
+    return isinstance(data, list) and len(data) > 0 and isinstance(data[0], (str, bytes))
+
+
+def _split_binary_bytes(raw: memoryview) -> List[bytes]:
+    # Binary BYTES tensors are serialised as a sequence of elements, each
+    # prefixed by its length as a 4-byte little-endian integer
+    elems = []
+    offset = 0
+    while offset < len(raw):
+        length = int.from_bytes(raw[offset : offset + 4], "little")
+        offset += 4
+        elems.append(bytes(raw[offset : offset + length]))
+        offset += length
+
+    return elems
@@ -8,7 +8,7 @@ from docker.models.containers import Container
 
 from tempo.docker.constants import DefaultNetworkName
 from tempo.docker.utils import create_network
-from tempo.seldon.specs import DefaultHTTPPort, DefaultModelsPath, get_container_spec
+from tempo.seldon.specs import DefaultGRPCPort, DefaultHTTPPort, DefaultModelsPath, get_container_spec
 from tempo.serve.base import ClientModel, ModelSpec, Runtime
 from tempo.serve.metadata import DockerOptions
 
@@ -23,9 +23,10 @@ class SeldonDockerRuntime(Runtime):
         runtime_options.runtime = "tempo.seldon.SeldonDockerRuntime"
         super().__init__(runtime_options)
 
-    def _get_host_ip_port(self, model_details: ModelSpec) -> Tuple[str, str]:
+    def _get_host_ip_port(self, model_details: ModelSpec, port_index: str = None) -> Tuple[str, str]:
         container = self._get_container(model_details)
-        port_index = self._get_port_index()
+        if port_index is None:
+            port_index = self._get_port_index()
         host_ports = container.ports[port_index]
 
         host_ip = host_ports[0]["HostIp"]
@@ -43,6 +44,14 @@ class SeldonDockerRuntime(Runtime):
 
         return f"http://{host_ip}:{host_port}{predict_path}"
 
+    def get_grpc_endpoint_spec(self, model_spec: ModelSpec) -> str:
+        if self._is_inside_docker():
+            return f"{model_spec.model_details.name}:{DefaultGRPCPort}"
+
+        host_ip, host_port = self._get_host_ip_port(model_spec, self._get_grpc_port_index())
+
+        return f"{host_ip}:{host_port}"
+
     def deploy_spec(self, model_details: ModelSpec):
         try:
             container = self._get_container(model_details)
@@ -62,13 +71,17 @@ class SeldonDockerRuntime(Runtime):
         uid = os.getuid()
 
         container_index = self._get_port_index()
+        grpc_container_index = self._get_grpc_port_index()
         model_folder = model_details.model_details.local_folder
         container_spec = get_container_spec(model_details)
         create_network(docker_client)
 
         docker_client.containers.run(
             name=self._get_container_name(model_details),
-            ports={container_index: self._get_available_port()},
+            ports={
+                container_index: self._get_available_port(),
+                grpc_container_index: self._get_available_port(),
+            },
             volumes={model_folder: {"bind": DefaultModelsPath, "mode": "ro"}},
             detach=True,
             network=DefaultNetworkName,
@@ -79,6 +92,9 @@ class SeldonDockerRuntime(Runtime):
     def _get_port_index(self):
         return f"{DefaultHTTPPort}/tcp"
 
+    def _get_grpc_port_index(self):
+        return f"{DefaultGRPCPort}/tcp"
+
     def wait_ready_spec(self, model_spec: ModelSpec, timeout_secs=None) -> bool:
         host_ip, host_port = self._get_host_ip_port(model_spec)
         ready = False
@@ -1,7 +1,10 @@
 import os
+from typing import Dict
+from urllib.parse import urlsplit
 
 from kubernetes import client, config
 
+from tempo.seldon.specs import DefaultGRPCPort
 from tempo.serve.base import ModelSpec
 from tempo.serve.ingress import create_ingress
 from tempo.utils import logger
@@ -51,3 +54,29 @@ class Endpoint(object):
                 model_spec.model_details.name,
             )
             return api_response["status"]["address"]["url"]
+
+    def get_grpc_target(self, model_spec: ModelSpec) -> str:
+        if self.inside_cluster is None:
+            ingress = create_ingress(model_spec)
+            ingress_host_url = urlsplit(ingress.get_external_host_url(model_spec))
+            port = 443 if ingress_host_url.scheme == "https" else 80
+            return f"{ingress_host_url.netloc}:{port}"
+        else:
+            # Address of the predictor's service, which exposes the model's
+            # gRPC port directly
+            return (
+                f"{model_spec.model_details.name}-default."
+                + f"{model_spec.runtime_options.namespace}:"  # type: ignore
+                + DefaultGRPCPort
+            )
+
+    def get_grpc_headers(self, model_spec: ModelSpec) -> Dict[str, str]:
+        if self.inside_cluster is None:
+            # Routing metadata expected by the Istio virtual services
+            # created by Seldon Core
+            return {
+                "seldon": model_spec.model_details.name,
+                "namespace": model_spec.runtime_options.namespace,  # type: ignore
+            }
+
+        return {}
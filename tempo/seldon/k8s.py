@@ -1,6 +1,6 @@
 import json
 import time
-from typing import Optional, Sequence
+from typing import Dict, Optional, Sequence
 
 import yaml
 from kubernetes import client
@@ -29,6 +29,15 @@ class SeldonKubernetesRuntime(Runtime):
         endpoint = Endpoint()
         return endpoint.get_url(model_spec)
 
+    def get_grpc_endpoint_spec(self, model_spec: ModelSpec) -> str:
+        create_k8s_client()
+        endpoint = Endpoint()
+        return endpoint.get_grpc_target(model_spec)
+
+    def get_grpc_headers(self, model_spec: ModelSpec) -> Dict[str, str]:
+        endpoint = Endpoint()
+        return {**self.get_headers(model_spec), **endpoint.get_grpc_headers(model_spec)}
+
     def undeploy_spec(self, model_spec: ModelSpec):
         create_k8s_client()
         api_instance = client.CustomObjectsApi()
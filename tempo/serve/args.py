@@ -1,5 +1,7 @@
 from typing import Any, Callable, Tuple, get_type_hints
 
+import numpy as np
+
 from .metadata import ModelDataArg, ModelDataArgs
 from .types import ModelDataType
 
@@ -11,9 +13,7 @@ def infer_args(func: Callable[..., Any]) -> Tuple[ModelDataArgs, ModelDataArgs]:
 
     for k, v in hints.items():
         if k == "return":
-            if hasattr(v, "__args__"):
-                # NOTE: If `__args__` are present, assume this as a
-                # `typing.Generic`, like `Tuple`
+            if _is_multi_output(v):
                 targs = v.__args__
                 for targ in targs:
                     output_args.append(ModelDataArg(ty=targ))
@@ -25,6 +25,16 @@ def infer_args(func: Callable[..., Any]) -> Tuple[ModelDataArgs, ModelDataArgs]:
     return ModelDataArgs(args=input_args), ModelDataArgs(args=output_args)
 
 
+def _is_multi_output(ty: Any) -> bool:
+    # NOTE: If `__args__` are present, assume this as a `typing.Generic`,
+    # like `Tuple` or `Optional`, other than `List[str]` and similar, which
+    # are a single output
+    if not hasattr(ty, "__args__"):
+        return False
+
+    return not (getattr(ty, "__origin__", None) is list and np.ndarray not in ty.__args__)
+
+
 def process_datatypes(inputs: ModelDataType, outputs: ModelDataType) -> Tuple[ModelDataArgs, ModelDataArgs]:
     input_args = _process_datatypes(datatypes=inputs)
     output_args = _process_datatypes(datatypes=outputs)
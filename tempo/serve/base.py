@@ -1,8 +1,10 @@
 from __future__ import annotations
 
 import abc
+import functools
 import os
 import tempfile
+import time
 import uuid
 from pydoc import locate
 from types import SimpleNamespace
@@ -10,20 +12,22 @@ from typing import Any, Dict, Optional, Sequence, Tuple, Type
 
 import numpy as np
 import pydantic
-import requests
 from pydantic import validator
 
 from ..errors import UndefinedCustomImplementation
 from ..insights.manager import InsightsManager
 from ..magic import PayloadContext, TempoContextWrapper, tempo_context
+from ..protocols.v2 import BinaryContentType, InferenceHeaderContentLength, V2Protocol
 from ..state.state import BaseState
 from ..utils import logger
 from .args import infer_args, process_datatypes
+from .batching import Batcher
 from .constants import DefaultCondaFile, DefaultEnvFilename, DefaultModelFilename
 from .loader import load_custom, save_custom, save_environment
 from .metadata import (
     BaseRuntimeOptionsType,
     ClientDetails,
+    ClientTransport,
     DockerOptions,
     InsightRequestModes,
     ModelDataArg,
@@ -31,9 +35,9 @@ from .metadata import (
     ModelDetails,
     ModelFramework,
 )
-from .protocol import Protocol
+from .protocol import CodecPlan, Protocol
+from .session import get_session, get_session_key, get_timeout
 from .types import LoadMethodSignature, ModelDataType, PredictMethodSignature
-from .typing import fullname
 
 
 class BaseModel:
@@ -86,7 +90,11 @@ class BaseModel:
             )
 
         self.use_remote: bool = False
+        self._codec_plan: Optional[CodecPlan] = self.model_spec.protocol.compile(self.details)
+        self._call_plans: Dict[int, CallPlan] = {}
         self.runtime_options_override: Optional[BaseRuntimeOptionsType] = None
+        self._override_spec: Optional[ModelSpec] = None
+        self._batcher: Any = None
 
         insights_params = runtime_options.insights_options.dict()
         self.insights_manager = InsightsManager(**insights_params)
@@ -105,6 +113,9 @@ class BaseModel:
 
     def set_runtime_options_override(self, runtime_options: BaseRuntimeOptionsType):
         self.runtime_options_override = runtime_options
+        self._override_spec = None
+        self._batcher = None
+        self.invalidate_call_plans()
 
     def _get_args(
         self, inputs: ModelDataType = None, outputs: ModelDataType = None
@@ -147,6 +158,11 @@ class BaseModel:
         # Remove the insights manager from the cloudpickle context
         state["insights_manager"] = SimpleNamespace()
         state["state"] = SimpleNamespace()
+        # The codec and call plans get re-compiled on first use after loading
+        state["_codec_plan"] = None
+        state["_call_plans"] = {}
+        state["_override_spec"] = None
+        state["_batcher"] = None
 
         return state
 
@@ -186,30 +202,38 @@ class BaseModel:
         if self._user_func is None:
             raise UndefinedCustomImplementation(self.details.name)
 
-        req_converted = self.model_spec.protocol.from_protocol_request(req, self.details.inputs)
-        if type(req_converted) == dict:
-            response = self(**req_converted)
-        elif type(req_converted) == list or type(req_converted) == tuple:
-            response = self(*req_converted)
-        else:
-            response = self(req_converted)
+        codec_plan = self._get_codec_plan(self.model_spec)
+        args, kwargs = codec_plan.decode_request(req)
+        response = self(*args, **kwargs)
+        return codec_plan.encode_response(response)
 
-        if type(response) == dict:
-            response_converted = self.model_spec.protocol.to_protocol_response(self.details, **response)
-        elif type(response) == list or type(response) == tuple:
-            response_converted = self.model_spec.protocol.to_protocol_response(self.details, *response)
-        else:
-            response_converted = self.model_spec.protocol.to_protocol_response(self.details, response)
+    def _get_codec_plan(self, model_spec: ModelSpec) -> CodecPlan:
+        """
+        Get the codec plan for the given spec, which is compiled once and
+        then reused as long as the spec shares the model's details and
+        protocol.
+        """
+        is_own_spec = (
+            model_spec.protocol is self.model_spec.protocol
+            and model_spec.model_details is self.model_spec.model_details
+        )
+        if not is_own_spec:
+            return model_spec.protocol.compile(model_spec.model_details)
 
-        return response_converted
+        if self._codec_plan is None:
+            self._codec_plan = self.model_spec.protocol.compile(self.model_spec.model_details)
+
+        return self._codec_plan
 
     def _get_model_spec(self, runtime: Optional[Runtime]) -> ModelSpec:
         if self.runtime_options_override:
-            return ModelSpec(
-                model_details=self.model_spec.model_details,
-                protocol=self.model_spec.protocol,
-                runtime_options=self.runtime_options_override,
-            )
+            if self._override_spec is None:
+                self._override_spec = ModelSpec(
+                    model_details=self.model_spec.model_details,
+                    protocol=self.model_spec.protocol,
+                    runtime_options=self.runtime_options_override,
+                )
+            return self._override_spec
         elif runtime is not None:
             return ModelSpec(
                 model_details=self.model_spec.model_details,
@@ -219,6 +243,47 @@ class BaseModel:
         else:
             return self.model_spec
 
+    def _get_call_plan(self, model_spec: ModelSpec) -> CallPlan:
+        """
+        Get the resolved endpoint, headers and codec plan to call the model
+        remotely with the given spec.
+        These are resolved once per spec and then reused until the model gets
+        (un)deployed or the plan expires, so that steady-state predictions
+        don't need to query the runtime.
+        """
+        call_plan = self._call_plans.get(id(model_spec))
+        if call_plan is not None and call_plan.model_spec is model_spec and not call_plan.expired:
+            return call_plan
+
+        remoter = self._create_remote(model_spec)
+        transport = ClientTransport(model_spec.runtime_options.client_options.transport)
+        if transport == ClientTransport.GRPC:
+            if not isinstance(model_spec.protocol, V2Protocol):
+                raise ValueError(f"gRPC transport requires the V2 protocol for model {model_spec.model_details.name}")
+
+            endpoint = remoter.get_grpc_endpoint_spec(model_spec)
+            headers = remoter.get_grpc_headers(model_spec)
+        else:
+            endpoint = remoter.get_endpoint_spec(model_spec)
+            headers = remoter.get_headers(model_spec)
+
+        call_plan = CallPlan(
+            model_spec=model_spec,
+            transport=transport,
+            endpoint=endpoint,
+            headers=headers,
+            codec_plan=self._get_codec_plan(model_spec),
+        )
+        self._call_plans[id(model_spec)] = call_plan
+        return call_plan
+
+    def invalidate_call_plans(self):
+        """
+        Drop any cached call plans, so that the model's endpoint gets
+        resolved again on the next remote call.
+        """
+        self._call_plans = {}
+
     def _create_remote(self, model_spec: ModelSpec) -> Runtime:
         cls_path = model_spec.runtime_options.runtime
         logger.debug("Using remote class %s", cls_path)
@@ -231,52 +296,124 @@ class BaseModel:
     def predict(self, *args, **kwargs):
         # TODO: Decouple to support multiple transports (e.g. Kafka, gRPC)
         model_spec = self._get_model_spec(None)
+        batcher = self._get_batcher(model_spec, Batcher)
+        if batcher is not None:
+            return batcher.submit(*args, **kwargs)
+
         return self.remote_with_spec(model_spec, *args, **kwargs)
 
+    def _get_batcher(self, model_spec: ModelSpec, batcher_cls: Type) -> Any:
+        """
+        Get the batcher used to group concurrent predictions, if batching is
+        enabled for the given spec.
+        """
+        batching_options = model_spec.runtime_options.client_options.batching
+        if batching_options.max_batch_size <= 1:
+            return None
+
+        if self._batcher is None:
+            self._batcher = batcher_cls(functools.partial(self.remote_with_spec, model_spec), batching_options)
+
+        return self._batcher
+
     def remote_with_client(self, model_spec: ModelSpec, client_details: ClientDetails, *args, **kwargs):
-        prot = model_spec.protocol
-        req = prot.to_protocol_request(*args, **kwargs)
         logger.debug(
             "Calling requests POST with client details endpoint=%s headers=%s verify=%s",
             client_details.url,
             client_details.headers,
             client_details.verify_ssl,
         )
-        response_raw = requests.post(
-            client_details.url, json=req, headers=client_details.headers, verify=client_details.verify_ssl
+        return self._post(
+            model_spec,
+            self._get_codec_plan(model_spec),
+            client_details.url,
+            client_details.headers,
+            client_details.verify_ssl,
+            None,
+            *args,
+            **kwargs,
         )
-        logger.debug(response_raw.content)
-
-        response_raw.raise_for_status()
-
-        response_json = response_raw.json()
-        logger.debug("Response raw %s", response_json)
-        output_schema = model_spec.model_details.outputs
-
-        return prot.from_protocol_response(response_json, output_schema)
 
     def remote_with_spec(self, model_spec: ModelSpec, *args, **kwargs):
-        remoter = self._create_remote(model_spec)
-        ingress_options = model_spec.runtime_options.ingress_options
-        endpoint = remoter.get_endpoint_spec(model_spec)
-        headers = remoter.get_headers(model_spec)
+        call_plan = self._get_call_plan(model_spec)
+        if call_plan.transport == ClientTransport.GRPC:
+            return self._infer_grpc(model_spec, call_plan, *args, **kwargs)
 
-        prot = model_spec.protocol
-        req = prot.to_protocol_request(*args, **kwargs)
         logger.debug(
-            "Calling requests POST with endpoint=%s headers=%s verify=%s", endpoint, headers, ingress_options.verify_ssl
+            "Calling requests POST with endpoint=%s headers=%s verify=%s",
+            call_plan.endpoint,
+            call_plan.headers,
+            call_plan.verify_ssl,
+        )
+        res = self._post(
+            model_spec,
+            call_plan.codec_plan,
+            call_plan.endpoint,
+            call_plan.headers,
+            call_plan.verify_ssl,
+            call_plan.pool_key,
+            *args,
+            **kwargs,
+        )
+        logger.debug("protocol decoded %s", res)
+        return res
+
+    def _post(
+        self,
+        model_spec: ModelSpec,
+        codec_plan: CodecPlan,
+        endpoint: str,
+        headers: Dict[str, str],
+        verify_ssl: bool,
+        session_key: Optional[Tuple],
+        *args,
+        **kwargs,
+    ):
+        prot = model_spec.protocol
+        if isinstance(prot, V2Protocol) and prot.binary_data:
+            body, header_length = prot.to_binary_request(*args, **kwargs)
+            headers = {
+                **headers,
+                "Content-Type": BinaryContentType,
+                InferenceHeaderContentLength: str(header_length),
+            }
+        else:
+            body = prot.encode_request(*args, **kwargs)
+            headers = {**headers, "Content-Type": prot.serializer.content_type}
+        client_options = model_spec.runtime_options.client_options
+        session = get_session(endpoint, client_options, session_key)
+        response_raw = session.post(
+            endpoint, data=body, headers=headers, verify=verify_ssl, timeout=get_timeout(client_options)
         )
-        response_raw = requests.post(endpoint, json=req, headers=headers, verify=ingress_options.verify_ssl)
         logger.debug(response_raw.content)
 
         response_raw.raise_for_status()
 
-        response_json = response_raw.json()
-        output_schema = model_spec.model_details.outputs
+        response_header_length = response_raw.headers.get(InferenceHeaderContentLength)
+        if response_header_length is not None:
+            response_json = V2Protocol.decode_binary(response_raw.content, int(response_header_length))
+        else:
+            response_json = prot.serializer.loads(response_raw.content)
+        logger.debug("Response raw %s", response_json)
 
-        res = prot.from_protocol_response(response_json, output_schema)
-        logger.debug("protocol decoded %s", res)
-        return res
+        return codec_plan.decode_response(response_json)
+
+    def _infer_grpc(self, model_spec: ModelSpec, call_plan: CallPlan, *args, **kwargs):
+        # Imported lazily, as loading the gRPC stubs is slow
+        from .grpc import decode_infer_response, encode_infer_request, get_deadline, get_metadata, get_stub
+
+        logger.debug("Calling gRPC ModelInfer with target=%s headers=%s", call_plan.endpoint, call_plan.headers)
+        client_options = model_spec.runtime_options.client_options
+        stub = get_stub(call_plan.endpoint, call_plan.secure, client_options, call_plan.pool_key)
+
+        request = model_spec.protocol.to_raw_request(*args, **kwargs)  # type: ignore
+        infer_response = stub.ModelInfer(
+            encode_infer_request(request, model_spec.model_details.name),
+            metadata=get_metadata(call_plan.headers),
+            timeout=get_deadline(client_options),
+        )
+
+        return call_plan.codec_plan.decode_response(decode_infer_response(infer_response))
 
     def wait_ready(self, runtime: Runtime, timeout_secs=None):
         return runtime.wait_ready_spec(self._get_model_spec(runtime), timeout_secs=timeout_secs)
@@ -293,11 +430,13 @@ class BaseModel:
 
     def deploy(self, runtime: Runtime):
         # self.set_runtime(runtime)
+        self.invalidate_call_plans()
         runtime.deploy_spec(self._get_model_spec(runtime))
 
     def undeploy(self, runtime: Runtime):
         # self.unset_runtime()
         logger.info("Undeploying %s", self.details.name)
+        self.invalidate_call_plans()
         runtime.undeploy_spec(self._get_model_spec(runtime))
 
     def serialize(self) -> str:
@@ -345,6 +484,47 @@ class ClientModel(BaseModel):
         pass
 
 
+class CallPlan:
+    """
+    Everything needed to call a remote model with a given spec, resolved once
+    against its runtime.
+    """
+
+    def __init__(
+        self,
+        model_spec: ModelSpec,
+        transport: ClientTransport,
+        endpoint: str,
+        headers: Dict[str, str],
+        codec_plan: CodecPlan,
+    ):
+        self.model_spec = model_spec
+        self.transport = transport
+        self.endpoint = endpoint
+        self.headers = headers
+        self.codec_plan = codec_plan
+
+        runtime_options = model_spec.runtime_options
+        self.verify_ssl = runtime_options.ingress_options.verify_ssl
+        self.secure = runtime_options.ingress_options.ssl
+        # Key of the pooled connections to the endpoint, which would
+        # otherwise get computed on every call
+        client_options = runtime_options.client_options
+        if transport == ClientTransport.GRPC:
+            # Same as tempo.serve.grpc.get_channel_key, whose module is slow
+            # to import
+            self.pool_key = (endpoint, self.secure, client_options.json())
+        else:
+            self.pool_key = get_session_key(endpoint, client_options)
+
+        ttl = runtime_options.client_options.call_plan_ttl
+        self._expires_at = None if ttl is None else time.monotonic() + ttl
+
+    @property
+    def expired(self) -> bool:
+        return self._expires_at is not None and time.monotonic() >= self._expires_at
+
+
 class ModelSpec(pydantic.BaseModel):
 
     model_details: ModelDetails
@@ -356,13 +536,15 @@ class ModelSpec(pydantic.BaseModel):
         if isinstance(v, str):
             klass = locate(v)
             return klass()
+        elif isinstance(v, dict):
+            return Protocol.from_dict(v)
         else:
             return v
 
     class Config:
         arbitrary_types_allowed = True
         json_encoders = {
-            Protocol: lambda v: fullname(v),
+            Protocol: lambda v: v.to_dict(),
             type: lambda v: v.__module__ + "." + v.__name__,
         }
 
@@ -414,6 +596,15 @@ class Runtime(abc.ABC, Deployer):
     def get_headers(self, model_spec: ModelSpec) -> Dict[str, str]:
         return {}
 
+    def get_grpc_endpoint_spec(self, model_spec: ModelSpec) -> str:
+        """
+        Get the target (i.e. ``host:port``) of the model's V2 gRPC server.
+        """
+        raise NotImplementedError(f"gRPC transport not supported by {type(self).__name__}")
+
+    def get_grpc_headers(self, model_spec: ModelSpec) -> Dict[str, str]:
+        return self.get_headers(model_spec)
+
     @abc.abstractmethod
     def wait_ready_spec(self, model_spec: ModelSpec, timeout_secs=None) -> bool:
         pass
@@ -0,0 +1,293 @@
+"""
+Client-side micro-batching of remote predictions.
+
+Concurrent calls to the same model which only take numpy arrays are
+collected for a short window, concatenated along their first axis and sent
+as a single request.
+The response is then split back across the callers.
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .metadata import BatchingOptions
+
+
+class _Call:
+    def __init__(self, args: tuple, kwargs: dict, size: int):
+        self.args = args
+        self.kwargs = kwargs
+        self.size = size
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+    def get_result(self) -> Any:
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class _Batch:
+    def __init__(self, full: Any, done: Any):
+        self.calls: List[_Call] = []
+        self.size = 0
+        # Signals that the batch is full and that its results are ready
+        # (i.e. an event, or the task sending the batch)
+        self.full = full
+        self.done = done
+
+    def add(self, call: _Call):
+        self.calls.append(call)
+        self.size += call.size
+
+
+class _BaseBatcher:
+    def __init__(self, batching_options: BatchingOptions):
+        self._max_batch_size = batching_options.max_batch_size
+        self._max_wait = batching_options.max_wait_ms / 1000
+        self._batches: Dict[Tuple, _Batch] = {}
+
+    def _get_call(self, args: tuple, kwargs: dict) -> Optional[Tuple[Tuple, _Call]]:
+        """
+        Get the batch key of a call, which only matches calls whose arrays
+        can be concatenated, or ``None`` if the call can't be batched.
+        """
+        if not args and not kwargs:
+            return None
+
+        named_arrays = [(idx, arg) for idx, arg in enumerate(args)] + sorted(kwargs.items())
+        sizes = set()
+        key = []
+        for name, arr in named_arrays:
+            if type(arr) is not np.ndarray or arr.ndim == 0 or arr.dtype.kind in ("U", "S", "O"):
+                return None
+
+            sizes.add(arr.shape[0])
+            key.append((name, arr.dtype.str, arr.shape[1:]))
+
+        if len(sizes) != 1:
+            return None
+
+        size = sizes.pop()
+        if size >= self._max_batch_size:
+            return None
+
+        return tuple(key), _Call(args, kwargs, size)
+
+    def _add(self, key: Tuple, call: _Call) -> Tuple[_Batch, bool]:
+        """
+        Add a call to the open batch for its key, opening a new one if
+        needed.
+
+        Returns
+        -------
+        The batch and whether the call opened it (and thus needs to send
+        it).
+        """
+        batch = self._batches.get(key)
+        if batch is not None and batch.size + call.size > self._max_batch_size:
+            # The call doesn't fit into the open batch, which gets sent as
+            # is
+            del self._batches[key]
+            batch.full.set()
+            batch = None
+
+        is_leader = batch is None
+        if batch is None:
+            batch = self._new_batch()
+            self._batches[key] = batch
+
+        batch.add(call)
+        if batch.size >= self._max_batch_size:
+            del self._batches[key]
+            batch.full.set()
+
+        return batch, is_leader
+
+    def _new_batch(self) -> _Batch:
+        raise NotImplementedError()
+
+    def _close(self, key: Tuple, batch: _Batch):
+        if self._batches.get(key) is batch:
+            del self._batches[key]
+
+
+class Batcher(_BaseBatcher):
+    """
+    Batches concurrent calls to ``func`` coming from different threads.
+    The first call of each batch waits for up to ``max_wait_ms`` for the
+    batch to fill up, and then sends it on behalf of the others.
+    """
+
+    def __init__(self, func: Callable[..., Any], batching_options: BatchingOptions):
+        super().__init__(batching_options)
+        self._func = func
+        self._lock = threading.Lock()
+
+    def _new_batch(self) -> _Batch:
+        return _Batch(full=threading.Event(), done=threading.Event())
+
+    def submit(self, *args, **kwargs) -> Any:
+        key_call = self._get_call(args, kwargs)
+        if key_call is None:
+            return self._func(*args, **kwargs)
+
+        key, call = key_call
+        with self._lock:
+            batch, is_leader = self._add(key, call)
+
+        if is_leader:
+            try:
+                batch.full.wait(self._max_wait)
+                with self._lock:
+                    self._close(key, batch)
+
+                _run_batch(self._func, batch)
+            except BaseException as err:
+                _abort(err, batch)
+                raise
+            finally:
+                with self._lock:
+                    self._close(key, batch)
+                batch.done.set()
+        else:
+            batch.done.wait()
+
+        return call.get_result()
+
+
+class AsyncBatcher(_BaseBatcher):
+    """
+    Batches concurrent calls to the ``func`` coroutine within the same event
+    loop.
+    """
+
+    def __init__(self, func: Callable[..., Awaitable[Any]], batching_options: BatchingOptions):
+        super().__init__(batching_options)
+        self._func = func
+
+    def _new_batch(self) -> _Batch:
+        return _Batch(full=asyncio.Event(), done=None)
+
+    async def submit(self, *args, **kwargs) -> Any:
+        key_call = self._get_call(args, kwargs)
+        if key_call is None:
+            return await self._func(*args, **kwargs)
+
+        key, call = key_call
+        batch, is_leader = self._add(key, call)
+        if is_leader:
+            # The batch gets sent by a task of its own, so that cancelling
+            # any of its callers (including the one which opened it) only
+            # stops that caller from waiting on it
+            batch.done = asyncio.create_task(self._send(key, batch))
+
+        await asyncio.shield(batch.done)
+        return call.get_result()
+
+    async def _send(self, key: Tuple, batch: _Batch):
+        try:
+            try:
+                await asyncio.wait_for(batch.full.wait(), self._max_wait)
+            except asyncio.TimeoutError:
+                pass
+
+            self._close(key, batch)
+            await _run_batch_async(self._func, batch)
+        except BaseException as err:
+            # e.g. the task getting cancelled on shutdown
+            _abort(err, batch)
+            raise
+        finally:
+            self._close(key, batch)
+
+
+def _concatenate(batch: _Batch) -> Tuple[tuple, dict]:
+    first = batch.calls[0]
+    args = tuple(np.concatenate([call.args[idx] for call in batch.calls]) for idx in range(len(first.args)))
+    kwargs = {name: np.concatenate([call.kwargs[name] for call in batch.calls]) for name in first.kwargs}
+    return args, kwargs
+
+
+def _split(value: Any, batch: _Batch) -> List[Any]:
+    if type(value) is np.ndarray:
+        if value.ndim == 0 or value.shape[0] != batch.size:
+            raise ValueError(f"Can't split batched response of shape {value.shape} into {batch.size} rows")
+
+        offsets = np.cumsum([call.size for call in batch.calls])[:-1]
+        return np.split(value, offsets)
+
+    if isinstance(value, dict):
+        split_values = {name: _split(elem, batch) for name, elem in value.items()}
+        return [{name: split_values[name][idx] for name in value} for idx in range(len(batch.calls))]
+
+    if isinstance(value, (list, tuple)):
+        split_elems = [_split(elem, batch) for elem in value]
+        return [type(value)(elems[idx] for elems in split_elems) for idx in range(len(batch.calls))]
+
+    raise ValueError(f"Can't split batched response of type {type(value)}")
+
+
+def _set_results(value: Any, batch: _Batch):
+    try:
+        results = _split(value, batch)
+    except ValueError as err:
+        _set_error(err, batch)
+        return
+
+    for call, result in zip(batch.calls, results):
+        call.result = result
+
+
+def _set_error(err: BaseException, batch: _Batch):
+    for call in batch.calls:
+        call.error = err
+
+
+def _abort(err: BaseException, batch: _Batch):
+    # Fail the calls of a batch which couldn't get sent, so that their
+    # callers don't wait on it forever
+    for call in batch.calls:
+        if call.error is None:
+            call.error = err
+
+
+def _run_batch(func: Callable[..., Any], batch: _Batch):
+    if len(batch.calls) == 1:
+        # Nothing to concatenate
+        call = batch.calls[0]
+        try:
+            call.result = func(*call.args, **call.kwargs)
+        except Exception as err:
+            call.error = err
+        return
+
+    args, kwargs = _concatenate(batch)
+    try:
+        value = func(*args, **kwargs)
+    except Exception as err:
+        _set_error(err, batch)
+        return
+
+    _set_results(value, batch)
+
+
+async def _run_batch_async(func: Callable[..., Awaitable[Any]], batch: _Batch):
+    if len(batch.calls) == 1:
+        call = batch.calls[0]
+        try:
+            call.result = await func(*call.args, **call.kwargs)
+        except Exception as err:
+            call.error = err
+        return
+
+    args, kwargs = _concatenate(batch)
+    try:
+        value = await func(*args, **kwargs)
+    except Exception as err:
+        _set_error(err, batch)
+        return
+
+    _set_results(value, batch)
@@ -0,0 +1,279 @@
+"""
+Client transport for the V2 gRPC inference API, as exposed by MLServer and
+Triton.
+
+Tensors are sent as raw little-endian buffers (i.e. ``raw_input_contents``)
+when the V2 dataplane supports them, falling back to typed contents
+otherwise.
+"""
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import grpc
+from mlserver.grpc import dataplane_pb2 as pb
+from mlserver.grpc.dataplane_pb2_grpc import GRPCInferenceServiceStub
+
+from ..protocols.v2 import V2Protocol, join_binary_bytes
+from .metadata import ClientOptions
+
+# Older versions of the V2 dataplane don't support raw tensor contents
+SupportsRawContents = "raw_input_contents" in pb.ModelInferRequest.DESCRIPTOR.fields_by_name
+
+_contents_fields = {
+    "BOOL": "bool_contents",
+    "UINT8": "uint_contents",
+    "UINT16": "uint_contents",
+    "UINT32": "uint_contents",
+    "UINT64": "uint64_contents",
+    "INT8": "int_contents",
+    "INT16": "int_contents",
+    "INT32": "int_contents",
+    "INT64": "int64_contents",
+    "FP32": "fp32_contents",
+    "FP64": "fp64_contents",
+    "BYTES": "bytes_contents",
+}
+
+# Tensors can easily go over gRPC's default 4MB limit
+_channel_options = [
+    ("grpc.max_send_message_length", -1),
+    ("grpc.max_receive_message_length", -1),
+]
+
+
+class ChannelPool:
+    """
+    Keeps one gRPC channel (and its stub) per target and client options, so
+    that consecutive calls reuse the same HTTP/2 connection.
+    """
+
+    def __init__(self):
+        self._stubs: Dict[Tuple, GRPCInferenceServiceStub] = {}
+        self._channels: List[grpc.Channel] = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def get(
+        self, target: str, secure: bool, client_options: ClientOptions, key: Optional[Tuple] = None
+    ) -> GRPCInferenceServiceStub:
+        """
+        Get the stub for a target, given its ``key`` if the caller has
+        already computed it (see :func:`get_channel_key`).
+        """
+        if key is None:
+            key = get_channel_key(target, secure, client_options)
+
+        key = (os.getpid(), key)
+        stub = self._stubs.get(key)
+        if stub is not None:
+            return stub
+
+        with self._lock:
+            self._reset_after_fork()
+            stub = self._stubs.get(key)
+            if stub is None:
+                channel = create_channel(target, secure, client_options)
+                self._channels.append(channel)
+                stub = GRPCInferenceServiceStub(channel)
+                self._stubs[key] = stub
+
+            return stub
+
+    def close(self):
+        with self._lock:
+            for channel in self._channels:
+                channel.close()
+
+            self._stubs = {}
+            self._channels = []
+
+    def _reset_after_fork(self):
+        # Channels can't be shared with a forked process
+        pid = os.getpid()
+        if pid != self._pid:
+            self._stubs = {}
+            self._channels = []
+            self._pid = pid
+
+
+def get_channel_key(target: str, secure: bool, client_options: ClientOptions) -> Tuple:
+    """
+    Get the key of the pooled channel for a target.
+    Serialising the client options is relatively slow, so callers which
+    make many requests should compute it once.
+    """
+    return (target, secure, client_options.json())
+
+
+def _get_channel_options(client_options: ClientOptions) -> List[Tuple[str, Any]]:
+    options = list(_channel_options)
+    if client_options.retries > 0:
+        initial_backoff = max(client_options.backoff_factor, 0.01)
+        retry_policy = {
+            # gRPC caps the number of attempts to 5
+            "maxAttempts": min(client_options.retries + 1, 5),
+            "initialBackoff": f"{initial_backoff}s",
+            "maxBackoff": f"{initial_backoff * 2 ** client_options.retries}s",
+            "backoffMultiplier": 2,
+            "retryableStatusCodes": ["UNAVAILABLE"],
+        }
+        service_config = {
+            "methodConfig": [{"name": [{"service": "inference.GRPCInferenceService"}], "retryPolicy": retry_policy}]
+        }
+        options.append(("grpc.service_config", json.dumps(service_config)))
+
+    return options
+
+
+def create_channel(target: str, secure: bool, client_options: ClientOptions) -> grpc.Channel:
+    options = _get_channel_options(client_options)
+    if secure:
+        return grpc.secure_channel(target, grpc.ssl_channel_credentials(), options=options)
+
+    return grpc.insecure_channel(target, options=options)
+
+
+def create_aio_channel(target: str, secure: bool, client_options: ClientOptions) -> grpc.aio.Channel:
+    """
+    Create an asyncio channel, which is bound to the running event loop.
+    """
+    options = _get_channel_options(client_options)
+    if secure:
+        return grpc.aio.secure_channel(target, grpc.ssl_channel_credentials(), options=options)
+
+    return grpc.aio.insecure_channel(target, options=options)
+
+
+def get_deadline(client_options: ClientOptions) -> Optional[float]:
+    timeouts = [
+        timeout for timeout in (client_options.connect_timeout, client_options.read_timeout) if timeout is not None
+    ]
+    if not timeouts:
+        return None
+
+    return sum(timeouts)
+
+
+def get_metadata(headers: Dict[str, str]) -> List[Tuple[str, str]]:
+    # gRPC metadata keys must be lowercase
+    return [(key.lower(), value) for key, value in headers.items()]
+
+
+def encode_infer_request(
+    request: Dict, model_name: str, raw_contents: bool = SupportsRawContents
+) -> pb.ModelInferRequest:
+    """
+    Convert a request, as encoded by :meth:`V2Protocol.to_raw_request`, into
+    its protobuf message.
+    """
+    infer_request = pb.ModelInferRequest(model_name=model_name)
+    _set_parameters(infer_request.parameters, request.get("parameters"))
+
+    for tensor in request["inputs"]:
+        infer_input = infer_request.inputs.add(name=tensor["name"], datatype=tensor["datatype"])
+
+        data = tensor["data"]
+        if tensor["datatype"] == "BYTES":
+            elems = _get_bytes_elems(data)
+            infer_input.shape.extend(tensor["shape"] if _is_elems_shape(tensor["shape"], elems) else [len(elems)])
+            if raw_contents:
+                infer_request.raw_input_contents.append(join_binary_bytes(elems))
+            else:
+                infer_input.contents.bytes_contents.extend(elems)
+        else:
+            infer_input.shape.extend(tensor["shape"])
+            if raw_contents:
+                infer_request.raw_input_contents.append(bytes(data))
+            else:
+                field = _contents_fields.get(tensor["datatype"])
+                if field is None:
+                    raise ValueError(f"Datatype {tensor['datatype']} requires raw tensor contents over gRPC")
+
+                arr = V2Protocol.create_np_from_v2(data, tensor["datatype"], tensor["shape"])
+                getattr(infer_input.contents, field).extend(arr.reshape(-1).tolist())
+
+        _set_parameters(infer_input.parameters, tensor.get("parameters"))
+
+    return infer_request
+
+
+def decode_infer_response(infer_response: pb.ModelInferResponse) -> Dict:
+    """
+    Convert a protobuf response into the V2 response format understood by
+    :class:`V2Protocol`.
+    """
+    raw_output_contents = infer_response.raw_output_contents if SupportsRawContents else []
+
+    outputs = []
+    for idx, output in enumerate(infer_response.outputs):
+        if idx < len(raw_output_contents):
+            data = V2Protocol.decode_raw(output.datatype, memoryview(raw_output_contents[idx]))
+        else:
+            field = _contents_fields.get(output.datatype)
+            if field is None:
+                raise ValueError(f"Datatype {output.datatype} requires raw tensor contents over gRPC")
+
+            data = list(getattr(output.contents, field))
+
+        outputs.append(
+            {
+                "name": output.name,
+                "datatype": output.datatype,
+                "shape": list(output.shape),
+                "parameters": _get_parameters(output.parameters),
+                "data": data,
+            }
+        )
+
+    return {"model_name": infer_response.model_name, "outputs": outputs}
+
+
+def _get_bytes_elems(data: Any) -> List[bytes]:
+    if isinstance(data, list) and len(data) > 0 and isinstance(data[0], (str, bytes)):
+        return [elem.encode("utf-8") if isinstance(elem, str) else elem for elem in data]
+
+    # Legacy format, where the value is sent as a list of the bytes of its
+    # `repr()`
+    return [bytes(data)]
+
+
+def _is_elems_shape(shape: List[int], elems: List[bytes]) -> bool:
+    size = 1
+    for dim in shape:
+        size *= dim
+
+    return size == len(elems)
+
+
+def _set_parameters(parameters: Any, values: Optional[Dict]):
+    if not values:
+        return
+
+    for key, value in values.items():
+        if isinstance(value, bool):
+            parameters[key].bool_param = value
+        elif isinstance(value, int):
+            parameters[key].int64_param = value
+        elif isinstance(value, str):
+            parameters[key].string_param = value
+
+
+def _get_parameters(parameters: Any) -> Dict:
+    values = {}
+    for key, parameter in parameters.items():
+        choice = parameter.WhichOneof("parameter_choice")
+        if choice is not None:
+            values[key] = getattr(parameter, choice)
+
+    return values
+
+
+_channel_pool = ChannelPool()
+
+
+def get_stub(
+    target: str, secure: bool, client_options: ClientOptions, key: Optional[Tuple] = None
+) -> GRPCInferenceServiceStub:
+    return _channel_pool.get(target, secure, client_options, key)
@@ -52,6 +52,9 @@ class ModelDataArg(BaseModel):
     def ensure_type(cls, v):
         if isinstance(v, str):
             return locate(v)
+        elif getattr(v, "__origin__", None) is list and v is not List:
+            # Lists of a given type (e.g. `List[str]`) are resolved to `list`
+            return list
         else:
             return v
 
@@ -116,7 +119,44 @@ class InsightRequestModes(Enum):
 DEFAULT_INSIGHTS_REQUEST_MODES = InsightRequestModes.NONE
 
 
+class InsightsOverflowPolicies(Enum):
+    DROP_OLDEST = "DROP_OLDEST"
+    DROP_NEWEST = "DROP_NEWEST"
+    BLOCK = "BLOCK"
+
+
+class InsightsSamplingTypes(Enum):
+    RANDOM = "RANDOM"
+    REQUEST_ID = "REQUEST_ID"
+
+
+class InsightsSinkTypes(Enum):
+    HTTP = "HTTP"
+    SPOOL = "SPOOL"
+
+
 class InsightsOptions(BaseModel):
+    """
+    Options of the insights worker.
+    Payloads get sent in batches of up to ``batch_size`` (as CloudEvents in
+    batch mode), waiting for up to ``window_time`` milliseconds for each
+    batch to fill up.
+    Up to ``max_queue_size`` payloads wait to be sent, after which the
+    ``overflow_policy`` drops either the oldest or the newest one, or
+    blocks for up to ``overflow_timeout`` seconds (only for synchronous
+    callers, as async ones never wait) before dropping the newest one.
+    Failed requests get retried ``retries`` times, with exponential backoff
+    (starting at ``backoff_factor`` seconds, up to ``max_backoff``).
+    Only a ``sample_rate`` fraction of the requests gets logged, picked
+    either at random or by hashing their request ID (see
+    ``sampling_type``), and capped to ``max_events_per_second``.
+    With the ``SPOOL`` sink type, payloads get appended to compressed files
+    under ``spool_path`` instead, rotated once ``spool_max_bytes`` have been
+    written to them or after ``spool_max_age`` seconds, and forwarded to
+    the ``worker_endpoint`` (if any) every ``spool_forward_interval``
+    seconds.
+    """
+
     worker_endpoint: str = ""
     batch_size: int = 1
     parallelism: int = 1
@@ -124,6 +164,20 @@ class InsightsOptions(BaseModel):
     window_time: int = 0
     mode_type: InsightRequestModes = DEFAULT_INSIGHTS_REQUEST_MODES
     in_asyncio: bool = False
+    max_queue_size: int = 10000
+    overflow_policy: InsightsOverflowPolicies = InsightsOverflowPolicies.DROP_OLDEST
+    overflow_timeout: float = 0.01
+    backoff_factor: float = 0.1
+    max_backoff: float = 10.0
+    request_timeout: float = 10.0
+    sample_rate: float = 1.0
+    sampling_type: InsightsSamplingTypes = InsightsSamplingTypes.RANDOM
+    max_events_per_second: Optional[float] = None
+    sink_type: InsightsSinkTypes = InsightsSinkTypes.HTTP
+    spool_path: str = ""
+    spool_max_bytes: int = 16 * 1024 * 1024
+    spool_max_age: float = 300.0
+    spool_forward_interval: float = 10.0
 
     class Config:
         # Required to ensure enum json serialisation https://pydantic-docs.helpmanual.io/usage/model_config/
@@ -142,13 +196,38 @@ class InsightsPayload(BaseModel):
 class StateTypes(Enum):
     LOCAL = "LOCAL"
     REDIS = "REDIS"
+    CACHED_REDIS = "CACHED_REDIS"
+    AIOREDIS = "AIOREDIS"
+
+
+class EvictionPolicies(Enum):
+    LRU = "LRU"
+    LFU = "LFU"
 
 
 class StateOptions(BaseModel):
+    """
+    Options of the state backend.
+    Redis backends connect to ``host`` and ``port``, or shard keys across
+    ``nodes`` (given as ``host:port``) when set.
+    ``default_ttl`` (in seconds) applies to keys set without an explicit
+    TTL, whereas ``max_entries``, ``max_bytes`` and ``eviction_policy``
+    bound the size of the ``LOCAL`` backend, as well as the near-cache of
+    the ``CACHED_REDIS`` backend (whose entries expire after
+    ``near_cache_ttl``).
+    """
+
     state_type: Optional[StateTypes] = StateTypes.LOCAL
     key_prefix: str = ""
     host: str = ""
     port: str = ""
+    nodes: List[str] = []
+    max_connections: Optional[int] = None
+    default_ttl: Optional[float] = None
+    max_entries: Optional[int] = None
+    max_bytes: Optional[int] = None
+    eviction_policy: EvictionPolicies = EvictionPolicies.LRU
+    near_cache_ttl: Optional[float] = None
 
     class Config:
         use_enum_values = True
@@ -160,11 +239,89 @@ class IngressOptions(BaseModel):
     verify_ssl: bool = True
 
 
+class ClientTransport(Enum):
+    REST = "REST"
+    GRPC = "GRPC"
+
+
+class BatchingOptions(BaseModel):
+    """
+    Options to batch concurrent predictions, either on the client side
+    (through :class:`ClientOptions`) or within the Tempo runtime serving the
+    model.
+
+    Calls which only take numpy arrays get concatenated along their first
+    axis, waiting for up to ``max_wait_ms`` to collect ``max_batch_size``
+    rows.
+    Batching is disabled when ``max_batch_size`` is 1.
+    """
+
+    max_batch_size: int = 1
+    max_wait_ms: float = 5.0
+
+
+class ClientOptions(BaseModel):
+    """
+    Options for the client used to call remote models.
+
+    Requests are sent over REST by default, or over the V2 gRPC API when
+    ``transport`` is ``GRPC`` (which requires the ``V2Protocol``).
+    Connections and channels are pooled and kept alive across calls to the
+    same endpoint.
+    Timeouts are in seconds, where ``None`` means waiting forever.
+    The resolved endpoint of a remote model is cached until it gets
+    (un)deployed, or for ``call_plan_ttl`` seconds if set.
+    """
+
+    pool_connections: int = 10
+    pool_maxsize: int = 10
+    keep_alive: bool = True
+    retries: int = 0
+    backoff_factor: float = 0.0
+    retry_status_codes: List[int] = [502, 503, 504]
+    connect_timeout: Optional[float] = None
+    read_timeout: Optional[float] = None
+    call_plan_ttl: Optional[float] = None
+    transport: ClientTransport = ClientTransport.REST
+    batching: BatchingOptions = BatchingOptions()
+
+    class Config:
+        use_enum_values = True
+
+
+class ExecutorTypes(Enum):
+    NONE = "NONE"
+    THREAD = "THREAD"
+    PROCESS = "PROCESS"
+    FORK = "FORK"
+
+
+class ExecutorOptions(BaseModel):
+    """
+    Options to run synchronous models off the event loop of the Tempo runtime
+    serving them, either on a thread pool or on a pool of worker processes.
+    With ``PROCESS``, each worker loads its own copy of the model, whereas
+    with ``FORK`` workers get forked once the model is loaded, sharing its
+    memory copy-on-write.
+    Concurrency is bounded by ``max_workers``, which defaults to the number
+    of CPUs for process pools.
+    """
+
+    executor_type: ExecutorTypes = ExecutorTypes.NONE
+    max_workers: Optional[int] = None
+
+    class Config:
+        use_enum_values = True
+
+
 class _BaseRuntimeOptions(BaseModel):
     runtime: str = ""
     state_options: StateOptions = StateOptions()
     insights_options: InsightsOptions = InsightsOptions()
     ingress_options: IngressOptions = IngressOptions()
+    client_options: ClientOptions = ClientOptions()
+    batching_options: BatchingOptions = BatchingOptions()
+    executor_options: ExecutorOptions = ExecutorOptions()
 
     class Config:
         use_enum_values = True
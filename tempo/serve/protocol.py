@@ -1,15 +1,20 @@
 from __future__ import annotations
 
 import abc
-from typing import Any, Dict
+from pydoc import locate
+from typing import Any, Dict, Tuple
 
 import attr
 
 from tempo.serve.metadata import ModelDataArgs, ModelDetails
+from tempo.serve.serializer import ORJSONSerializer, Serializer
+from tempo.serve.typing import fullname
 
 
 @attr.s(auto_attribs=True)
 class Protocol(abc.ABC):
+    serializer: Serializer = attr.ib(factory=ORJSONSerializer, kw_only=True)
+
     @abc.abstractmethod
     def to_protocol_request(self, *args, **kwargs) -> Dict:
         pass
@@ -33,3 +38,74 @@ class Protocol(abc.ABC):
     @abc.abstractmethod
     def get_status_path(self, model_details: ModelDetails) -> str:
         pass
+
+    def encode_request(self, *args, **kwargs) -> bytes:
+        """
+        Encode a request into its wire format using the protocol's serializer.
+        Protocols can override it to hand numpy arrays straight to the
+        serializer when it supports them.
+        """
+        return self.serializer.dumps(self.to_protocol_request(*args, **kwargs))
+
+    def decode_response(self, body: bytes, tys: ModelDataArgs) -> Any:
+        return self.from_protocol_response(self.serializer.loads(body), tys)
+
+    def compile(self, model_details: ModelDetails) -> CodecPlan:
+        """
+        Build the plan used to convert payloads for a particular model.
+        Protocols can override it to resolve as much as possible upfront,
+        leaving only the data conversion for each request.
+        """
+        return CodecPlan(self, model_details)
+
+    def to_dict(self) -> Dict:
+        """
+        Describe the protocol and its options, so that it can be rebuilt
+        (e.g. by the deployed runtime) with :meth:`from_dict`.
+        """
+        options = attr.asdict(self, recurse=False)
+        options["serializer"] = fullname(self.serializer)
+        return {"type": fullname(self), "options": options}
+
+    @staticmethod
+    def from_dict(d: Dict) -> Protocol:
+        options = dict(d.get("options", {}))
+        if "serializer" in options:
+            options["serializer"] = locate(options["serializer"])()  # type: ignore
+
+        klass = locate(d["type"])
+        return klass(**options)  # type: ignore
+
+
+class CodecPlan:
+    """
+    Conversions between protocol payloads and the arguments / return values of
+    a model's function, compiled once per model.
+    """
+
+    def __init__(self, protocol: Protocol, model_details: ModelDetails):
+        self.protocol = protocol
+        self.model_details = model_details
+
+    def decode_request(self, req: Dict) -> Tuple[tuple, dict]:
+        """
+        Decode a request into the positional and keyword arguments to call
+        the model with.
+        """
+        req_converted = self.protocol.from_protocol_request(req, self.model_details.inputs)
+        return to_call_args(req_converted)
+
+    def encode_response(self, response: Any) -> Dict:
+        args, kwargs = to_call_args(response)
+        return self.protocol.to_protocol_response(self.model_details, *args, **kwargs)
+
+    def decode_response(self, res: Dict) -> Any:
+        return self.protocol.from_protocol_response(res, self.model_details.outputs)
+
+
+def to_call_args(value: Any) -> Tuple[tuple, dict]:
+    if type(value) == dict:
+        return (), value
+    elif type(value) == list or type(value) == tuple:
+        return tuple(value), {}
+    return (value,), {}
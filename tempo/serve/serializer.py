@@ -0,0 +1,89 @@
+import abc
+import json
+from typing import Any, Dict
+
+import attr
+import numpy as np
+import orjson
+
+
+@attr.s(auto_attribs=True)
+class Serializer(abc.ABC):
+    """
+    Encodes and decodes protocol payloads to and from their wire format.
+    """
+
+    content_type = "application/json"
+
+    @property
+    def supports_numpy(self) -> bool:
+        """
+        Whether the serializer can write numpy arrays straight from their
+        buffers, in which case protocols can skip the ``tolist()`` conversion.
+        """
+        return False
+
+    @abc.abstractmethod
+    def dumps(self, payload: Dict) -> bytes:
+        pass
+
+    @abc.abstractmethod
+    def loads(self, body: bytes) -> Dict:
+        pass
+
+
+class JSONSerializer(Serializer):
+    """
+    Serializer based on Python's standard ``json`` module.
+    """
+
+    def dumps(self, payload: Dict) -> bytes:
+        return json.dumps(payload).encode("utf-8")
+
+    def loads(self, body: bytes) -> Dict:
+        return json.loads(body)
+
+
+def _orjson_default(obj: Any) -> Any:
+    # Fallback for the numpy types that orjson can't serialise natively (e.g.
+    # non-contiguous arrays or scalars)
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Type is not JSON serializable: {type(obj)}")
+
+
+def _to_native_byte_order(obj: Any) -> Any:
+    # orjson writes arrays straight from their buffers, which would garble
+    # the ones in non-native byte order (e.g. ``>i4`` on little-endian
+    # machines).
+    # Lists of scalars can't hold any arrays, so they don't get walked.
+    if isinstance(obj, np.ndarray):
+        return obj if obj.dtype.isnative else obj.astype(obj.dtype.newbyteorder("="))
+    if isinstance(obj, dict):
+        return {key: _to_native_byte_order(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)) and obj and isinstance(obj[0], (dict, list, tuple, np.ndarray)):
+        return [_to_native_byte_order(elem) for elem in obj]
+    return obj
+
+
+class ORJSONSerializer(Serializer):
+    """
+    Serializer based on ``orjson``, which writes numpy arrays directly from
+    their underlying buffers.
+    """
+
+    @property
+    def supports_numpy(self) -> bool:
+        return True
+
+    def dumps(self, payload: Dict) -> bytes:
+        return orjson.dumps(
+            _to_native_byte_order(payload),
+            default=_orjson_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+        )
+
+    def loads(self, body: bytes) -> Dict:
+        return orjson.loads(body)
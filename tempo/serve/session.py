@@ -0,0 +1,109 @@
+import os
+import threading
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .metadata import ClientOptions
+
+
+class SessionPool:
+    """
+    Keeps one ``requests.Session`` per endpoint (i.e. scheme, host and port)
+    and client options, so that consecutive calls reuse their TCP and TLS
+    connections.
+    """
+
+    def __init__(self):
+        self._sessions: Dict[Tuple, requests.Session] = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def get(self, endpoint: str, client_options: ClientOptions, key: Optional[Tuple] = None) -> requests.Session:
+        """
+        Get the session for an endpoint, given its ``key`` if the caller has
+        already computed it (see :func:`get_session_key`).
+        """
+        if key is None:
+            key = get_session_key(endpoint, client_options)
+
+        key = (os.getpid(), key)
+        session = self._sessions.get(key)
+        if session is not None:
+            return session
+
+        with self._lock:
+            self._reset_after_fork()
+            session = self._sessions.get(key)
+            if session is None:
+                session = _create_session(client_options)
+                self._sessions[key] = session
+
+            return session
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+
+            self._sessions = {}
+
+    def _reset_after_fork(self):
+        # Connections can't be shared with a forked process
+        pid = os.getpid()
+        if pid != self._pid:
+            self._sessions = {}
+            self._pid = pid
+
+
+def get_session_key(endpoint: str, client_options: ClientOptions) -> Tuple:
+    """
+    Get the key of the pooled session for an endpoint.
+    Serialising the client options is relatively slow, so callers which
+    make many requests should compute it once.
+    """
+    url = urlsplit(endpoint)
+    return (url.scheme, url.netloc, client_options.json())
+
+
+def _create_session(client_options: ClientOptions) -> requests.Session:
+    session = requests.Session()
+
+    retries = Retry(
+        total=client_options.retries,
+        backoff_factor=client_options.backoff_factor,
+        status_forcelist=client_options.retry_status_codes,
+        # Inference requests are sent as POST, which urllib3 won't retry by
+        # default
+        allowed_methods=None,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=client_options.pool_connections,
+        pool_maxsize=client_options.pool_maxsize,
+        max_retries=retries,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    if not client_options.keep_alive:
+        session.headers["Connection"] = "close"
+
+    return session
+
+
+def get_timeout(client_options: ClientOptions) -> Optional[Tuple[Optional[float], Optional[float]]]:
+    if client_options.connect_timeout is None and client_options.read_timeout is None:
+        return None
+
+    return (client_options.connect_timeout, client_options.read_timeout)
+
+
+_session_pool = SessionPool()
+
+
+def get_session(endpoint: str, client_options: ClientOptions, key: Optional[Tuple] = None) -> requests.Session:
+    return _session_pool.get(endpoint, client_options, key)
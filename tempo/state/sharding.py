@@ -0,0 +1,198 @@
+"""
+Client-side sharding of state across several Redis nodes.
+
+Keys get mapped to nodes through consistent hashing, so that adding or
+removing a node only remaps a fraction of them.
+Like in Redis Cluster, only the part of a key within ``{...}`` (its hash
+tag) gets hashed if present, which allows related keys to be kept on the
+same node.
+"""
+import bisect
+import hashlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import redis
+
+# Number of points of each node in the hash ring, which smooths out the
+# distribution of keys across nodes
+_VIRTUAL_NODES = 160
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+def get_hash_tag(key: str) -> str:
+    start = key.find("{")
+    if start != -1:
+        end = key.find("}", start + 1)
+        if end > start + 1:
+            return key[start + 1 : end]
+
+    return key
+
+
+class HashRing:
+    def __init__(self, names: List[str], virtual_nodes: int = _VIRTUAL_NODES):
+        points = sorted(
+            (_hash(f"{name}-{idx}"), node) for node, name in enumerate(names) for idx in range(virtual_nodes)
+        )
+        self._hashes = [point_hash for point_hash, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def get_node(self, key: str) -> int:
+        idx = bisect.bisect(self._hashes, _hash(get_hash_tag(key))) % len(self._hashes)
+        return self._nodes[idx]
+
+
+class ShardedRedis:
+    """
+    Drop-in replacement for the subset of the ``redis.Redis`` API used by
+    the state backends, which routes each key to its node.
+    Multi-key operations and pipelines send a single request per node
+    involved.
+    """
+
+    def __init__(self, nodes: List[str], clients: Optional[List[Any]] = None, **connection_kwargs):
+        self.names = nodes
+        self.nodes = clients if clients is not None else [_create_client(node, **connection_kwargs) for node in nodes]
+        self._ring = HashRing(nodes)
+
+    def get_node(self, key: str) -> redis.Redis:
+        return self.nodes[self._ring.get_node(key)]
+
+    def set(self, key: str, value: Any, px: Optional[int] = None) -> Optional[bool]:
+        return self.get_node(key).set(key, value, px=px)
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.get_node(key).get(key)
+
+    def exists(self, key: str) -> int:
+        return self.get_node(key).exists(key)
+
+    def delete(self, key: str) -> int:
+        return self.get_node(key).delete(key)
+
+    def incrby(self, key: str, amount: int) -> int:
+        return self.get_node(key).incrby(key, amount)
+
+    def hset(self, name: str, key: str, value: Any) -> int:
+        return self.get_node(name).hset(name, key, value)
+
+    def hget(self, name: str, key: str) -> Optional[Any]:
+        return self.get_node(name).hget(name, key)
+
+    def hgetall(self, name: str) -> Dict:
+        return self.get_node(name).hgetall(name)
+
+    def mset(self, mapping: Dict[str, Any]) -> bool:
+        shards: Dict[int, Dict[str, Any]] = {}
+        for key, value in mapping.items():
+            shards.setdefault(self._ring.get_node(key), {})[key] = value
+
+        return all([self.nodes[node].mset(shard) for node, shard in shards.items()])
+
+    def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        shards: Dict[int, List[int]] = {}
+        for idx, key in enumerate(keys):
+            shards.setdefault(self._ring.get_node(key), []).append(idx)
+
+        values: List[Optional[Any]] = [None] * len(keys)
+        for node, idxs in shards.items():
+            node_values = self.nodes[node].mget([keys[idx] for idx in idxs])
+            for idx, value in zip(idxs, node_values):
+                values[idx] = value
+
+        return values
+
+    def pipeline(self, transaction: bool = True) -> "ShardedPipeline":
+        return ShardedPipeline(self, transaction)
+
+
+class ShardedPipeline:
+    """
+    Pipeline split into one Redis pipeline per node.
+    Transactions are only atomic within each node.
+    """
+
+    def __init__(self, client: ShardedRedis, transaction: bool):
+        self._client = client
+        self._transaction = transaction
+        self._pipelines: Dict[int, Any] = {}
+        # Position of the results of each queued operation within the
+        # pipelines of their nodes, and how to combine them
+        self._ops: List[Tuple[List[Tuple[int, int]], Callable[[List[Any]], Any]]] = []
+
+    def __enter__(self) -> "ShardedPipeline":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.reset()
+
+    def reset(self):
+        for pipeline in self._pipelines.values():
+            pipeline.reset()
+
+        self._pipelines = {}
+        self._ops = []
+
+    def _queue(self, key: str, name: str, *args, **kwargs) -> Tuple[int, int]:
+        node = self._client._ring.get_node(key)
+        pipeline = self._pipelines.get(node)
+        if pipeline is None:
+            pipeline = self._client.nodes[node].pipeline(transaction=self._transaction)
+            self._pipelines[node] = pipeline
+
+        getattr(pipeline, name)(key, *args, **kwargs)
+        return node, len(pipeline) - 1
+
+    def _queue_single(self, key: str, name: str, *args, **kwargs) -> "ShardedPipeline":
+        self._ops.append(([self._queue(key, name, *args, **kwargs)], lambda results: results[0]))
+        return self
+
+    def set(self, key: str, value: Any, px: Optional[int] = None) -> "ShardedPipeline":
+        return self._queue_single(key, "set", value, px=px)
+
+    def get(self, key: str) -> "ShardedPipeline":
+        return self._queue_single(key, "get")
+
+    def exists(self, key: str) -> "ShardedPipeline":
+        return self._queue_single(key, "exists")
+
+    def delete(self, key: str) -> "ShardedPipeline":
+        return self._queue_single(key, "delete")
+
+    def incrby(self, key: str, amount: int) -> "ShardedPipeline":
+        return self._queue_single(key, "incrby", amount)
+
+    def hset(self, name: str, key: str, value: Any) -> "ShardedPipeline":
+        return self._queue_single(name, "hset", key, value)
+
+    def hget(self, name: str, key: str) -> "ShardedPipeline":
+        return self._queue_single(name, "hget", key)
+
+    def hgetall(self, name: str) -> "ShardedPipeline":
+        return self._queue_single(name, "hgetall")
+
+    def mset(self, mapping: Dict[str, Any]) -> "ShardedPipeline":
+        refs = [self._queue(key, "set", value) for key, value in mapping.items()]
+        self._ops.append((refs, all))
+        return self
+
+    def mget(self, keys: List[str]) -> "ShardedPipeline":
+        refs = [self._queue(key, "get") for key in keys]
+        self._ops.append((refs, list))
+        return self
+
+    def execute(self) -> List[Any]:
+        try:
+            results = {node: pipeline.execute() for node, pipeline in self._pipelines.items()}
+            return [combine([results[node][idx] for node, idx in refs]) for refs, combine in self._ops]
+        finally:
+            self.reset()
+
+
+def _create_client(node: str, **connection_kwargs) -> redis.Redis:
+    host, port = node.rsplit(":", 1)
+    pool = redis.ConnectionPool(host=host, port=int(port), **connection_kwargs)
+    return redis.Redis(connection_pool=pool)
@@ -1,18 +1,120 @@
 import abc
-from typing import Any, Dict, Optional
+import copy
+import heapq
+import itertools
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 
 import attr
-
-# TODO: Also support aioredis for when running inside mlserver
 import redis
+import redis.asyncio
+
+from tempo.serve.metadata import EvictionPolicies, StateOptions, StateTypes
+from tempo.state.sharding import ShardedRedis
+from tempo.utils import logger
+
+_Call = Tuple[str, tuple]
+
+# Number of least recently used keys amongst which the least frequently used
+# one gets evicted
+_LFU_SAMPLE_SIZE = 5
+
+# Number of stale entries (i.e. beyond twice the number of keys with a TTL)
+# tolerated in the heap of expiries before rebuilding it
+_EXPIRIES_HEAP_SLACK = 64
+
+_missing = object()
+
+# Timeout (in seconds) when waiting for keyspace notifications, which also
+# bounds how long it takes to stop listening
+_LISTEN_TIMEOUT = 1.0
+
+_WRITE_OPERATIONS = {"set", "delete", "mset", "incr", "incrby", "hset"}
+
+
+class StatePipeline:
+    """
+    Queues state operations so that they run as a single batch (i.e. a
+    single round trip for remote backends) when calling :meth:`execute`.
+    Operations are applied atomically when the pipeline is transactional.
+
+    .. code-block:: python
+
+        with t.state.pipeline() as pipe:
+            pipe.incr("requests").hget("arms", "a").hget("arms", "b")
+            requests, arm_a, arm_b = pipe.execute()
+
+    For async backends, ``execute()`` must be awaited instead.
+    """
+
+    def __init__(self, state: Any, transaction: bool = True):
+        self._state = state
+        self._transaction = transaction
+        self._calls: List[_Call] = []
+
+    def __enter__(self) -> "StatePipeline":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.reset()
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def reset(self):
+        self._calls = []
+
+    def execute(self) -> Any:
+        calls = self._calls
+        self.reset()
+        return self._state._execute_pipeline(calls, self._transaction)
+
+    def _queue(self, name: str, *args) -> "StatePipeline":
+        self._calls.append((name, args))
+        return self
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> "StatePipeline":
+        return self._queue("set", key, value, ttl)
+
+    def get(self, key: str) -> "StatePipeline":
+        return self._queue("get", key)
+
+    def exists(self, key: str) -> "StatePipeline":
+        return self._queue("exists", key)
+
+    def delete(self, key: str) -> "StatePipeline":
+        return self._queue("delete", key)
+
+    def mset(self, mapping: Dict[str, Any]) -> "StatePipeline":
+        return self._queue("mset", mapping)
+
+    def mget(self, keys: List[str]) -> "StatePipeline":
+        return self._queue("mget", keys)
 
-from tempo.serve.metadata import StateOptions, StateTypes
+    def incr(self, key: str) -> "StatePipeline":
+        return self._queue("incr", key)
+
+    def incrby(self, key: str, amount: int) -> "StatePipeline":
+        return self._queue("incrby", key, amount)
+
+    def hset(self, name: str, key: str, value: Any) -> "StatePipeline":
+        return self._queue("hset", name, key, value)
+
+    def hget(self, name: str, key: str) -> "StatePipeline":
+        return self._queue("hget", name, key)
+
+    def hgetall(self, name: str) -> "StatePipeline":
+        return self._queue("hgetall", name)
 
 
 @attr.s(auto_attribs=True)
 class BaseState(abc.ABC):
     @abc.abstractmethod
-    def set(self, key: str, value: str) -> Optional[bool]:
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> Optional[bool]:
         raise NotImplementedError
 
     @abc.abstractmethod
@@ -23,6 +125,43 @@ class BaseState(abc.ABC):
     def exists(self, key: str) -> int:
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def delete(self, key: str) -> int:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def mset(self, mapping: Dict[str, Any]) -> Optional[bool]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def incrby(self, key: str, amount: int) -> int:
+        raise NotImplementedError
+
+    def incr(self, key: str) -> int:
+        return self.incrby(key, 1)
+
+    @abc.abstractmethod
+    def hset(self, name: str, key: str, value: Any) -> int:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def hget(self, name: str, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def hgetall(self, name: str) -> Dict:
+        raise NotImplementedError
+
+    def pipeline(self, transaction: bool = True) -> StatePipeline:
+        return StatePipeline(self, transaction=transaction)
+
+    def _execute_pipeline(self, calls: List[_Call], transaction: bool) -> List[Any]:
+        return [getattr(self, name)(*args) for name, args in calls]
+
     @property
     @abc.abstractmethod
     def internal_state(self) -> Optional[Any]:
@@ -40,27 +179,222 @@ class BaseState(abc.ABC):
             return LocalState(state_options=state_options)
         elif state_type in (StateTypes.REDIS, StateTypes.REDIS.value):
             return RedisState(state_options=state_options)
+        elif state_type in (StateTypes.CACHED_REDIS, StateTypes.CACHED_REDIS.value):
+            return CachedRedisState(state_options=state_options)
+        elif state_type in (StateTypes.AIOREDIS, StateTypes.AIOREDIS.value):
+            return AsyncRedisState(state_options=state_options)
         else:
             raise Exception("State type not valid")
 
 
 class LocalState(BaseState):
+    """
+    In-memory state backend.
+    Keys can expire (see ``default_ttl``), and the number of entries and
+    their approximate size in bytes can be bounded through ``max_entries``
+    and ``max_bytes``.
+    Once full, keys get evicted either by least recent use (``LRU``) or,
+    similarly to Redis, by least frequent use among a small sample of the
+    least recently used keys (``LFU``).
+    All operations are thread-safe.
+    """
+
     def __init__(self, state_options: StateOptions = StateOptions()):
-        self._internal_state: Dict = {}
+        self._internal_state: OrderedDict = OrderedDict()
         self._state_options = state_options
+        # Re-entrant, as pipelines hold it while running each operation
+        self._lock = threading.RLock()
+
+        self._eviction_policy = EvictionPolicies(state_options.eviction_policy)
+        self._expiries: Dict[str, float] = {}
+        self._expiries_heap: List[Tuple[float, str]] = []
+        self._sizes: Dict[str, int] = {}
+        self._size = 0
+        self._uses: Dict[str, int] = {}
 
-    def set(self, key: str, value: str) -> Optional[bool]:
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> Optional[bool]:
         prefix = self._state_options.key_prefix
-        self._internal_state[prefix + key] = value
+        with self._lock:
+            self._store(prefix + key, value, _size_of(value), ttl=_get_ttl(ttl, self._state_options))
+            self._evict()
         return True
 
     def get(self, key: str) -> Optional[Any]:
         prefix = self._state_options.key_prefix
-        return self._internal_state.get(prefix + key)
+        with self._lock:
+            return self._load(prefix + key)
 
     def exists(self, key: str) -> int:
         prefix = self._state_options.key_prefix
-        return prefix + key in self._internal_state
+        with self._lock:
+            return not self._expire(prefix + key) and prefix + key in self._internal_state
+
+    def delete(self, key: str) -> int:
+        prefix = self._state_options.key_prefix
+        with self._lock:
+            if self._expire(prefix + key) or prefix + key not in self._internal_state:
+                return 0
+
+            self._remove(prefix + key)
+            return 1
+
+    def mset(self, mapping: Dict[str, Any]) -> Optional[bool]:
+        prefix = self._state_options.key_prefix
+        ttl = _get_ttl(None, self._state_options)
+        with self._lock:
+            for key, value in mapping.items():
+                self._store(prefix + key, value, _size_of(value), ttl=ttl)
+            self._evict()
+        return True
+
+    def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        prefix = self._state_options.key_prefix
+        with self._lock:
+            return [self._load(prefix + key) for key in keys]
+
+    def incrby(self, key: str, amount: int) -> int:
+        prefix = self._state_options.key_prefix
+        with self._lock:
+            value = int(self._load(prefix + key) or 0) + amount
+            self._store(prefix + key, value, _size_of(value))
+            self._evict()
+        return value
+
+    def hset(self, name: str, key: str, value: Any) -> int:
+        prefix = self._state_options.key_prefix
+        with self._lock:
+            fields = self._load(prefix + name)
+            if fields is None:
+                fields = {}
+                size = _size_of(fields)
+            else:
+                size = self._sizes[prefix + name] - _size_of_field(key, fields.get(key, _missing))
+
+            is_new = key not in fields
+            fields[key] = value
+            self._store(prefix + name, fields, size + _size_of_field(key, value))
+            self._evict()
+        return int(is_new)
+
+    def hget(self, name: str, key: str) -> Optional[Any]:
+        prefix = self._state_options.key_prefix
+        with self._lock:
+            return (self._load(prefix + name) or {}).get(key)
+
+    def hgetall(self, name: str) -> Dict:
+        prefix = self._state_options.key_prefix
+        with self._lock:
+            return dict(self._load(prefix + name) or {})
+
+    def _execute_pipeline(self, calls: List[_Call], transaction: bool) -> List[Any]:
+        if not transaction:
+            return super()._execute_pipeline(calls, transaction)
+
+        with self._lock:
+            return super()._execute_pipeline(calls, transaction)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._internal_state),
+                "bytes": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _load(self, key: str) -> Optional[Any]:
+        if self._expire(key) or key not in self._internal_state:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._touch(key)
+        return self._internal_state[key]
+
+    def _store(self, key: str, value: Any, size: int, ttl: Any = _missing):
+        # Like in Redis, only setting a key resets its TTL
+        if ttl is not _missing:
+            self._set_expiry(key, ttl)
+        elif key not in self._internal_state:
+            self._set_expiry(key, _get_ttl(None, self._state_options))
+
+        self._internal_state[key] = value
+        self._touch(key)
+
+        self._size += size - self._sizes.get(key, 0)
+        self._sizes[key] = size
+
+    def _touch(self, key: str):
+        self._internal_state.move_to_end(key)
+        self._uses[key] = self._uses.get(key, 0) + 1
+
+    def _remove(self, key: str):
+        del self._internal_state[key]
+        self._expiries.pop(key, None)
+        self._size -= self._sizes.pop(key, 0)
+        self._uses.pop(key, None)
+
+    def _set_expiry(self, key: str, ttl: Optional[float]):
+        if ttl is None:
+            self._expiries.pop(key, None)
+            return
+
+        expiry = time.monotonic() + ttl
+        self._expiries[key] = expiry
+        heapq.heappush(self._expiries_heap, (expiry, key))
+
+    def _expire(self, key: str) -> bool:
+        expiry = self._expiries.get(key)
+        if expiry is None or expiry > time.monotonic():
+            return False
+
+        self._remove(key)
+        self.expirations += 1
+        return True
+
+    def _evict(self):
+        # Drop expired keys first, skipping heap entries which are stale
+        # (i.e. keys which got removed or given a new TTL since)
+        now = time.monotonic()
+        while self._expiries_heap and self._expiries_heap[0][0] <= now:
+            expiry, key = heapq.heappop(self._expiries_heap)
+            if self._expiries.get(key) == expiry:
+                self._remove(key)
+                self.expirations += 1
+
+        if len(self._expiries_heap) > 2 * len(self._expiries) + _EXPIRIES_HEAP_SLACK:
+            # Every new TTL leaves a stale entry behind, which would otherwise
+            # pile up until its original deadline
+            self._expiries_heap = [(expiry, key) for key, expiry in self._expiries.items()]
+            heapq.heapify(self._expiries_heap)
+
+        max_entries = self._state_options.max_entries
+        max_bytes = self._state_options.max_bytes
+        while self._internal_state and (
+            (max_entries is not None and len(self._internal_state) > max_entries)
+            or (max_bytes is not None and self._size > max_bytes)
+        ):
+            self._remove(self._get_victim())
+            self.evictions += 1
+
+    def _get_victim(self) -> str:
+        # Keys are kept from least to most recently used
+        keys = iter(self._internal_state)
+        if self._eviction_policy == EvictionPolicies.LRU:
+            return next(keys)
+
+        # Leave out the most recently used key, which would otherwise get
+        # evicted right after being added
+        candidates = itertools.islice(keys, max(min(_LFU_SAMPLE_SIZE, len(self._internal_state) - 1), 1))
+        return min(candidates, key=lambda key: self._uses.get(key, 0))
 
     @property
     def internal_state(self) -> Dict:
@@ -72,19 +406,38 @@ class LocalState(BaseState):
 
 
 class RedisState(BaseState):
+    """
+    Redis state backend.
+    Connections are taken from a shared pool, capped by
+    ``max_connections``, and pipelines get sent in a single round trip
+    (wrapped in a ``MULTI`` / ``EXEC`` block when transactional).
+    Keys get sharded across ``nodes`` if set, in which case pipelines take
+    a round trip per node (and are only atomic within each node).
+    """
+
     def __init__(self, state_options: StateOptions):
         self._state_options = state_options
         self._internal_state: redis.Redis = None  # type: ignore
 
     def _setup_state(self) -> None:
+        if self._state_options.nodes:
+            self._internal_state = ShardedRedis(  # type: ignore
+                self._state_options.nodes, max_connections=self._state_options.max_connections
+            )
+            return
 
         self._redis_host = self._state_options.host
         self._redis_port = int(self._state_options.port)
-        self._internal_state = redis.Redis(host=self._redis_host, port=self._redis_port)
+        pool = redis.ConnectionPool(
+            host=self._redis_host,
+            port=self._redis_port,
+            max_connections=self._state_options.max_connections,
+        )
+        self._internal_state = redis.Redis(connection_pool=pool)
 
-    def set(self, key: str, value: str) -> Optional[bool]:
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> Optional[bool]:
         prefix = self._state_options.key_prefix
-        return self.internal_state.set(prefix + key, value)
+        return self.internal_state.set(prefix + key, value, px=_get_ttl_ms(ttl, self._state_options))
 
     def get(self, key: str) -> Optional[Any]:
         prefix = self._state_options.key_prefix
@@ -94,6 +447,45 @@ class RedisState(BaseState):
         prefix = self._state_options.key_prefix
         return self.internal_state.exists(prefix + key)
 
+    def delete(self, key: str) -> int:
+        prefix = self._state_options.key_prefix
+        return self.internal_state.delete(prefix + key)
+
+    def mset(self, mapping: Dict[str, Any]) -> Optional[bool]:
+        prefix = self._state_options.key_prefix
+        return self.internal_state.mset({prefix + key: value for key, value in mapping.items()})
+
+    def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        prefix = self._state_options.key_prefix
+        return self.internal_state.mget([prefix + key for key in keys])
+
+    def incrby(self, key: str, amount: int) -> int:
+        prefix = self._state_options.key_prefix
+        return self.internal_state.incrby(prefix + key, amount)
+
+    def hset(self, name: str, key: str, value: Any) -> int:
+        prefix = self._state_options.key_prefix
+        return self.internal_state.hset(prefix + name, key, value)
+
+    def hget(self, name: str, key: str) -> Optional[Any]:
+        prefix = self._state_options.key_prefix
+        return self.internal_state.hget(prefix + name, key)
+
+    def hgetall(self, name: str) -> Dict:
+        prefix = self._state_options.key_prefix
+        return self.internal_state.hgetall(prefix + name)
+
+    def _execute_pipeline(self, calls: List[_Call], transaction: bool) -> List[Any]:
+        with self.internal_state.pipeline(transaction=transaction) as pipe:
+            # Queue the calls on the Redis pipeline, re-using the key
+            # prefixing logic above (but not any caching on top of it, as
+            # the pipeline only returns its results once executed)
+            queued = _with_client(self, pipe, RedisState)
+            for name, args in calls:
+                getattr(queued, name)(*args)
+
+            return pipe.execute()
+
     @property
     def internal_state(self) -> redis.Redis:
         if not self._internal_state:
@@ -103,3 +495,309 @@ class RedisState(BaseState):
     @property
     def state_options(self):
         return self._state_options
+
+
+class CachedRedisState(RedisState):
+    """
+    Redis state backend with an in-process near-cache of the values read
+    through ``get``, ``mget`` and ``hgetall``, bounded like the ``LOCAL``
+    backend, with ``near_cache_ttl`` as the TTL of its entries.
+
+    Entries get invalidated through Redis keyspace notifications for the
+    keys under ``key_prefix``, which must be enabled in the Redis servers
+    (e.g. ``notify-keyspace-events KA``).
+    The cache gets bypassed while the notifications channel is down, and
+    cleared once it comes back, as notifications may have been missed in
+    between.
+    """
+
+    def __init__(self, state_options: StateOptions):
+        super().__init__(state_options)
+        self._near_cache = LocalState(
+            StateOptions(
+                default_ttl=state_options.near_cache_ttl,
+                max_entries=state_options.max_entries,
+                max_bytes=state_options.max_bytes,
+                eviction_policy=state_options.eviction_policy,
+            )
+        )
+        self._lock = threading.Lock()
+        # Bumped on every invalidation, so that values read concurrently
+        # with one don't get cached
+        self._invalidations = 0
+        # Nodes whose notifications are being received
+        self._listening: Set[int] = set()
+        self._num_nodes = 1
+        self._listeners: List[threading.Thread] = []
+        self._stopped = threading.Event()
+
+    def _setup_state(self) -> None:
+        super()._setup_state()
+
+        clients = (
+            self._internal_state.nodes if isinstance(self._internal_state, ShardedRedis) else [self._internal_state]
+        )
+        self._num_nodes = len(clients)
+        prefix = re.sub(r"([*?\[\]\\])", r"\\\1", self._state_options.key_prefix)
+        for node, client in enumerate(clients):
+            db = client.connection_pool.connection_kwargs.get("db", 0)
+            pubsub = client.pubsub()
+            pubsub.psubscribe(f"__keyspace@{db}__:{prefix}*")
+
+            listener = threading.Thread(target=self._listen, args=(pubsub, node), daemon=True)
+            listener.start()
+            self._listeners.append(listener)
+
+    def _listen(self, pubsub: Any, node: int = 0):
+        while not self._stopped.is_set():
+            try:
+                message = pubsub.get_message(timeout=_LISTEN_TIMEOUT)
+            except redis.ConnectionError as err:
+                # The subscription gets restored on the next read
+                logger.warning(f"Lost Redis keyspace notifications, bypassing near-cache: {err}")
+                self._invalidate_all(node, listening=False)
+                self._stopped.wait(_LISTEN_TIMEOUT)
+                continue
+
+            if message is None:
+                continue
+
+            if message["type"] == "psubscribe":
+                self._invalidate_all(node, listening=True)
+            elif message["type"] == "pmessage":
+                _, key = message["channel"].split(b":", 1)
+                self._invalidate(key.decode("utf-8"))
+
+        pubsub.close()
+
+    def close(self):
+        self._stopped.set()
+        for node in range(self._num_nodes):
+            self._invalidate_all(node, listening=False)
+
+    def get(self, key: str) -> Optional[Any]:
+        prefix = self._state_options.key_prefix
+        return self._get_cached(prefix + key, lambda: super(CachedRedisState, self).get(key))
+
+    def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        prefix = self._state_options.key_prefix
+        values = [copy.copy(self._near_cache.get(prefix + key)) for key in keys]
+        missing = [key for key, value in zip(keys, values) if value is None]
+        if not missing:
+            return values
+
+        invalidations = self._invalidations
+        fetched = iter(super().mget(missing))
+        for idx, value in enumerate(values):
+            if value is None:
+                values[idx] = next(fetched)
+                self._cache(prefix + keys[idx], values[idx], invalidations)
+
+        return values
+
+    def hgetall(self, name: str) -> Dict:
+        prefix = self._state_options.key_prefix
+        return self._get_cached(prefix + name, lambda: super(CachedRedisState, self).hgetall(name))
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> Optional[bool]:
+        res = super().set(key, value, ttl=ttl)
+        self._invalidate(self._state_options.key_prefix + key)
+        return res
+
+    def delete(self, key: str) -> int:
+        res = super().delete(key)
+        self._invalidate(self._state_options.key_prefix + key)
+        return res
+
+    def mset(self, mapping: Dict[str, Any]) -> Optional[bool]:
+        res = super().mset(mapping)
+        for key in mapping:
+            self._invalidate(self._state_options.key_prefix + key)
+        return res
+
+    def incrby(self, key: str, amount: int) -> int:
+        res = super().incrby(key, amount)
+        self._invalidate(self._state_options.key_prefix + key)
+        return res
+
+    def hset(self, name: str, key: str, value: Any) -> int:
+        res = super().hset(name, key, value)
+        self._invalidate(self._state_options.key_prefix + name)
+        return res
+
+    def _execute_pipeline(self, calls: List[_Call], transaction: bool) -> List[Any]:
+        # Pipelines always go to Redis, but their writes still need to
+        # invalidate the near-cache
+        res = super()._execute_pipeline(calls, transaction)
+        for name, args in calls:
+            if name == "mset":
+                for key in args[0]:
+                    self._invalidate(self._state_options.key_prefix + key)
+            elif name in _WRITE_OPERATIONS:
+                self._invalidate(self._state_options.key_prefix + args[0])
+
+        return res
+
+    @property
+    def near_cache_stats(self) -> Dict[str, int]:
+        return self._near_cache.stats
+
+    def _get_cached(self, key: str, fetch: Callable[[], Any]) -> Any:
+        value = self._near_cache.get(key)
+        if value is not None:
+            # Callers may modify the values they get (e.g. hashes), which
+            # mustn't change the cached ones
+            return copy.copy(value)
+
+        invalidations = self._invalidations
+        value = fetch()
+        self._cache(key, value, invalidations)
+        return value
+
+    def _cache(self, key: str, value: Any, invalidations: int):
+        if value is None or value == {}:
+            return
+
+        with self._lock:
+            if len(self._listening) == self._num_nodes and invalidations == self._invalidations:
+                self._near_cache.set(key, copy.copy(value))
+
+    def _invalidate(self, key: str):
+        with self._lock:
+            self._invalidations += 1
+            self._near_cache.delete(key)
+
+    def _invalidate_all(self, node: int, listening: bool):
+        with self._lock:
+            self._invalidations += 1
+            if listening:
+                self._listening.add(node)
+            else:
+                self._listening.discard(node)
+            self._near_cache = LocalState(self._near_cache.state_options)
+
+
+class AsyncRedisState:
+    """
+    Redis state backend with awaitable operations, meant for ``tempo.aio``
+    models, so that state access doesn't block the event loop they run on.
+    Connections are taken from a shared pool, capped by
+    ``max_connections``.
+    """
+
+    def __init__(self, state_options: StateOptions):
+        self._state_options = state_options
+        self._internal_state: redis.asyncio.Redis = None  # type: ignore
+
+    def _setup_state(self) -> None:
+        if self._state_options.nodes:
+            raise ValueError("Sharding state across nodes is not supported by the AIOREDIS backend")
+
+        self._redis_host = self._state_options.host
+        self._redis_port = int(self._state_options.port)
+        pool = redis.asyncio.ConnectionPool(
+            host=self._redis_host,
+            port=self._redis_port,
+            max_connections=self._state_options.max_connections,
+        )
+        self._internal_state = redis.asyncio.Redis(connection_pool=pool)
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> Optional[bool]:
+        prefix = self._state_options.key_prefix
+        return await self.internal_state.set(prefix + key, value, px=_get_ttl_ms(ttl, self._state_options))
+
+    async def get(self, key: str) -> Optional[Any]:
+        prefix = self._state_options.key_prefix
+        return await self.internal_state.get(prefix + key)
+
+    async def exists(self, key: str) -> int:
+        prefix = self._state_options.key_prefix
+        return await self.internal_state.exists(prefix + key)
+
+    async def delete(self, key: str) -> int:
+        prefix = self._state_options.key_prefix
+        return await self.internal_state.delete(prefix + key)
+
+    async def mset(self, mapping: Dict[str, Any]) -> Optional[bool]:
+        prefix = self._state_options.key_prefix
+        return await self.internal_state.mset({prefix + key: value for key, value in mapping.items()})
+
+    async def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        prefix = self._state_options.key_prefix
+        return await self.internal_state.mget([prefix + key for key in keys])
+
+    async def incr(self, key: str) -> int:
+        return await self.incrby(key, 1)
+
+    async def incrby(self, key: str, amount: int) -> int:
+        prefix = self._state_options.key_prefix
+        return await self.internal_state.incrby(prefix + key, amount)
+
+    async def hset(self, name: str, key: str, value: Any) -> int:
+        prefix = self._state_options.key_prefix
+        return await self.internal_state.hset(prefix + name, key, value)
+
+    async def hget(self, name: str, key: str) -> Optional[Any]:
+        prefix = self._state_options.key_prefix
+        return await self.internal_state.hget(prefix + name, key)
+
+    async def hgetall(self, name: str) -> Dict:
+        prefix = self._state_options.key_prefix
+        return await self.internal_state.hgetall(prefix + name)
+
+    def pipeline(self, transaction: bool = True) -> StatePipeline:
+        return StatePipeline(self, transaction=transaction)
+
+    async def _execute_pipeline(self, calls: List[_Call], transaction: bool) -> List[Any]:
+        async with self.internal_state.pipeline(transaction=transaction) as pipe:
+            queued = _with_client(self, pipe)
+            for name, args in calls:
+                await getattr(queued, name)(*args)
+
+            return await pipe.execute()
+
+    async def close(self) -> None:
+        if self._internal_state:
+            await self._internal_state.connection_pool.disconnect()
+            self._internal_state = None  # type: ignore
+
+    @property
+    def internal_state(self) -> redis.asyncio.Redis:
+        if not self._internal_state:
+            self._setup_state()
+        return self._internal_state
+
+    @property
+    def state_options(self):
+        return self._state_options
+
+
+def _with_client(state: Any, client: Any, state_cls: Optional[type] = None) -> Any:
+    view = (state_cls or type(state))(state.state_options)
+    view._internal_state = client
+    return view
+
+
+def _get_ttl(ttl: Optional[float], state_options: StateOptions) -> Optional[float]:
+    return ttl if ttl is not None else state_options.default_ttl
+
+
+def _get_ttl_ms(ttl: Optional[float], state_options: StateOptions) -> Optional[int]:
+    ttl = _get_ttl(ttl, state_options)
+    return int(ttl * 1000) if ttl is not None else None
+
+
+def _size_of(value: Any) -> int:
+    # Shallow sizes, which are enough to approximate the size of the
+    # strings, numbers and hashes usually kept as state
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_size_of_field(key, elem) for key, elem in value.items())
+
+    return sys.getsizeof(value)
+
+
+def _size_of_field(key: Any, value: Any) -> int:
+    if value is _missing:
+        return 0
+
+    return sys.getsizeof(key) + sys.getsizeof(value)
@@ -5,13 +5,16 @@ from pathlib import Path
 import numpy as np
 import pytest
 import yaml
+from mlserver.settings import ModelParameters, ModelSettings
 
-from tempo import Model, ModelFramework, Pipeline, PipelineModels, model, pipeline, predictmethod
+from tempo import Model, ModelFramework, Pipeline, PipelineModels, model, pipeline, predictmethod, save
+from tempo.mlserver import InferenceRuntime
 from tempo.protocols.tensorflow import TensorflowProtocol
 from tempo.protocols.v2 import V2Protocol
 from tempo.seldon import SeldonProtocol
-from tempo.serve.constants import MLServerEnvDeps
-from tempo.serve.metadata import KubernetesRuntimeOptions
+from tempo.serve.base import BaseModel
+from tempo.serve.constants import ENV_TEMPO_RUNTIME_OPTIONS, MLServerEnvDeps
+from tempo.serve.metadata import DockerOptions, KubernetesRuntimeOptions
 
 TESTS_PATH = os.path.dirname(__file__)
 TESTDATA_PATH = os.path.join(TESTS_PATH, "testdata")
@@ -145,3 +148,25 @@ def inference_pipeline_class(sklearn_model, xgboost_model: Model):
 @pytest.fixture
 def conda_yaml_no_mlserver_deps():
     return os.path.join(os.path.dirname(__file__), "serve", "data", "conda_missing_mlserver.yaml")
+
+
+@pytest.fixture
+def load_runtime(monkeypatch):
+    """
+    Save a model and load it into an MLServer runtime, with the given
+    runtime options.
+    """
+
+    async def _load_runtime(user_model: BaseModel, runtime_options: DockerOptions) -> InferenceRuntime:
+        save(user_model, save_env=False)
+        monkeypatch.setenv(ENV_TEMPO_RUNTIME_OPTIONS, runtime_options.json())
+
+        model_settings = ModelSettings(
+            name=user_model.details.name,
+            parameters=ModelParameters(uri=user_model.details.local_folder),
+        )
+        runtime = InferenceRuntime(model_settings)
+        await runtime.load()
+        return runtime
+
+    return _load_runtime
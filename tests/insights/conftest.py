@@ -0,0 +1,96 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, List
+
+import janus
+import pytest
+from aiohttp import web
+
+from tempo.insights.records import InsightsRecord
+from tempo.serve.metadata import InsightsTypes
+
+
+class _Sink:
+    def __init__(self):
+        self.requests: List[Any] = []
+        self.url = ""
+        # Statuses to respond with, before succeeding
+        self.statuses: List[int] = []
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.statuses:
+            return web.Response(status=self.statuses.pop(0))
+
+        self.requests.append((request.headers, await request.json()))
+        return web.Response()
+
+    @property
+    def events(self) -> int:
+        return sum(len(body) if isinstance(body, list) else 1 for _, body in self.requests)
+
+
+@pytest.fixture
+def sink_server():
+    """
+    Start an HTTP server on a free port, which records the insights
+    payloads sent to it.
+    """
+
+    @asynccontextmanager
+    async def _sink_server():
+        sink = _Sink()
+        app = web.Application()
+        app.router.add_post("/", sink.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]  # type: ignore
+        sink.url = f"http://127.0.0.1:{port}/"
+
+        try:
+            yield sink
+        finally:
+            await runner.cleanup()
+
+    return _sink_server
+
+
+@pytest.fixture
+def payload():
+    """
+    Build the insights record with the given index.
+    """
+
+    def _payload(idx: int) -> InsightsRecord:
+        return InsightsRecord(request_id=str(idx), data={"idx": idx}, insights_type=InsightsTypes.INFER_REQUEST)
+
+    return _payload
+
+
+@pytest.fixture
+def create_queue():
+    """
+    Create a queue of the given size, from within an event loop as janus
+    requires.
+    """
+
+    async def _create_queue(maxsize: int) -> janus.Queue:
+        return janus.Queue(maxsize=maxsize)
+
+    return _create_queue
+
+
+@pytest.fixture
+def wait_for():
+    """
+    Wait for a condition to hold, failing after the given timeout.
+    """
+
+    async def _wait_for(condition, timeout: float = 5):
+        deadline = asyncio.get_running_loop().time() + timeout
+        while not condition():
+            assert asyncio.get_running_loop().time() < deadline
+            await asyncio.sleep(0.01)
+
+    return _wait_for
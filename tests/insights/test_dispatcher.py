@@ -0,0 +1,121 @@
+import contextvars
+import json
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+from tempo.insights.dispatcher import InsightsDispatcher, get_dispatcher
+from tempo.insights.manager import InsightsManager
+from tempo.insights.wrapper import InsightsWrapper
+from tempo.magic import PayloadContext, TempoContextWrapper, tempo_context
+
+
+@contextmanager
+def _sink():
+    # Runs on its own thread, as the dispatcher's callers are synchronous
+    bodies: List[dict] = []
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers["Content-Length"])
+            bodies.append(json.loads(self.rfile.read(length)))
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/", bodies
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _log(manager: InsightsManager, idx: int):
+    payload_context = PayloadContext(request_id=str(idx), request={})
+    tempo_context.set(TempoContextWrapper(payload_context, InsightsWrapper(manager), None))
+    manager.log({"idx": idx})
+
+
+def _insights_threads() -> int:
+    return sum(thread.name == "tempo-insights" for thread in threading.enumerate())
+
+
+def test_acquire_shares_channel():
+    dispatcher = InsightsDispatcher()
+
+    first = dispatcher.acquire("http://127.0.0.1:1/", max_queue_size=10, batch_size=1)
+    second = dispatcher.acquire("http://127.0.0.1:1/", max_queue_size=10, batch_size=1)
+    other = dispatcher.acquire("http://127.0.0.1:1/", max_queue_size=10, batch_size=5)
+
+    assert first is second
+    assert first is not other
+    assert first.refs == 2
+    assert dispatcher.num_channels == 2
+    assert len(dispatcher._sessions) == 1
+
+    dispatcher.release(first, timeout=0)
+    assert dispatcher.num_channels == 2
+    dispatcher.release(second, timeout=0)
+    assert dispatcher.num_channels == 1
+    assert dispatcher._loop is not None
+
+    dispatcher.release(other, timeout=0)
+    assert dispatcher.num_channels == 0
+    assert dispatcher._loop is None
+    assert dispatcher._sessions == {}
+
+
+def test_release_flushes(payload):
+    dispatcher = InsightsDispatcher()
+    with _sink() as (url, bodies):
+        channel = dispatcher.acquire(url, batch_size=1)
+        for idx in range(5):
+            channel.queue.sync_q.put(payload(idx))
+
+        dispatcher.release(channel)
+
+    assert sorted(body["idx"] for body in bodies) == list(range(5))
+    assert channel.stats.sent == 5
+
+
+def test_shutdown_flushes(payload):
+    dispatcher = InsightsDispatcher()
+    with _sink() as (url, bodies):
+        channels = [dispatcher.acquire(url, batch_size=batch_size) for batch_size in (1, 2)]
+        for idx, channel in enumerate(channels):
+            channel.queue.sync_q.put(payload(idx))
+
+        dispatcher.shutdown()
+
+        # Releasing after a shutdown is a no-op
+        dispatcher.release(channels[0])
+
+    assert len(bodies) == 2
+    assert dispatcher.num_channels == 0
+    assert dispatcher._loop is None
+
+
+def test_managers_share_worker():
+    threads = _insights_threads()
+    with _sink() as (url, bodies):
+        managers = [InsightsManager(worker_endpoint=url) for _ in range(3)]
+
+        assert _insights_threads() == threads + 1
+        assert get_dispatcher().num_channels == 1
+        assert managers[0].stats is managers[1].stats
+
+        for idx, manager in enumerate(managers):
+            contextvars.copy_context().run(_log, manager, idx)
+
+        for manager in managers:
+            manager.close()
+
+    assert sorted(body["idx"] for body in bodies) == [0, 1, 2]
+    assert get_dispatcher().num_channels == 0
+    assert _insights_threads() == threads
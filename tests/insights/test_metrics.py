@@ -0,0 +1,97 @@
+import asyncio
+from contextlib import suppress
+
+import janus
+import pytest
+from prometheus_client import REGISTRY
+
+from tempo.insights.metrics import Buckets
+from tempo.insights.sinks import MemorySink
+from tempo.insights.worker import InsightsStats, put_sync, start_worker
+from tempo.serve.metadata import InsightsOverflowPolicies
+
+
+def test_buckets():
+    buckets = Buckets((1, 10))
+    for value in (0.5, 1, 5, 50):
+        buckets.observe(value)
+
+    assert buckets.dict() == {
+        "count": 4,
+        "sum": 56.5,
+        "mean": 14.125,
+        "max": 50,
+        "buckets": {"1": 2, "10": 3, "+Inf": 4},
+    }
+
+
+def test_snapshot(create_queue, payload):
+    queue = asyncio.run(create_queue(2))
+    stats = InsightsStats()
+    stats.set_queue(queue.sync_q)
+
+    for idx in range(3):
+        put_sync(queue.sync_q, payload(idx), stats, InsightsOverflowPolicies.DROP_NEWEST)
+
+    snapshot = stats.snapshot()
+    assert snapshot["enqueued"] == 2
+    assert snapshot["dropped"] == 1
+    assert snapshot["queue_depth"] == 2
+    assert snapshot["enqueue_rate"] > 0
+
+    # Rates only cover what happened since the previous snapshot
+    assert stats.snapshot()["enqueue_rate"] == 0
+
+
+async def test_worker_metrics(payload):
+    sink = MemorySink()
+    queue: janus.Queue = janus.Queue()
+    stats = InsightsStats()
+    worker = asyncio.create_task(start_worker(queue.async_q, "", batch_size=5, stats=stats, sink=sink))  # type: ignore
+    for idx in range(5):
+        await queue.async_q.put(payload(idx))
+
+    await queue.async_q.join()
+    worker.cancel()
+    with suppress(asyncio.CancelledError):
+        await worker
+
+    snapshot = stats.snapshot()
+    assert snapshot["dequeued"] == 5
+    assert snapshot["sent"] == 5
+    assert snapshot["queue_depth"] == 0
+    assert snapshot["batch_size"]["count"] == 1
+    assert snapshot["batch_size"]["max"] == 5
+    assert snapshot["send_latency"]["count"] == 1
+
+
+@pytest.mark.parametrize(
+    "statuses, attempts, send_errors",
+    [
+        ([503], 2, {"503": 1}),
+        # Non-retryable errors aren't retried
+        ([400, 400], 1, {"400": 1}),
+    ],
+)
+async def test_prometheus_metrics(sink_server, payload, statuses, attempts, send_errors):
+    async with sink_server() as sink:
+        sink.statuses = statuses
+        queue: janus.Queue = janus.Queue()
+        stats = InsightsStats(sink.url)
+        worker = asyncio.create_task(
+            start_worker(queue.async_q, sink.url, stats=stats, retries=1, backoff_factor=0.001)  # type: ignore
+        )
+        await queue.async_q.put(payload(0))
+        await queue.async_q.join()
+        worker.cancel()
+        with suppress(asyncio.CancelledError):
+            await worker
+
+    assert stats.send_errors == send_errors
+    labels = {"sink": sink.url}
+    assert REGISTRY.get_sample_value("tempo_insights_dequeued_total", labels) == 1
+    assert REGISTRY.get_sample_value("tempo_insights_retries_total", labels) == stats.retries
+    assert REGISTRY.get_sample_value("tempo_insights_send_latency_seconds_count", labels) == attempts
+    assert REGISTRY.get_sample_value("tempo_insights_queue_depth", labels) == 0
+    for error, count in send_errors.items():
+        assert REGISTRY.get_sample_value("tempo_insights_send_errors_total", {"error": error, **labels}) == count
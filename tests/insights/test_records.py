@@ -0,0 +1,43 @@
+import json
+
+import numpy as np
+import pytest
+from mlserver.types import InferenceResponse, ResponseOutput
+
+from tempo.insights.records import InsightsRecord, dumps
+from tempo.serve.metadata import InsightsTypes
+
+
+@pytest.mark.parametrize(
+    "data, expected",
+    [
+        ({"foo": [1, 2]}, {"foo": [1, 2]}),
+        (np.array([[1.0, 2.0]]), [[1.0, 2.0]]),
+        ({"count": np.int64(3)}, {"count": 3}),
+    ],
+)
+def test_dumps(data, expected):
+    assert json.loads(dumps(data)) == expected
+
+
+def test_dumps_pydantic():
+    output = ResponseOutput(name="out", shape=[2], datatype="FP64", data=np.array([1.0, 2.0]).tolist())
+    response = InferenceResponse(model_name="foo", outputs=[output])
+
+    assert json.loads(dumps({"response": response})) == {"response": json.loads(response.json())}
+
+
+def test_dumps_error():
+    with pytest.raises(TypeError):
+        dumps({"foo": object()})
+
+
+@pytest.mark.parametrize("insights_type", [InsightsTypes.INFER_RESPONSE, InsightsTypes.INFER_RESPONSE.value])
+def test_record(insights_type):
+    data = np.ones(2)
+    record = InsightsRecord("foo", data, insights_type)
+
+    # The data isn't copied nor encoded until the worker sends it
+    assert record.data is data
+    assert record.insights_type == InsightsTypes.INFER_RESPONSE.value
+    assert record.dict() == {"request_id": "foo", "data": data, "insights_type": InsightsTypes.INFER_RESPONSE.value}
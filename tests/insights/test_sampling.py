@@ -0,0 +1,43 @@
+import time
+
+import pytest
+
+from tempo.insights.sampling import InsightsSampler, TokenBucket
+from tempo.serve.metadata import InsightsSamplingTypes
+
+
+@pytest.mark.parametrize("sample_rate", [0.0, 0.1, 0.5, 1.0])
+def test_sample_rate(sample_rate):
+    sampler = InsightsSampler(sample_rate=sample_rate)
+
+    sampled = sum(sampler.sample() for _ in range(10000))
+
+    assert abs(sampled - sample_rate * 10000) < 300
+
+
+def test_sample_request_id():
+    sampler = InsightsSampler(sample_rate=0.2, sampling_type=InsightsSamplingTypes.REQUEST_ID)
+    other_sampler = InsightsSampler(sample_rate=0.2, sampling_type=InsightsSamplingTypes.REQUEST_ID)
+
+    request_ids = [f"request-{idx}" for idx in range(10000)]
+    sampled = [request_id for request_id in request_ids if sampler.sample(request_id)]
+
+    assert abs(len(sampled) - 2000) < 300
+    assert sampled == [request_id for request_id in request_ids if other_sampler.sample(request_id)]
+
+
+def test_token_bucket(monkeypatch):
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    bucket = TokenBucket(rate=10)
+
+    assert sum(bucket.acquire() for _ in range(20)) == 10
+
+    now += 0.5
+    assert sum(bucket.acquire() for _ in range(20)) == 5
+
+
+def test_max_events_per_second():
+    sampler = InsightsSampler(max_events_per_second=5)
+
+    assert sum(sampler.sample() for _ in range(100)) == 5
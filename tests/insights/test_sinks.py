@@ -0,0 +1,182 @@
+import asyncio
+import gzip
+import os
+import time
+from contextlib import suppress
+
+import janus
+import pytest
+
+from tempo.insights.manager import InsightsManager
+from tempo.insights.records import dumps
+from tempo.insights.sinks import (
+    SPOOL_CORRUPT_SUFFIX,
+    SPOOL_FILE_PREFIX,
+    SPOOL_FILE_SUFFIX,
+    SPOOL_OPEN_SUFFIX,
+    MemorySink,
+    SpoolSink,
+    get_spool_files,
+    read_spool_file,
+)
+from tempo.insights.worker import InsightsStats, replay_spool, start_worker
+from tempo.serve.metadata import InsightsSinkTypes, InsightsTypes
+
+
+async def test_memory_sink(payload):
+    sink = MemorySink(maxlen=3)
+
+    await sink.send([payload(idx) for idx in range(5)])
+
+    assert [record.request_id for record in sink.payloads] == ["2", "3", "4"]
+
+
+async def test_start_worker_sink(payload):
+    sink = MemorySink()
+    queue: janus.Queue = janus.Queue()
+    stats = InsightsStats()
+    worker = asyncio.create_task(start_worker(queue.async_q, "", batch_size=2, stats=stats, sink=sink))  # type: ignore
+    for idx in range(4):
+        await queue.async_q.put(payload(idx))
+
+    await queue.async_q.join()
+    worker.cancel()
+    with suppress(asyncio.CancelledError):
+        await worker
+
+    assert [record.request_id for record in sink.payloads] == ["0", "1", "2", "3"]
+    assert stats.sent == 4
+
+
+async def test_spool_sink_rotation(payload, tmp_path):
+    sink = SpoolSink(str(tmp_path), max_bytes=200)
+
+    for idx in range(10):
+        await sink.send([payload(idx)])
+
+    # The file still being written to doesn't get replayed
+    rotated = get_spool_files(str(tmp_path))
+    assert 0 < len(rotated) < 10
+    assert len(os.listdir(tmp_path)) == len(rotated) + 1
+
+    await sink.close()
+    spool_files = get_spool_files(str(tmp_path))
+    payloads = [record for file_path in spool_files for record in read_spool_file(file_path)]
+    assert [record.request_id for record in payloads] == [str(idx) for idx in range(10)]
+    assert payloads[0].data == {"idx": 0}
+    assert payloads[0].insights_type == InsightsTypes.INFER_REQUEST.value
+
+
+async def test_spool_sink_max_age(payload, tmp_path, monkeypatch):
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+    sink = SpoolSink(str(tmp_path), max_age=60)
+    await sink.send([payload(0)])
+    assert get_spool_files(str(tmp_path)) == []
+
+    # Expired files get rotated on write, even if nothing forwards the spool
+    now += 60
+    await sink.send([payload(1)])
+    assert len(get_spool_files(str(tmp_path))) == 1
+
+    await sink.send([payload(2)])
+    now += 60
+    sink.rotate_if_expired()
+    assert len(get_spool_files(str(tmp_path))) == 2
+
+
+def test_spool_sink_recovery(payload, tmp_path):
+    # Spool file left open by a crashed process, cut short in the middle of
+    # its last payload
+    raw = gzip.compress(b"".join(dumps(payload(idx).dict()) + b"\n" for idx in range(3)))
+    open_path = tmp_path / f"{SPOOL_FILE_PREFIX}0-1{SPOOL_FILE_SUFFIX}{SPOOL_OPEN_SUFFIX}"
+    open_path.write_bytes(raw[:-12])
+
+    sink = SpoolSink(str(tmp_path))
+    sink.write([payload(3)])
+
+    # Files still open by a running sink are left alone
+    SpoolSink(str(tmp_path))
+    spool_files = get_spool_files(str(tmp_path))
+    assert len(spool_files) == 1
+    assert [record.request_id for record in read_spool_file(spool_files[0])] == ["0", "1"]
+
+    sink.rotate()
+    assert len(get_spool_files(str(tmp_path))) == 2
+
+
+async def test_replay_spool_corrupt(sink_server, payload, tmp_path):
+    corrupt_path = tmp_path / f"{SPOOL_FILE_PREFIX}0-1{SPOOL_FILE_SUFFIX}"
+    corrupt_path.write_bytes(b"not gzip")
+    spool = SpoolSink(str(tmp_path))
+    await spool.send([payload(idx) for idx in range(2)])
+    await spool.close()
+
+    async with sink_server() as sink:
+        sent = await replay_spool(str(tmp_path), sink.url)
+
+    # Corrupt files get set aside, without stopping the replay
+    assert sent == 2
+    assert os.listdir(tmp_path) == [corrupt_path.name + SPOOL_CORRUPT_SUFFIX]
+
+
+@pytest.mark.parametrize("batch_size, expected_requests", [(1, 5), (2, 3)])
+async def test_replay_spool(sink_server, payload, tmp_path, batch_size, expected_requests):
+    spool = SpoolSink(str(tmp_path), max_bytes=200)
+    await spool.send([payload(idx) for idx in range(5)])
+    await spool.close()
+
+    async with sink_server() as sink:
+        sent = await replay_spool(str(tmp_path), sink.url, batch_size=batch_size)
+
+    assert sent == 5
+    assert sink.events == 5
+    assert len(sink.requests) == expected_requests
+    assert os.listdir(tmp_path) == []
+
+
+async def test_replay_spool_failure(sink_server, payload, tmp_path):
+    spool = SpoolSink(str(tmp_path))
+    await spool.send([payload(idx) for idx in range(3)])
+    await spool.close()
+
+    async with sink_server() as sink:
+        sink.statuses = [200, 400]
+        sent = await replay_spool(str(tmp_path), sink.url, retries=0)
+
+    # Only the payloads which weren't sent stay spooled
+    assert sent == 1
+    spool_files = get_spool_files(str(tmp_path))
+    assert [record.request_id for record in read_spool_file(spool_files[0])] == ["1", "2"]
+
+
+async def test_spool_forwarding(sink_server, payload, wait_for, tmp_path):
+    async with sink_server() as sink:
+        queue: janus.Queue = janus.Queue()
+        stats = InsightsStats()
+        worker = asyncio.create_task(
+            start_worker(
+                queue.async_q,  # type: ignore
+                sink.url,
+                stats=stats,
+                sink_type=InsightsSinkTypes.SPOOL,
+                spool_path=str(tmp_path),
+                spool_max_age=0,
+                spool_forward_interval=0.01,
+            )
+        )
+        for idx in range(3):
+            await queue.async_q.put(payload(idx))
+
+        await wait_for(lambda: sink.events == 3)
+        worker.cancel()
+        with suppress(asyncio.CancelledError):
+            await worker
+
+    assert stats.sent == 3
+    assert stats.forwarded == 3
+
+
+def test_manager_spool_path():
+    with pytest.raises(ValueError):
+        InsightsManager(sink_type=InsightsSinkTypes.SPOOL)
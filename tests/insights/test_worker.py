@@ -0,0 +1,209 @@
+import asyncio
+import time
+from contextlib import suppress
+
+import aiohttp
+import janus
+import numpy as np
+import pytest
+
+from tempo.insights.cloudevents import CLOUDEVENTS_BATCH_CONTENT_TYPE
+from tempo.insights.records import InsightsRecord
+from tempo.insights.sinks import HTTPSink
+from tempo.insights.worker import (
+    InsightsStats,
+    _BatchCollector,
+    _send_batch,
+    put_async,
+    put_sync,
+    start_insights_worker_from_sync,
+    start_worker,
+)
+from tempo.serve.metadata import InsightsOverflowPolicies, InsightsTypes
+
+
+async def test_batch_collector_size(payload):
+    queue: janus.Queue = janus.Queue()
+    for idx in range(5):
+        queue.async_q.put_nowait(payload(idx))
+
+    collector = _BatchCollector(queue.async_q, batch_size=2, window_time=0)
+
+    assert [len(await collector.next_batch()) for _ in range(3)] == [2, 2, 1]
+
+
+async def test_batch_collector_window(payload):
+    queue: janus.Queue = janus.Queue()
+    collector = _BatchCollector(queue.async_q, batch_size=10, window_time=100)
+
+    async def _put_later():
+        queue.async_q.put_nowait(payload(0))
+        await asyncio.sleep(0.02)
+        queue.async_q.put_nowait(payload(1))
+        await asyncio.sleep(0.3)
+        queue.async_q.put_nowait(payload(2))
+
+    task = asyncio.create_task(_put_later())
+    batch = await collector.next_batch()
+    assert [record.request_id for record in batch] == ["0", "1"]
+
+    # The payload sent after the window closes goes into the next batch
+    batch = await collector.next_batch()
+    assert [record.request_id for record in batch] == ["2"]
+    await task
+    collector.cancel()
+
+
+@pytest.mark.parametrize("batch_size, expected_requests", [(1, 6), (3, 2)])
+async def test_start_worker(sink_server, payload, wait_for, batch_size, expected_requests):
+    async with sink_server() as sink:
+        queue: janus.Queue = janus.Queue()
+        worker = asyncio.create_task(
+            start_worker(queue.async_q, sink.url, batch_size=batch_size, window_time=1000)  # type: ignore
+        )
+        for idx in range(6):
+            await queue.async_q.put(payload(idx))
+
+        await wait_for(lambda: sink.events == 6)
+        worker.cancel()
+        with suppress(asyncio.CancelledError):
+            await worker
+
+    assert len(sink.requests) == expected_requests
+    headers, body = sink.requests[0]
+    if batch_size == 1:
+        assert headers["Ce-Requestid"] == "0"
+        assert body == {"idx": 0}
+    else:
+        assert headers["Content-Type"] == CLOUDEVENTS_BATCH_CONTENT_TYPE
+        assert [event["requestid"] for event in body] == ["0", "1", "2"]
+        assert body[0]["type"] == InsightsTypes.INFER_REQUEST.value
+        assert body[0]["data"] == {"idx": 0}
+
+
+@pytest.mark.parametrize(
+    "overflow_policy, expected",
+    [
+        (InsightsOverflowPolicies.DROP_OLDEST, ["2", "3"]),
+        (InsightsOverflowPolicies.DROP_NEWEST, ["0", "1"]),
+        (InsightsOverflowPolicies.BLOCK, ["0", "1"]),
+    ],
+)
+def test_put_sync(payload, create_queue, overflow_policy, expected):
+    # Sync callers enqueue from outside of the worker's loop
+    queue = asyncio.run(create_queue(2))
+    stats = InsightsStats()
+
+    for idx in range(4):
+        put_sync(queue.sync_q, payload(idx), stats, overflow_policy, overflow_timeout=0.01)
+
+    assert [queue.sync_q.get_nowait().request_id for _ in range(2)] == expected
+    assert stats.dropped == 2
+
+
+@pytest.mark.parametrize(
+    "overflow_policy, expected",
+    [
+        (InsightsOverflowPolicies.DROP_OLDEST, ["2", "3"]),
+        (InsightsOverflowPolicies.DROP_NEWEST, ["0", "1"]),
+    ],
+)
+async def test_put_async(payload, overflow_policy, expected):
+    queue: janus.Queue = janus.Queue(maxsize=2)
+    stats = InsightsStats()
+
+    for idx in range(4):
+        put_async(queue.async_q, payload(idx), stats, overflow_policy)
+
+    assert [queue.async_q.get_nowait().request_id for _ in range(2)] == expected
+    assert stats.dropped == 2
+
+
+async def test_put_async_block(payload):
+    queue: janus.Queue = janus.Queue(maxsize=1)
+    stats = InsightsStats()
+
+    put_async(queue.async_q, payload(0), stats, InsightsOverflowPolicies.BLOCK, overflow_timeout=1)
+    put_async(queue.async_q, payload(1), stats, InsightsOverflowPolicies.BLOCK, overflow_timeout=1)
+    assert queue.async_q.qsize() == 1
+
+    # The blocked payload gets enqueued once there is space
+    assert (await queue.async_q.get()).request_id == "0"
+    assert (await queue.async_q.get()).request_id == "1"
+    assert stats.dropped == 0
+
+
+async def test_put_sync_block_in_loop(payload, wait_for):
+    queue: janus.Queue = janus.Queue(maxsize=1)
+    stats = InsightsStats()
+    loop = asyncio.get_running_loop()
+
+    put_sync(queue.sync_q, payload(0), stats, InsightsOverflowPolicies.BLOCK, overflow_timeout=1, loop=loop)
+    start = time.monotonic()
+    put_sync(queue.sync_q, payload(1), stats, InsightsOverflowPolicies.BLOCK, overflow_timeout=1, loop=loop)
+
+    # Sync callers running on the loop don't wait for a free slot on it
+    assert time.monotonic() - start < 0.5
+    assert (await queue.async_q.get()).request_id == "0"
+    assert (await asyncio.wait_for(queue.async_q.get(), timeout=5)).request_id == "1"
+    assert stats.dropped == 0
+
+
+@pytest.mark.parametrize(
+    "statuses, sent, retries, dead_letters",
+    [
+        ([], 2, 0, 0),
+        ([503, 429], 2, 2, 0),
+        ([503, 503, 503], 0, 2, 2),
+        ([400], 0, 0, 2),
+    ],
+)
+async def test_send_batch_retries(sink_server, payload, statuses, sent, retries, dead_letters):
+    stats = InsightsStats()
+    async with sink_server() as sink:
+        sink.statuses = statuses
+        async with aiohttp.ClientSession() as session:
+            batch = [payload(0), payload(1)]
+            http_sink = HTTPSink(sink.url, session, batch_mode=True)
+            await _send_batch(http_sink, batch, stats, retries=2, backoff_factor=0.001)
+
+    assert stats.sent == sent
+    assert stats.retries == retries
+    assert stats.dead_letters == dead_letters
+
+
+async def test_send_batch_unreachable(payload):
+    stats = InsightsStats()
+    async with aiohttp.ClientSession() as session:
+        http_sink = HTTPSink("http://127.0.0.1:1/", session)
+        await _send_batch(http_sink, [payload(0)], stats, retries=1, backoff_factor=0.001)
+
+    assert stats.retries == 1
+    assert stats.dead_letters == 1
+
+
+def test_slow_sink_never_blocks(payload):
+    # Nothing listens on this address, so that every payload gets retried
+    stats = InsightsStats()
+    queue = start_insights_worker_from_sync(
+        "http://127.0.0.1:1/", max_queue_size=10, retries=5, backoff_factor=1, stats=stats
+    )
+
+    for idx in range(100):
+        put_sync(queue, payload(idx), stats, InsightsOverflowPolicies.DROP_OLDEST)
+
+    assert queue.qsize() <= 10
+    assert stats.dropped >= 89
+
+
+async def test_send_batch_arrays(sink_server):
+    # Logged arrays only get encoded by the worker
+    stats = InsightsStats()
+    record = InsightsRecord("0", {"outputs": np.arange(3)}, InsightsTypes.INFER_RESPONSE)
+    async with sink_server() as sink:
+        async with aiohttp.ClientSession() as session:
+            await _send_batch(HTTPSink(sink.url, session), [record], stats)
+
+    _, body = sink.requests[0]
+    assert body == {"outputs": [0, 1, 2]}
+    assert stats.sent == 1
@@ -1,19 +1,70 @@
+import json
+from typing import Dict, List
+
 import numpy as np
+import pandas as pd
 import pytest
 
-from tempo.protocols.v2 import _REQUEST_NUMPY_CONTENT_TYPE, V2Protocol
-from tempo.serve.metadata import ModelDataArg, ModelDataArgs
+from tempo.protocols.v2 import (
+    _REQUEST_NUMPY_CONTENT_TYPE,
+    V2Protocol,
+    bfloat16_bits_to_float32,
+    float32_to_bfloat16_bits,
+)
+from tempo.serve.metadata import ModelDataArg, ModelDataArgs, ModelDetails, ModelFramework
 
 
 @pytest.mark.parametrize(
-    "data, expected",
-    [("abc", [97, 98, 99]), ({"a": 1}, [123, 39, 97, 39, 58, 32, 49, 125])],
+    "data, expected, content_type",
+    [
+        ("abc", ["abc"], "str"),
+        ({"a": 1}, ['{"a":1}'], "json"),
+        ([1, "b"], ['[1,"b"]'], "json"),
+        (b"abc", ["YWJj"], "base64"),
+        # Types without a codec fall back to the legacy format
+        (1, [49], None),
+        ({1: "a"}, [123, 49, 58, 32, 39, 97, 39, 125], None),
+    ],
 )
-def test_v2_from_any(data, expected):
+def test_v2_from_any(data, expected, content_type):
     d = V2Protocol.create_v2_from_any(data, "a")
     assert d["name"] == "a"
     assert d["data"] == expected
     assert d["datatype"] == "BYTES"
+    assert d.get("parameters", {}).get("content_type") == content_type
+
+
+@pytest.mark.parametrize(
+    "data, ty",
+    [
+        ("abc", str),
+        ({"a": [1, 2]}, dict),
+        ({"a": [1, 2]}, Dict[str, List[int]]),
+        (["a", 1], list),
+        (b"\x00\x01", bytes),
+        (pd.DataFrame({"a": [1, 2], "b": ["x", "y"]}), pd.DataFrame),
+        (pd.Series([1, 2], name="a"), pd.Series),
+        ({1: "a"}, dict),
+        (1, int),
+    ],
+)
+def test_v2_bytes_roundtrip(data, ty):
+    encoded = json.loads(json.dumps(V2Protocol.create_v2_from_any(data, "a")))
+    res = V2Protocol.convert_from_bytes(encoded, ty)
+
+    if isinstance(data, pd.DataFrame):
+        pd.testing.assert_frame_equal(res, data)
+    elif isinstance(data, pd.Series):
+        pd.testing.assert_series_equal(res, data)
+    else:
+        assert res == data
+
+
+def test_convert_from_bytes_declared_type():
+    # Strings without a content type (e.g. sent by other V2 clients) are
+    # parsed according to the declared type
+    output = {"data": ['{"a": 1}'], "datatype": "BYTES", "shape": [1]}
+    assert V2Protocol.convert_from_bytes(output, dict) == {"a": 1}
 
 
 @pytest.mark.parametrize(
@@ -52,3 +103,238 @@ def test_v2_to_protocol_request_other():
     # we should not have the "parameters", mainly so that content_type= "np" is not present.
     # this seems a bit convoluted, so we need to find a better way perhaps for dealing with inference types in tempo
     assert "parameters" not in request
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        np.random.randn(3, 28 * 28),
+        np.arange(12, dtype=np.int32).reshape(3, 4),
+        np.arange(12, dtype=np.float32).reshape(3, 4).T,
+        np.array([True, False]),
+    ],
+)
+def test_v2_binary_request_roundtrip(data):
+    v2 = V2Protocol(binary_data=True)
+    body, header_length = v2.to_binary_request(data)
+
+    request = V2Protocol.decode_binary(body, header_length)
+    assert request["parameters"] == {**_REQUEST_NUMPY_CONTENT_TYPE, "binary_data_output": True}
+    assert request["inputs"][0]["parameters"]["binary_data_size"] == data.nbytes
+    assert "binary_data_output" not in _REQUEST_NUMPY_CONTENT_TYPE
+
+    modelTyArgs = ModelDataArgs(args=[ModelDataArg(ty=np.ndarray)])
+    res = v2.from_protocol_request(request, modelTyArgs)
+    assert res.dtype == data.dtype
+    np.testing.assert_array_equal(res, data)
+
+
+def test_v2_binary_request_mixed():
+    v2 = V2Protocol(binary_data=True)
+    data = np.array([[1.0, 2.0]])
+    body, header_length = v2.to_binary_request(a=data, b="abc")
+
+    request = V2Protocol.decode_binary(body, header_length)
+    modelTyArgs = ModelDataArgs(args=[ModelDataArg(ty=np.ndarray, name="a"), ModelDataArg(ty=str, name="b")])
+    res = v2.from_protocol_request(request, modelTyArgs)
+    np.testing.assert_array_equal(res["a"], data)
+    assert res["b"] == "abc"
+
+
+def test_v2_binary_response_bytes():
+    raw_elem = b"hello"
+    body = b'{"outputs":[{"name":"a","datatype":"BYTES","shape":[1],"parameters":{"binary_data_size":9}}]}'
+    header_length = len(body)
+    body += len(raw_elem).to_bytes(4, "little") + raw_elem
+
+    res = V2Protocol.decode_binary(body, header_length)
+    modelTyArgs = ModelDataArgs(args=[ModelDataArg(ty=str)])
+    assert V2Protocol().from_protocol_response(res, modelTyArgs) == "hello"
+
+    modelTyArgs = ModelDataArgs(args=[ModelDataArg(ty=np.ndarray)])
+    np.testing.assert_array_equal(V2Protocol().from_protocol_response(res, modelTyArgs), np.array(["hello"]))
+
+    modelTyArgs = ModelDataArgs(args=[ModelDataArg(ty=List[str])])
+    assert V2Protocol().from_protocol_response(res, modelTyArgs) == ["hello"]
+
+
+def test_v2_codec_plan_single_input():
+    model_details = ModelDetails(
+        name="a",
+        local_folder="",
+        uri="",
+        platform=ModelFramework.Custom,
+        inputs=ModelDataArgs(args=[ModelDataArg(ty=np.ndarray, name="payload")]),
+        outputs=ModelDataArgs(args=[ModelDataArg(ty=np.ndarray)]),
+    )
+    plan = V2Protocol().compile(model_details)
+
+    req = {"inputs": [{"name": "payload", "datatype": "FP32", "shape": [2], "data": [1, 2]}]}
+    args, kwargs = plan.decode_request(req)
+
+    assert kwargs == {}
+    assert len(args) == 1
+    np.testing.assert_array_equal(args[0], np.array([1, 2], dtype=np.float32))
+
+
+def test_v2_codec_plan_multiple_inputs():
+    model_details = ModelDetails(
+        name="a",
+        local_folder="",
+        uri="",
+        platform=ModelFramework.Custom,
+        inputs=ModelDataArgs(args=[ModelDataArg(ty=np.ndarray, name="a"), ModelDataArg(ty=str, name="b")]),
+        outputs=ModelDataArgs(args=[ModelDataArg(ty=np.ndarray), ModelDataArg(ty=str)]),
+    )
+    plan = V2Protocol().compile(model_details)
+
+    req = {
+        "inputs": [
+            {"name": "b", "datatype": "BYTES", "shape": [3], "data": [97, 98, 99]},
+            {"name": "a", "datatype": "INT32", "shape": [1], "data": [1]},
+        ]
+    }
+    args, kwargs = plan.decode_request(req)
+    assert args == ()
+    assert kwargs["b"] == "abc"
+    np.testing.assert_array_equal(kwargs["a"], np.array([1], dtype=np.int32))
+
+    res = {
+        "outputs": [
+            {"name": "output0", "datatype": "INT32", "shape": [1], "data": [1]},
+            {"name": "output1", "datatype": "BYTES", "shape": [3], "data": [97, 98, 99]},
+        ]
+    }
+    out = plan.decode_response(res)
+    assert out["output1"] == "abc"
+    np.testing.assert_array_equal(out["output0"], np.array([1], dtype=np.int32))
+
+
+@pytest.mark.parametrize(
+    "data, expected_shape",
+    [
+        (["a", "bc", "déf"], [3]),
+        (np.array(["a", "bc", "déf"]), [3]),
+        (np.array([["a", "bc"], ["d", "ef"]], dtype=object), [2, 2]),
+        (np.array([b"a", b"bc"]), [2]),
+    ],
+)
+def test_v2_strings_roundtrip(data, expected_shape):
+    v2 = V2Protocol()
+    request = json.loads(v2.encode_request(data))
+
+    assert len(request["inputs"]) == 1
+    tensor = request["inputs"][0]
+    assert tensor["datatype"] == "BYTES"
+    assert tensor["shape"] == expected_shape
+
+    list_ty = ModelDataArgs(args=[ModelDataArg(ty=List[str])])
+    as_list = v2.from_protocol_request(request, list_ty)
+    expected = np.char.decode(data, "utf-8") if isinstance(data, np.ndarray) and data.dtype.kind == "S" else data
+    assert as_list == np.asarray(expected).reshape(-1).tolist()
+
+    array_ty = ModelDataArgs(args=[ModelDataArg(ty=np.ndarray)])
+    as_array = v2.from_protocol_request(request, array_ty)
+    np.testing.assert_array_equal(as_array, expected)
+
+
+def test_v2_strings_from_binary():
+    elems = [b"a", b"bc"]
+    raw = b"".join(len(elem).to_bytes(4, "little") + elem for elem in elems)
+    header = json.dumps(
+        {"outputs": [{"name": "a", "datatype": "BYTES", "shape": [2], "parameters": {"binary_data_size": len(raw)}}]}
+    ).encode("utf-8")
+
+    res = V2Protocol.decode_binary(header + raw, len(header))
+    modelTyArgs = ModelDataArgs(args=[ModelDataArg(ty=np.ndarray)])
+    out = V2Protocol().from_protocol_response(res, modelTyArgs)
+
+    np.testing.assert_array_equal(out, np.array(["a", "bc"]))
+
+
+@pytest.mark.parametrize("binary_data", [False, True])
+def test_v2_fp16_roundtrip(binary_data):
+    arr = np.array([[1.5, -2.25], [0.0, 65504.0]], dtype=np.float16)
+    v2 = V2Protocol(binary_data=binary_data)
+    modelTyArgs = ModelDataArgs(args=[ModelDataArg(ty=np.ndarray)])
+
+    if binary_data:
+        body, header_length = v2.to_binary_request(arr)
+        request = V2Protocol.decode_binary(body, header_length)
+    else:
+        request = json.loads(v2.encode_request(arr))
+
+    assert request["inputs"][0]["datatype"] == "FP16"
+    res = v2.from_protocol_request(request, modelTyArgs)
+
+    assert res.dtype == np.float16
+    np.testing.assert_array_equal(res, arr)
+
+
+@pytest.mark.parametrize(
+    "wire_precision, arr, expected_datatype",
+    [
+        ({"FP64": "FP32"}, np.array([1.0, 2.5]), "FP32"),
+        ({"FP32": "FP16"}, np.array([1.0, 2.5], dtype=np.float32), "FP16"),
+        # Arrays with other datatypes are left untouched
+        ({"FP64": "FP32"}, np.array([1, 2]), "INT64"),
+    ],
+)
+def test_v2_wire_precision(wire_precision, arr, expected_datatype):
+    v2 = V2Protocol(wire_precision=wire_precision)
+
+    request = v2.to_protocol_request(arr)
+    assert request["inputs"][0]["datatype"] == expected_datatype
+
+    model_details = ModelDetails(
+        name="a",
+        local_folder="",
+        uri="",
+        platform=ModelFramework.Custom,
+        inputs=ModelDataArgs(args=[ModelDataArg(ty=np.ndarray)]),
+        outputs=ModelDataArgs(args=[ModelDataArg(ty=np.ndarray)]),
+    )
+    response = v2.to_protocol_response(model_details, arr)
+    assert response["outputs"][0]["datatype"] == expected_datatype
+
+
+@pytest.mark.parametrize("wire_precision", [{"FP16": "FP32"}, {"FP32": "FP64"}, {"INT64": "INT32"}])
+def test_v2_wire_precision_invalid(wire_precision):
+    with pytest.raises(ValueError):
+        V2Protocol(wire_precision=wire_precision)
+
+
+def test_v2_bf16_bits():
+    arr = np.array([1.0, 3.14159, -2.5e10], dtype=np.float32)
+    bits = float32_to_bfloat16_bits(arr)
+
+    assert bits.dtype == np.uint16
+    np.testing.assert_allclose(bfloat16_bits_to_float32(bits), arr, rtol=1e-2)
+
+
+def test_v2_bf16_roundtrip():
+    ml_dtypes = pytest.importorskip("ml_dtypes")
+
+    arr = np.array([1.5, -3.0, 0.0078125], dtype=ml_dtypes.bfloat16)
+    v2 = V2Protocol()
+    request = json.loads(v2.encode_request(arr))
+    assert request["inputs"][0]["datatype"] == "BF16"
+
+    modelTyArgs = ModelDataArgs(args=[ModelDataArg(ty=np.ndarray)])
+    res = v2.from_protocol_request(request, modelTyArgs)
+
+    assert res.dtype == arr.dtype
+    np.testing.assert_array_equal(res, arr)
+
+
+def test_v2_object_array():
+    v2 = V2Protocol()
+    strings = np.array(["a", b"bc"], dtype=object)
+    assert v2.to_protocol_request(strings)["inputs"][0]["data"] == ["a", "bc"]
+
+    # Objects which aren't strings can't be encoded
+    arr = np.array([1, 2.5, None], dtype=object)
+    with pytest.raises(ValueError):
+        v2.to_protocol_request(arr)
+    with pytest.raises(ValueError):
+        v2.to_binary_request(arr)
@@ -1,7 +1,13 @@
+from typing import List
+
 import numpy as np
+import pytest
 
-from tempo.serve.metadata import ModelFramework
+from tempo.seldon.docker import SeldonDockerRuntime
+from tempo.serve.base import ModelSpec
+from tempo.serve.metadata import ClientOptions, DockerOptions, ModelFramework
 from tempo.serve.model import Model
+from tempo.serve.session import get_session_key
 
 
 def test_default_types():
@@ -10,3 +16,42 @@ def test_default_types():
     assert model.model_spec.model_details.inputs[0] == np.ndarray
     assert len(model.model_spec.model_details.outputs) == 1
     assert model.model_spec.model_details.outputs[0] == np.ndarray
+
+
+@pytest.fixture
+def endpoint_calls(monkeypatch) -> List[ModelSpec]:
+    calls: List[ModelSpec] = []
+
+    def _get_endpoint_spec(self, model_spec: ModelSpec) -> str:
+        calls.append(model_spec)
+        return f"http://localhost:9000/v2/models/{model_spec.model_details.name}/infer"
+
+    monkeypatch.setattr(SeldonDockerRuntime, "get_endpoint_spec", _get_endpoint_spec)
+    return calls
+
+
+def test_call_plan_cached(endpoint_calls):
+    model = Model("mymodel", local_folder="", uri="", platform=ModelFramework.SKLearn)
+    model.set_runtime_options_override(DockerOptions())
+    model_spec = model._get_model_spec(None)
+
+    call_plan = model._get_call_plan(model_spec)
+    assert call_plan.endpoint == "http://localhost:9000/v2/models/mymodel/infer"
+    assert model._get_call_plan(model._get_model_spec(None)) is call_plan
+    assert len(endpoint_calls) == 1
+    assert call_plan.pool_key == get_session_key(call_plan.endpoint, model_spec.runtime_options.client_options)
+
+    model.invalidate_call_plans()
+    assert model._get_call_plan(model._get_model_spec(None)) is not call_plan
+    assert len(endpoint_calls) == 2
+
+
+def test_call_plan_ttl(endpoint_calls):
+    model = Model("mymodel", local_folder="", uri="", platform=ModelFramework.SKLearn)
+    model.set_runtime_options_override(DockerOptions(client_options=ClientOptions(call_plan_ttl=0)))
+    model_spec = model._get_model_spec(None)
+
+    call_plan = model._get_call_plan(model_spec)
+    assert call_plan.expired
+    assert model._get_call_plan(model_spec) is not call_plan
+    assert len(endpoint_calls) == 2
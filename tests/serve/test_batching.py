@@ -0,0 +1,159 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import numpy as np
+import pytest
+
+from tempo.serve.batching import AsyncBatcher, Batcher
+from tempo.serve.metadata import BatchingOptions, ClientOptions, DockerOptions, ModelFramework
+from tempo.serve.model import Model
+
+
+class _Recorder:
+    def __init__(self):
+        self.batches: List[int] = []
+
+    def __call__(self, payload: np.ndarray) -> np.ndarray:
+        self.batches.append(payload.shape[0])
+        return payload * 2
+
+    async def predict(self, payload: np.ndarray) -> np.ndarray:
+        return self(payload)
+
+
+def test_batcher():
+    recorder = _Recorder()
+    batcher = Batcher(recorder, BatchingOptions(max_batch_size=4, max_wait_ms=1000))
+
+    payloads = [np.full((1, 3), idx) for idx in range(4)]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(batcher.submit, payloads))
+
+    assert recorder.batches == [4]
+    for payload, res in zip(payloads, results):
+        np.testing.assert_array_equal(res, payload * 2)
+
+
+def test_batcher_timeout():
+    recorder = _Recorder()
+    batcher = Batcher(recorder, BatchingOptions(max_batch_size=4, max_wait_ms=1))
+
+    res = batcher.submit(np.ones((2, 3)))
+
+    assert recorder.batches == [2]
+    np.testing.assert_array_equal(res, np.full((2, 3), 2))
+
+
+@pytest.mark.parametrize(
+    "args, kwargs",
+    [
+        ((np.ones((8, 3)),), {}),
+        ((np.array(["a", "b"]),), {}),
+        ((np.ones((1, 3)), np.ones((2, 3))), {}),
+        (("foo",), {}),
+    ],
+)
+def test_batcher_skip(args, kwargs):
+    calls = []
+    batcher = Batcher(lambda *args, **kwargs: calls.append(args), BatchingOptions(max_batch_size=4, max_wait_ms=1000))
+
+    batcher.submit(*args, **kwargs)
+
+    assert calls == [args]
+
+
+def test_batcher_error():
+    def _fail(payload: np.ndarray) -> np.ndarray:
+        raise RuntimeError("foo")
+
+    batcher = Batcher(_fail, BatchingOptions(max_batch_size=2, max_wait_ms=1000))
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(batcher.submit, np.ones((1, 3))) for _ in range(2)]
+
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result()
+
+
+def test_batcher_max_batch_size():
+    recorder = _Recorder()
+    batcher = Batcher(recorder, BatchingOptions(max_batch_size=8, max_wait_ms=100))
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        list(executor.map(batcher.submit, [np.ones((5, 3))] * 2))
+
+    # Both calls don't fit into a single batch
+    assert sorted(recorder.batches) == [5, 5]
+
+
+class _Interrupt(BaseException):
+    pass
+
+
+def test_batcher_interrupted():
+    def _interrupt(payload: np.ndarray) -> np.ndarray:
+        raise _Interrupt()
+
+    batcher = Batcher(_interrupt, BatchingOptions(max_batch_size=2, max_wait_ms=1000))
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(batcher.submit, np.ones((1, 3))) for _ in range(2)]
+
+        for future in futures:
+            with pytest.raises(_Interrupt):
+                future.result(timeout=5)
+
+
+async def test_async_batcher():
+    recorder = _Recorder()
+    batcher = AsyncBatcher(recorder.predict, BatchingOptions(max_batch_size=8, max_wait_ms=10))
+
+    payloads = [np.full((2, 3), idx) for idx in range(3)]
+    results = await asyncio.gather(*[batcher.submit(payload) for payload in payloads])
+
+    assert recorder.batches == [6]
+    for payload, res in zip(payloads, results):
+        np.testing.assert_array_equal(res, payload * 2)
+
+
+def test_model_batching(monkeypatch):
+    recorder = _Recorder()
+    monkeypatch.setattr(Model, "remote_with_spec", lambda self, model_spec, payload: recorder(payload))
+
+    batching = BatchingOptions(max_batch_size=3, max_wait_ms=1000)
+    model = Model(
+        "mymodel",
+        local_folder="",
+        uri="",
+        platform=ModelFramework.SKLearn,
+        runtime_options=DockerOptions(client_options=ClientOptions(batching=batching)),
+    )
+
+    payloads = [np.full((1, 2), idx) for idx in range(3)]
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        results = list(executor.map(model.predict, payloads))
+
+    assert recorder.batches == [3]
+    for payload, res in zip(payloads, results):
+        np.testing.assert_array_equal(res, payload * 2)
+
+
+async def test_async_batcher_cancelled():
+    recorder = _Recorder()
+    batcher = AsyncBatcher(recorder.predict, BatchingOptions(max_batch_size=8, max_wait_ms=50))
+
+    leader = asyncio.create_task(batcher.submit(np.ones((1, 3))))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(batcher.submit(np.ones((1, 3))))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    # Cancelling the call which opened the batch doesn't affect the rest
+    res = await asyncio.wait_for(follower, timeout=5)
+    np.testing.assert_array_equal(res, np.full((1, 3), 2))
+    assert leader.cancelled()
+
+    assert recorder.batches == [2]
+    assert batcher._batches == {}
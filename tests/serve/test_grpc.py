@@ -0,0 +1,178 @@
+from concurrent import futures
+from typing import Any
+
+import grpc
+import numpy as np
+import pytest
+from mlserver.grpc import dataplane_pb2 as pb
+from mlserver.grpc.dataplane_pb2_grpc import GRPCInferenceServiceServicer, add_GRPCInferenceServiceServicer_to_server
+
+from tempo.aio.model import Model as AsyncModel
+from tempo.protocols.v2 import V2Protocol
+from tempo.seldon.docker import SeldonDockerRuntime
+from tempo.serve.grpc import SupportsRawContents, decode_infer_response, encode_infer_request, get_channel_key
+from tempo.serve.metadata import ClientOptions, ClientTransport, DockerOptions, ModelFramework
+from tempo.serve.model import Model
+
+RAW_CONTENTS = [False, pytest.param(True, marks=pytest.mark.skipif(not SupportsRawContents, reason="no raw contents"))]
+
+
+class _EchoServicer(GRPCInferenceServiceServicer):
+    def __init__(self):
+        self.requests = 0
+        self.metadata: Any = None
+
+    def ModelInfer(self, request, context):
+        self.requests += 1
+        self.metadata = dict(context.invocation_metadata())
+
+        response = pb.ModelInferResponse(model_name=request.model_name)
+        for infer_input in request.inputs:
+            response.outputs.add(
+                name=infer_input.name,
+                datatype=infer_input.datatype,
+                shape=infer_input.shape,
+                parameters=infer_input.parameters,
+                contents=infer_input.contents,
+            )
+
+        if SupportsRawContents:
+            response.raw_output_contents.extend(request.raw_input_contents)
+
+        return response
+
+
+@pytest.fixture
+def servicer():
+    servicer = _EchoServicer()
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+    add_GRPCInferenceServiceServicer_to_server(servicer, server)
+    port = server.add_insecure_port("127.0.0.1:0")
+    servicer.target = f"127.0.0.1:{port}"  # type: ignore
+    server.start()
+
+    yield servicer
+
+    server.stop(None)
+
+
+def _echo(request: pb.ModelInferRequest) -> pb.ModelInferResponse:
+    context = type("_Context", (), {"invocation_metadata": lambda self: []})()
+    return _EchoServicer().ModelInfer(request, context)
+
+
+@pytest.mark.parametrize("raw_contents", RAW_CONTENTS)
+@pytest.mark.parametrize(
+    "payload",
+    [
+        np.random.randn(2, 3),
+        np.arange(6, dtype=np.int32).reshape(2, 3),
+        np.arange(6, dtype=np.uint8),
+        np.array([True, False]),
+        np.array(["a", "bc"]),
+    ],
+)
+def test_grpc_roundtrip(raw_contents, payload):
+    protocol = V2Protocol()
+    request = protocol.to_raw_request(payload)
+    infer_request = encode_infer_request(request, "foo", raw_contents=raw_contents)
+
+    if raw_contents:
+        assert len(infer_request.raw_input_contents) == 1
+    assert infer_request.parameters["content_type"].string_param == "np"
+
+    response = decode_infer_response(_echo(infer_request))
+    tensor = response["outputs"][0]
+    res = V2Protocol.decode_tensors([tensor], {}, [np.ndarray])["input-0"]
+
+    np.testing.assert_array_equal(res, payload)
+
+
+@pytest.mark.parametrize("raw_contents", RAW_CONTENTS)
+@pytest.mark.parametrize(
+    "payload, ty", [("abc", str), ({"a": [1, 2]}, dict), (["a", "b"], list), ((1, "a"), tuple), ({1: 2}, dict)]
+)
+def test_grpc_roundtrip_bytes(raw_contents, payload, ty):
+    protocol = V2Protocol()
+    request = protocol.to_raw_request(payload)
+    infer_request = encode_infer_request(request, "foo", raw_contents=raw_contents)
+
+    response = decode_infer_response(_echo(infer_request))
+    res = V2Protocol.decode_tensors(response["outputs"], {}, [ty])["input-0"]
+
+    assert res == payload
+
+
+@pytest.mark.parametrize("raw_contents", RAW_CONTENTS)
+def test_grpc_single_string(raw_contents):
+    # Strings sent without a content type (e.g. by a non-Tempo server)
+    tensor = {"name": "a", "datatype": "BYTES", "shape": [1], "data": ["abc"]}
+    infer_request = encode_infer_request({"inputs": [tensor]}, "foo", raw_contents=raw_contents)
+
+    response = decode_infer_response(_echo(infer_request))
+    res = V2Protocol.decode_tensors(response["outputs"], {}, [np.ndarray])["a"]
+
+    np.testing.assert_array_equal(res, np.array(["abc"]))
+
+
+def test_grpc_half_precision_requires_raw():
+    request = V2Protocol().to_raw_request(np.ones(3, dtype=np.float16))
+
+    with pytest.raises(ValueError):
+        encode_infer_request(request, "foo", raw_contents=False)
+
+
+def test_remote_grpc(servicer, monkeypatch):
+    monkeypatch.setattr(SeldonDockerRuntime, "get_grpc_endpoint_spec", lambda self, model_spec: servicer.target)
+    monkeypatch.setattr(SeldonDockerRuntime, "get_grpc_headers", lambda self, model_spec: {"Seldon": "mymodel"})
+
+    model = Model(
+        "mymodel",
+        local_folder="",
+        uri="",
+        platform=ModelFramework.SKLearn,
+        protocol=V2Protocol(),
+        runtime_options=DockerOptions(client_options=ClientOptions(transport=ClientTransport.GRPC)),
+    )
+
+    payload = np.random.randn(2, 3)
+    for _ in range(3):
+        np.testing.assert_array_equal(model.predict(payload), payload)
+
+    assert servicer.requests == 3
+    assert servicer.metadata["seldon"] == "mymodel"
+
+    # The channel's key gets computed once, along with the call plan
+    model_spec = model._get_model_spec(None)
+    call_plan = model._get_call_plan(model_spec)
+    client_options = model_spec.runtime_options.client_options
+    assert call_plan.pool_key == get_channel_key(servicer.target, False, client_options)
+
+
+async def test_remote_grpc_async(servicer, monkeypatch):
+    monkeypatch.setattr(SeldonDockerRuntime, "get_grpc_endpoint_spec", lambda self, model_spec: servicer.target)
+    monkeypatch.setattr(SeldonDockerRuntime, "get_grpc_headers", lambda self, model_spec: {})
+
+    model = AsyncModel(
+        "mymodel",
+        local_folder="",
+        uri="",
+        platform=ModelFramework.SKLearn,
+        protocol=V2Protocol(),
+        runtime_options=DockerOptions(client_options=ClientOptions(transport=ClientTransport.GRPC)),
+    )
+
+    payload = np.random.randn(2, 3)
+    for _ in range(2):
+        np.testing.assert_array_equal(await model.predict(payload), payload)
+
+    # Changing the client options opens a separate channel
+    model.model_spec.runtime_options.client_options.read_timeout = 5
+    model.invalidate_call_plans()
+    np.testing.assert_array_equal(await model.predict(payload), payload)
+    assert len(model._grpc_stubs) == 2
+    channels = [channel for channel, _ in model._grpc_stubs.values()]
+
+    await model.close()
+    assert model._grpc_stubs == {}
+    assert all(channel.get_state() == grpc.ChannelConnectivity.SHUTDOWN for channel in channels)
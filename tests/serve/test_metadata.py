@@ -1,6 +1,9 @@
+from typing import Dict, List, Optional
+
+import numpy as np
 import pytest
 
-from tempo.serve.metadata import KubernetesRuntimeOptions
+from tempo.serve.metadata import KubernetesRuntimeOptions, ModelDataArg
 
 
 @pytest.mark.parametrize(
@@ -13,3 +16,14 @@ from tempo.serve.metadata import KubernetesRuntimeOptions
 def test_runtime_options(runtime, replicas):
     r = KubernetesRuntimeOptions(**runtime)
     assert r.replicas == replicas
+
+
+def test_model_data_arg_generic():
+    arg = ModelDataArg(ty=List[str])
+    assert arg.ty is list
+
+
+@pytest.mark.parametrize("ty", [Dict, Optional[np.ndarray]])
+def test_model_data_arg_non_list(ty):
+    # Only list generics are resolved to their origin
+    assert ModelDataArg.ensure_type(ty) is ty
@@ -1,5 +1,5 @@
 import os
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 import numpy as np
 import pytest
@@ -266,3 +266,56 @@ def test_pytorch_model_save():
 
     remote_model.predict(data)
     remote_model.undeploy()
+
+
+def test_custom_model_strings():
+    @model(
+        name="tokenizer",
+        platform=ModelFramework.Custom,
+    )
+    def tokenizer(sentences: List[str]) -> List[str]:
+        return [sentence.upper() for sentence in sentences]
+
+    v2_input = {
+        "inputs": [
+            {
+                "name": "sentences",
+                "datatype": "BYTES",
+                "shape": [2],
+                "data": ["hello", "world"],
+                "parameters": {"content_type": "str"},
+            }
+        ]
+    }
+    response = tokenizer.request(v2_input)
+
+    assert response["outputs"][0]["shape"] == [2]
+    assert response["outputs"][0]["data"] == ["HELLO", "WORLD"]
+
+    output = tokenizer.model_spec.protocol.from_protocol_response(response, tokenizer.details.outputs)
+    assert output == ["HELLO", "WORLD"]
+
+
+def test_custom_model_optional_output():
+    @model(name="optional-model", platform=ModelFramework.Custom)
+    def optional_model(payload: np.ndarray) -> Optional[np.ndarray]:
+        return payload * 2
+
+    v2_input = {"inputs": [{"name": "payload", "datatype": "FP64", "shape": [2], "data": [1, 2]}]}
+    response = optional_model.request(v2_input)
+
+    output = optional_model.model_spec.protocol.from_protocol_response(response, optional_model.details.outputs)
+    np.testing.assert_array_equal(output, [2, 4])
+
+
+def test_custom_model_list_output():
+    @model(name="list-model", platform=ModelFramework.Custom)
+    def list_model(payload: np.ndarray) -> list:
+        return [payload, payload * 2]
+
+    v2_input = {"inputs": [{"name": "payload", "datatype": "FP64", "shape": [2], "data": [1, 2]}]}
+    response = list_model.request(v2_input)
+
+    # Each array is a separate output
+    assert len(response["outputs"]) == 2
+    assert response["outputs"][1]["data"] == [2, 4]
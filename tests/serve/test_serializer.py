@@ -0,0 +1,72 @@
+import json
+
+import numpy as np
+import pytest
+
+from tempo.protocols.seldon import SeldonProtocol
+from tempo.protocols.tensorflow import TensorflowProtocol
+from tempo.protocols.v2 import V2Protocol
+from tempo.serve.metadata import ModelDataArg, ModelDataArgs
+from tempo.serve.serializer import JSONSerializer, ORJSONSerializer
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        np.random.randn(2, 3),
+        np.arange(6, dtype=np.int32).reshape(2, 3),
+        np.arange(6, dtype=np.float32).reshape(2, 3).T,
+        np.array([True, False]),
+    ],
+)
+@pytest.mark.parametrize("protocol_class", [V2Protocol, TensorflowProtocol, SeldonProtocol])
+def test_encode_request(protocol_class, payload):
+    orjson_protocol = protocol_class(serializer=ORJSONSerializer())
+    json_protocol = protocol_class(serializer=JSONSerializer())
+
+    expected = json_protocol.to_protocol_request(payload)
+    assert json.loads(orjson_protocol.encode_request(payload)) == expected
+    assert json.loads(json_protocol.encode_request(payload)) == expected
+
+
+@pytest.mark.parametrize("payload", [np.array([1, 2], dtype=">i4"), np.array([[1.5, 2.5]], dtype=">f8")])
+@pytest.mark.parametrize("protocol_class", [TensorflowProtocol, SeldonProtocol])
+def test_encode_request_byte_order(protocol_class, payload):
+    protocol = protocol_class(serializer=ORJSONSerializer())
+
+    assert json.loads(protocol.encode_request(payload)) == protocol.to_protocol_request(payload)
+
+
+@pytest.mark.parametrize("serializer", [JSONSerializer(), ORJSONSerializer()])
+def test_decode_response(serializer):
+    protocol = V2Protocol(serializer=serializer)
+    body = b'{"outputs": [{"name": "a", "datatype": "FP32", "shape": [2, 2], "data": [1, 2, 3, 4]}]}'
+
+    res = protocol.decode_response(body, ModelDataArgs(args=[ModelDataArg(ty=np.ndarray)]))
+
+    assert res.dtype == np.float32
+    np.testing.assert_array_equal(res, [[1, 2], [3, 4]])
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"data": {"ndarray": [1, 2]}, "meta": {1: "foo", 2.5: "bar"}},
+        {"inputs": [{"data": np.array([1, 2], dtype=">i8")}]},
+        {"data": [[np.array([3], dtype=">u2")]]},
+    ],
+)
+def test_orjson_dumps(payload):
+    expected = JSONSerializer().dumps(_to_lists(payload))
+
+    assert json.loads(ORJSONSerializer().dumps(payload)) == json.loads(expected)
+
+
+def _to_lists(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, dict):
+        return {key: _to_lists(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [_to_lists(elem) for elem in obj]
+    return obj
@@ -0,0 +1,107 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from tempo.serve.metadata import ClientOptions
+from tempo.serve.session import SessionPool, get_session_key, get_timeout
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1  # type: ignore
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.requests += 1  # type: ignore
+        status = 503 if self.server.requests <= self.server.failures else 200  # type: ignore
+
+        body = b"{}"
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.connections = 0  # type: ignore
+    server.requests = 0  # type: ignore
+    server.failures = 0  # type: ignore
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+def _endpoint(server) -> str:
+    host, port = server.server_address
+    return f"http://{host}:{port}/v2/models/foo/infer"
+
+
+@pytest.mark.parametrize("keep_alive, expected_connections", [(True, 1), (False, 3)])
+def test_session_keep_alive(server, keep_alive, expected_connections):
+    pool = SessionPool()
+    client_options = ClientOptions(keep_alive=keep_alive)
+
+    for _ in range(3):
+        session = pool.get(_endpoint(server), client_options)
+        response = session.post(_endpoint(server), data=b"{}")
+        assert response.status_code == 200
+
+    assert server.connections == expected_connections
+    pool.close()
+
+
+def test_session_per_endpoint():
+    pool = SessionPool()
+    client_options = ClientOptions()
+
+    session = pool.get("http://foo:9000/v2/models/a/infer", client_options)
+    assert pool.get("http://foo:9000/v2/models/b/infer", client_options) is session
+    assert pool.get("http://bar:9000/v2/models/a/infer", client_options) is not session
+    assert pool.get("http://foo:9000/v2/models/a/infer", ClientOptions(retries=2)) is not session
+
+
+def test_session_key():
+    pool = SessionPool()
+    client_options = ClientOptions()
+    endpoint = "http://foo:9000/v2/models/a/infer"
+
+    # Callers can compute the key once, instead of on every request
+    session = pool.get(endpoint, client_options, get_session_key(endpoint, client_options))
+    assert pool.get(endpoint, client_options) is session
+
+
+def test_session_retries(server):
+    server.failures = 2
+    pool = SessionPool()
+
+    session = pool.get(_endpoint(server), ClientOptions(retries=2))
+    response = session.post(_endpoint(server), data=b"{}")
+
+    assert response.status_code == 200
+    assert server.requests == 3
+    pool.close()
+
+
+@pytest.mark.parametrize(
+    "client_options, expected",
+    [
+        (ClientOptions(), None),
+        (ClientOptions(connect_timeout=1.0), (1.0, None)),
+        (ClientOptions(connect_timeout=1.0, read_timeout=5.0), (1.0, 5.0)),
+    ],
+)
+def test_get_timeout(client_options, expected):
+    assert get_timeout(client_options) == expected
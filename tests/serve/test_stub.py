@@ -1,10 +1,13 @@
 import json
 
 import numpy as np
+import pytest
 
+from tempo.protocols.seldon import SeldonProtocol
 from tempo.protocols.v2 import V2Protocol
 from tempo.serve.base import ModelSpec
 from tempo.serve.metadata import KFServingOptions, ModelDataArg, ModelDataArgs, ModelDetails, ModelFramework
+from tempo.serve.serializer import JSONSerializer
 
 
 def test_model_data_arg():
@@ -47,3 +50,43 @@ def test_model_spec():
     ms2 = ModelSpec(**j)
     assert isinstance(ms2.protocol, V2Protocol)
     assert ms2.model_details.inputs.args[0].ty == str
+
+
+def _model_details() -> ModelDetails:
+    return ModelDetails(
+        name="test",
+        local_folder="",
+        uri="",
+        platform=ModelFramework.XGBoost,
+        inputs=ModelDataArgs(args=[]),
+        outputs=ModelDataArgs(args=[]),
+    )
+
+
+@pytest.mark.parametrize(
+    "protocol",
+    [
+        V2Protocol(binary_data=True, wire_precision={"FP64": "FP32"}, serializer=JSONSerializer()),
+        SeldonProtocol(serializer=JSONSerializer()),
+    ],
+)
+def test_model_spec_protocol_options(protocol):
+    ms = ModelSpec(
+        model_details=_model_details(),
+        protocol=protocol,
+        runtime_options=KFServingOptions().local_options,
+    )
+
+    ms2 = ModelSpec.parse_raw(ms.json())
+    assert ms2.protocol == protocol
+
+
+def test_model_spec_protocol_name():
+    # Specs serialised by older versions only hold the protocol's name
+    ms = ModelSpec(
+        model_details=_model_details(),
+        protocol="tempo.protocols.v2.V2Protocol",
+        runtime_options=KFServingOptions().local_options,
+    )
+
+    assert ms.protocol == V2Protocol()
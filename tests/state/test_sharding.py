@@ -0,0 +1,155 @@
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from tempo.serve.metadata import StateOptions, StateTypes
+from tempo.state.sharding import HashRing, ShardedRedis, get_hash_tag
+from tempo.state.state import RedisState
+
+
+class _FakeNode:
+    """
+    Stand-in for a Redis instance, supporting the commands used by the
+    state backends.
+    """
+
+    def __init__(self):
+        self.values: Dict[str, Any] = {}
+        self.requests = 0
+
+    def set(self, key: str, value: Any, px: Optional[int] = None) -> bool:
+        self.requests += 1
+        self.values[key] = value
+        return True
+
+    def get(self, key: str) -> Any:
+        self.requests += 1
+        return self.values.get(key)
+
+    def incrby(self, key: str, amount: int) -> int:
+        self.requests += 1
+        self.values[key] = int(self.values.get(key, 0)) + amount
+        return self.values[key]
+
+    def hset(self, name: str, key: str, value: Any) -> int:
+        self.requests += 1
+        fields = self.values.setdefault(name, {})
+        is_new = key not in fields
+        fields[key] = value
+        return int(is_new)
+
+    def hgetall(self, name: str) -> Dict:
+        self.requests += 1
+        return dict(self.values.get(name, {}))
+
+    def mset(self, mapping: Dict[str, Any]) -> bool:
+        self.requests += 1
+        self.values.update(mapping)
+        return True
+
+    def mget(self, keys: List[str]) -> List[Any]:
+        self.requests += 1
+        return [self.values.get(key) for key in keys]
+
+    def pipeline(self, transaction: bool = True) -> "_FakePipeline":
+        return _FakePipeline(self)
+
+
+class _FakePipeline:
+    def __init__(self, node: _FakeNode):
+        self._node = node
+        self._calls: List[Any] = []
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def __getattr__(self, name: str) -> Any:
+        def _queue(*args, **kwargs):
+            self._calls.append((name, args, kwargs))
+            return self
+
+        return _queue
+
+    def reset(self):
+        self._calls = []
+
+    def execute(self) -> List[Any]:
+        requests = self._node.requests
+        results = [getattr(self._node, name)(*args, **kwargs) for name, args, kwargs in self._calls]
+        self._node.requests = requests + 1
+        return results
+
+
+@pytest.fixture
+def nodes() -> List[_FakeNode]:
+    return [_FakeNode() for _ in range(4)]
+
+
+@pytest.fixture
+def sharded_state(nodes) -> RedisState:
+    names = [f"redis-{idx}:6379" for idx in range(len(nodes))]
+    state = RedisState(StateOptions(state_type=StateTypes.REDIS, key_prefix="foo-", nodes=names))
+    state._internal_state = ShardedRedis(names, clients=nodes)  # type: ignore
+    return state
+
+
+@pytest.mark.parametrize(
+    "key, expected",
+    [("foo", "foo"), ("{user-1}.arms", "user-1"), ("a{b}{c}", "b"), ("a{}b", "a{}b"), ("a{b", "a{b")],
+)
+def test_get_hash_tag(key, expected):
+    assert get_hash_tag(key) == expected
+
+
+def test_hash_ring_distribution():
+    names = [f"redis-{idx}:6379" for idx in range(4)]
+    keys = [f"key-{idx}" for idx in range(10000)]
+
+    ring = HashRing(names)
+    nodes = [ring.get_node(key) for key in keys]
+    counts = Counter(nodes)
+    assert len(counts) == 4
+    assert all(abs(count - 2500) < 750 for count in counts.values())
+
+    # Adding a node should only remap the keys which move into it
+    extended_ring = HashRing(names + ["redis-4:6379"])
+    moved = [key for key, node in zip(keys, nodes) if extended_ring.get_node(key) != node]
+    assert all(extended_ring.get_node(key) == 4 for key in moved)
+    assert len(moved) < 3000
+
+
+def test_sharded_state(sharded_state, nodes):
+    for idx in range(20):
+        sharded_state.set(f"key-{idx}", str(idx))
+
+    assert all(node.values for node in nodes)
+    assert sharded_state.get("key-3") == "3"
+    assert sharded_state.incr("{user}.count") == 1
+    assert sharded_state.hset("{user}.arms", "a", 1) == 1
+
+    # Both keys share the same hash tag, and thus node
+    assert len([node for node in nodes if "foo-{user}.count" in node.values]) == 1
+    assert [node for node in nodes if "foo-{user}.count" in node.values] == [
+        node for node in nodes if "foo-{user}.arms" in node.values
+    ]
+
+
+def test_sharded_state_bulk(sharded_state, nodes):
+    mapping = {f"key-{idx}": str(idx) for idx in range(20)}
+
+    requests = sum(node.requests for node in nodes)
+    assert sharded_state.mset(mapping)
+    assert sharded_state.mget(list(mapping) + ["missing"]) == list(mapping.values()) + [None]
+    assert sum(node.requests for node in nodes) - requests == 2 * len(nodes)
+
+
+def test_sharded_state_pipeline(sharded_state, nodes):
+    requests = sum(node.requests for node in nodes)
+    with sharded_state.pipeline() as pipe:
+        pipe.set("a", "1").mset({f"key-{idx}": str(idx) for idx in range(10)}).incr("a").hset("h", "k", "v")
+        pipe.mget(["a", "key-5", "missing"]).hgetall("h")
+        res = pipe.execute()
+
+    assert res == [True, True, 2, 1, [2, "5", None], {"k": "v"}]
+    assert sum(node.requests for node in nodes) - requests <= len(nodes)
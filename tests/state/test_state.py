@@ -0,0 +1,342 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import pytest
+import redis
+import redis.asyncio
+
+from tempo.serve.metadata import EvictionPolicies, StateOptions, StateTypes
+from tempo.state.state import AsyncRedisState, BaseState, CachedRedisState, LocalState, RedisState
+
+
+class _FakeAsyncRedis:
+    def __init__(self):
+        self.values: Dict[str, Any] = {}
+
+    async def set(self, key: str, value: Any, px: Optional[int] = None) -> bool:
+        self.values[key] = value
+        return True
+
+    async def get(self, key: str) -> Any:
+        return self.values.get(key)
+
+    async def exists(self, key: str) -> int:
+        return int(key in self.values)
+
+
+@pytest.mark.parametrize(
+    "state_type, expected",
+    [
+        (StateTypes.LOCAL, LocalState),
+        (StateTypes.REDIS, RedisState),
+        (StateTypes.CACHED_REDIS, CachedRedisState),
+        (StateTypes.AIOREDIS, AsyncRedisState),
+        ("AIOREDIS", AsyncRedisState),
+    ],
+)
+def test_from_conf(state_type, expected):
+    state = BaseState.from_conf(StateOptions(state_type=state_type))
+
+    assert isinstance(state, expected)
+
+
+async def test_async_redis_state():
+    state = AsyncRedisState(StateOptions(state_type=StateTypes.AIOREDIS, key_prefix="foo-"))
+    fake_redis = _FakeAsyncRedis()
+    state._internal_state = fake_redis  # type: ignore
+
+    assert await state.set("bar", "1")
+    assert await state.get("bar") == "1"
+    assert await state.exists("bar")
+    assert not await state.exists("baz")
+    assert fake_redis.values == {"foo-bar": "1"}
+
+
+async def test_async_redis_state_pool():
+    state = AsyncRedisState(
+        StateOptions(state_type=StateTypes.AIOREDIS, host="localhost", port="6379", max_connections=4)
+    )
+
+    assert state.internal_state.connection_pool.max_connections == 4
+
+    await state.close()
+    assert state._internal_state is None
+
+
+def test_local_state_bulk():
+    state = LocalState(StateOptions(key_prefix="foo-"))
+
+    assert state.mset({"a": "1", "b": "2"})
+    assert state.mget(["a", "b", "c"]) == ["1", "2", None]
+    assert state.incr("a") == 2
+    assert state.incrby("c", 5) == 5
+    assert state.hset("arms", "x", 1) == 1
+    assert state.hset("arms", "x", 2) == 0
+    assert state.hget("arms", "x") == 2
+    assert state.hgetall("arms") == {"x": 2}
+    assert state.hgetall("missing") == {}
+    assert "foo-arms" in state.internal_state
+
+
+def test_local_state_pipeline():
+    state = LocalState()
+
+    with state.pipeline() as pipe:
+        pipe.set("a", "1").incr("a").incrby("b", 3).hset("h", "k", "v").hgetall("h").mget(["a", "b"])
+        assert len(pipe) == 6
+
+        res = pipe.execute()
+
+    assert res == [True, 2, 3, 1, {"k": "v"}, [2, 3]]
+    assert len(pipe) == 0
+
+
+def test_redis_state_pipeline(monkeypatch):
+    sent = []
+
+    def _execute(self, raise_on_error=True):
+        sent.append([args for args, _ in self.command_stack])
+        return [True] * len(self.command_stack)
+
+    monkeypatch.setattr(redis.client.Pipeline, "execute", _execute)
+
+    state = RedisState(StateOptions(state_type=StateTypes.REDIS, key_prefix="foo-", host="localhost", port="6379"))
+    with state.pipeline() as pipe:
+        res = pipe.incr("a").hget("arms", "x").mget(["a", "b"]).execute()
+
+    assert res == [True] * 3
+    assert sent == [[("INCRBY", "foo-a", 1), ("HGET", "foo-arms", "x"), ("MGET", "foo-a", "foo-b")]]
+
+
+async def test_async_redis_state_pipeline(monkeypatch):
+    sent = []
+
+    async def _execute(self, raise_on_error=True):
+        sent.append([args for args, _ in self.command_stack])
+        return [True] * len(self.command_stack)
+
+    monkeypatch.setattr(redis.asyncio.client.Pipeline, "execute", _execute)
+
+    state = AsyncRedisState(
+        StateOptions(state_type=StateTypes.AIOREDIS, key_prefix="foo-", host="localhost", port="6379")
+    )
+    res = await state.pipeline().incr("a").hset("arms", "x", 1).execute()
+
+    assert res == [True] * 2
+    assert sent == [[("INCRBY", "foo-a", 1), ("HSET", "foo-arms", "x", 1)]]
+
+
+def test_local_state_ttl(monkeypatch):
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    state = LocalState(StateOptions(default_ttl=10))
+
+    state.set("a", "1")
+    state.set("b", "2", ttl=30)
+    state.incr("c")
+    assert state.mget(["a", "b", "c"]) == ["1", "2", 1]
+
+    now += 20
+    assert not state.exists("a")
+    assert state.get("b") == "2"
+    assert state.get("c") is None
+
+    state.set("d", "4")
+    assert state.stats["entries"] == 2
+    assert state.stats["expirations"] == 2
+
+
+def test_local_state_ttl_heap():
+    state = LocalState(StateOptions(max_entries=10, default_ttl=3600))
+
+    for idx in range(10000):
+        state.set("a", str(idx))
+
+    # Stale expiries get dropped well before their deadline
+    assert state.get("a") == "9999"
+    assert len(state._expiries_heap) <= 2 * len(state._expiries) + 64
+
+
+@pytest.mark.parametrize(
+    "eviction_policy, expected",
+    [(EvictionPolicies.LRU, ["a", "c", "d"]), (EvictionPolicies.LFU, ["b", "a", "d"])],
+)
+def test_local_state_max_entries(eviction_policy, expected):
+    state = LocalState(StateOptions(max_entries=3, eviction_policy=eviction_policy))
+
+    state.mset({"a": "1", "b": "2", "c": "3"})
+    state.get("b")
+    state.get("b")
+    state.get("a")
+    state.get("a")
+    state.get("c")
+    state.set("d", "4")
+
+    assert list(state.internal_state) == expected
+    assert state.stats["evictions"] == 1
+    assert state.stats["hits"] == 5
+
+
+def test_local_state_max_bytes():
+    state = LocalState(StateOptions(max_bytes=1000))
+
+    for idx in range(10):
+        state.set(str(idx), "x" * 200)
+
+    stats = state.stats
+    assert 0 < stats["bytes"] <= 1000
+    assert stats["entries"] < 10
+    assert state.get("9") == "x" * 200
+    assert state.get("0") is None
+    assert state.stats["misses"] == 1
+
+
+def test_local_state_hash_size():
+    state = LocalState()
+
+    state.hset("h", "a", "x" * 100)
+    size = state.stats["bytes"]
+    state.hset("h", "a", "y" * 100)
+    assert state.stats["bytes"] == size
+
+    state.hset("h", "b", "z")
+    assert state.stats["bytes"] > size
+
+
+def test_local_state_threads():
+    state = LocalState(StateOptions(max_entries=50))
+
+    def _incr(idx: int):
+        for _ in range(100):
+            state.incr("counter")
+            state.set(f"key-{idx}-{_}", "x")
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(_incr, range(8)))
+
+    assert state.get("counter") is not None
+    assert len(state.internal_state) <= 50
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.values: Dict[str, Any] = {}
+        self.reads = 0
+
+    def set(self, key: str, value: Any, px: Optional[int] = None) -> bool:
+        self.values[key] = value
+        return True
+
+    def get(self, key: str) -> Any:
+        self.reads += 1
+        return self.values.get(key)
+
+    def mget(self, keys: List[str]) -> List[Any]:
+        self.reads += 1
+        return [self.values.get(key) for key in keys]
+
+    def hgetall(self, name: str) -> Dict:
+        self.reads += 1
+        return dict(self.values.get(name, {}))
+
+
+class _FakePubSub:
+    def __init__(self, state: CachedRedisState, messages: List[Any]):
+        self._state = state
+        self._messages = messages
+
+    def get_message(self, timeout: float) -> Any:
+        if not self._messages:
+            self._state._stopped.set()
+            return None
+
+        message = self._messages.pop(0)
+        if isinstance(message, Exception):
+            raise message
+
+        return message
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def cached_state() -> CachedRedisState:
+    state = CachedRedisState(StateOptions(state_type=StateTypes.CACHED_REDIS, key_prefix="foo-", max_entries=10))
+    state._internal_state = _FakeRedis()  # type: ignore
+    state._listen(_FakePubSub(state, [{"type": "psubscribe"}]))  # type: ignore
+    return state
+
+
+def test_cached_redis_state(cached_state):
+    fake_redis = cached_state.internal_state
+    cached_state.set("a", b"1")
+    fake_redis.values["foo-b"] = b"2"
+
+    assert cached_state.get("a") == b"1"
+    assert cached_state.get("a") == b"1"
+    assert cached_state.mget(["a", "b", "c"]) == [b"1", b"2", None]
+    assert cached_state.mget(["a", "b"]) == [b"1", b"2"]
+    assert fake_redis.reads == 2
+    assert cached_state.near_cache_stats["entries"] == 2
+
+    cached_state.set("a", b"3")
+    assert cached_state.get("a") == b"3"
+    assert fake_redis.reads == 3
+
+
+def test_cached_redis_state_copies(cached_state):
+    fake_redis = cached_state.internal_state
+    fake_redis.values["foo-h"] = {b"x": b"1"}
+
+    cached_state.hgetall("h")[b"x"] = b"2"
+    cached_state.hgetall("h")[b"y"] = b"3"
+
+    assert cached_state.hgetall("h") == {b"x": b"1"}
+    assert fake_redis.reads == 1
+
+
+def test_cached_redis_state_pipeline(monkeypatch):
+    sent = []
+
+    def _execute(self, raise_on_error=True):
+        sent.append([args for args, _ in self.command_stack])
+        return [[b"1", b"2"], True]
+
+    monkeypatch.setattr(redis.client.Pipeline, "execute", _execute)
+
+    state = CachedRedisState(
+        StateOptions(state_type=StateTypes.CACHED_REDIS, key_prefix="foo-", host="localhost", port="6379")
+    )
+    # Connections are only opened on execute()
+    state._internal_state = redis.Redis()
+    state._listening.add(0)
+    with state.pipeline() as pipe:
+        res = pipe.mget(["a", "b"]).get("c").execute()
+
+    # Pipelines bypass the near-cache
+    assert res == [[b"1", b"2"], True]
+    assert sent == [[("MGET", "foo-a", "foo-b"), ("GET", "foo-c")]]
+    assert state.near_cache_stats["entries"] == 0
+
+
+def test_cached_redis_state_notifications(cached_state):
+    fake_redis = cached_state.internal_state
+    fake_redis.values["foo-a"] = b"1"
+    assert cached_state.get("a") == b"1"
+
+    # Written by another replica
+    fake_redis.values["foo-a"] = b"2"
+    assert cached_state.get("a") == b"1"
+
+    cached_state._stopped.clear()
+    cached_state._listen(_FakePubSub(cached_state, [{"type": "pmessage", "channel": b"__keyspace@0__:foo-a"}]))
+    assert cached_state.get("a") == b"2"
+
+    # Notifications may get lost while disconnected
+    cached_state._stopped.clear()
+    cached_state._listen(_FakePubSub(cached_state, [redis.ConnectionError()]))
+    fake_redis.values["foo-a"] = b"3"
+    assert cached_state.get("a") == b"3"
+    assert cached_state.near_cache_stats["entries"] == 0
@@ -1,6 +1,10 @@
+import asyncio
 import copy
+import gc
+import os
 from inspect import iscoroutine
 
+import numpy as np
 import pytest
 from mlserver.codecs import NumpyCodec
 from mlserver.settings import ModelSettings
@@ -8,8 +12,19 @@ from mlserver.types import InferenceRequest, RequestInput
 from pytest_cases import fixture, parametrize_with_cases
 from pytest_cases.common_pytest_lazy_values import is_lazy
 
+from tempo import ModelFramework, mlserver, model
 from tempo.mlserver import InferenceRuntime
 from tempo.serve.base import BaseModel
+from tempo.serve.metadata import (
+    BatchingOptions,
+    DockerOptions,
+    ExecutorOptions,
+    ExecutorTypes,
+    InsightRequestModes,
+    InsightsOptions,
+    InsightsSamplingTypes,
+    InsightsTypes,
+)
 
 from .test_mlserver_cases import case_wrapped_class
 
@@ -75,3 +90,147 @@ async def test_load_wrapped_class(inference_pipeline_class, inference_request: I
 
     assert inference_pipeline_class.counter == 1
     assert runtime._model._user_func.__self__.counter == 0  # type: ignore
+
+
+async def test_predict_batching(load_runtime):
+    @model(name="batched-model", platform=ModelFramework.Custom)
+    def _batched_model(payload: np.ndarray) -> np.ndarray:
+        # Return the size of the batch seen by the model
+        return np.full_like(payload, payload.shape[0])
+
+    runtime_options = DockerOptions(batching_options=BatchingOptions(max_batch_size=4, max_wait_ms=1000))
+    runtime = await load_runtime(_batched_model, runtime_options)
+
+    requests = [
+        InferenceRequest(inputs=[RequestInput(name="payload", shape=[2, 2], data=[1, 2, 3, 4], datatype="FP64")])
+        for _ in range(2)
+    ]
+    responses = await asyncio.gather(*[runtime.predict(request) for request in requests])
+
+    for res in responses:
+        assert res.outputs[0].shape == [2, 2]
+        assert res.outputs[0].data.__root__ == [4] * 4
+
+
+async def test_predict_batching_cancelled(load_runtime):
+    @model(name="batched-model", platform=ModelFramework.Custom)
+    def _batched_model(payload: np.ndarray) -> np.ndarray:
+        return payload
+
+    runtime_options = DockerOptions(batching_options=BatchingOptions(max_batch_size=4, max_wait_ms=50))
+    runtime = await load_runtime(_batched_model, runtime_options)
+
+    request = InferenceRequest(inputs=[RequestInput(name="payload", shape=[1, 2], data=[1, 2], datatype="FP64")])
+    leader = asyncio.create_task(runtime.predict(request))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(runtime.predict(request))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    # Requests batched with a cancelled one (e.g. whose client disconnected)
+    # still get their response
+    res = await asyncio.wait_for(follower, timeout=5)
+    assert res.outputs[0].data.__root__ == [1, 2]
+    assert leader.cancelled()
+
+    assert runtime._batcher._batches == {}  # type: ignore
+
+
+@pytest.mark.parametrize(
+    "executor_type, same_process, loaded_in_parent",
+    [
+        (ExecutorTypes.THREAD, True, True),
+        (ExecutorTypes.PROCESS, False, False),
+        (ExecutorTypes.FORK, False, True),
+    ],
+)
+async def test_predict_executor(load_runtime, executor_type, same_process, loaded_in_parent):
+    @model(name="sync-model", platform=ModelFramework.Custom)
+    def _sync_model(payload: np.ndarray) -> np.ndarray:
+        return np.array([os.getpid(), _sync_model.context.loaded_pid])
+
+    @_sync_model.loadmethod
+    def _load():
+        _sync_model.context.loaded_pid = os.getpid()
+
+    executor_options = ExecutorOptions(executor_type=executor_type, max_workers=1)
+    runtime = await load_runtime(_sync_model, DockerOptions(executor_options=executor_options))
+
+    request = InferenceRequest(inputs=[RequestInput(name="payload", shape=[2], data=[1, 2], datatype="FP64")])
+    res = await runtime.predict(request)
+    await runtime.unload()
+
+    pid, loaded_pid = res.outputs[0].data.__root__
+    assert (pid == os.getpid()) == same_process
+    assert (loaded_pid == os.getpid()) == loaded_in_parent
+    assert runtime._executor_queue_depth == 0
+
+
+@pytest.mark.parametrize("executor_type", [ExecutorTypes.PROCESS, ExecutorTypes.FORK])
+async def test_predict_executor_async_insights(load_runtime, executor_type):
+    @model(name="sync-model", platform=ModelFramework.Custom)
+    def _sync_model(payload: np.ndarray) -> np.ndarray:
+        return payload
+
+    # Nothing listens on the insights endpoint, which only needs to be set
+    runtime_options = DockerOptions(
+        executor_options=ExecutorOptions(executor_type=executor_type, max_workers=1),
+        insights_options=InsightsOptions(worker_endpoint="http://127.0.0.1:1/", in_asyncio=True),
+    )
+    runtime = await load_runtime(_sync_model, runtime_options)
+
+    request = InferenceRequest(inputs=[RequestInput(name="payload", shape=[2], data=[1, 2], datatype="FP64")])
+    res = await runtime.predict(request)
+    await runtime.unload()
+
+    assert res.outputs[0].data.__root__ == [1, 2]
+
+
+async def test_fork_workers(load_runtime):
+    @model(name="sync-model", platform=ModelFramework.Custom)
+    def _sync_model(payload: np.ndarray) -> np.ndarray:
+        return np.array([os.getpid()])
+
+    executor_options = ExecutorOptions(executor_type=ExecutorTypes.FORK, max_workers=2)
+    runtime = await load_runtime(_sync_model, DockerOptions(executor_options=executor_options))
+
+    # All workers get forked at load time, without going through the
+    # module's globals
+    assert len(runtime._executor._processes) == 2  # type: ignore
+    assert mlserver._worker_model is None
+    assert gc.get_freeze_count() > 0
+
+    await runtime.unload()
+    assert gc.get_freeze_count() == 0
+
+
+@pytest.mark.parametrize(
+    "mode_type, sample_rate, expected",
+    [
+        (InsightRequestModes.NONE, 1.0, []),
+        (InsightRequestModes.REQUEST, 1.0, [InsightsTypes.INFER_REQUEST] * 4),
+        (InsightRequestModes.ALL, 1.0, [InsightsTypes.INFER_REQUEST, InsightsTypes.INFER_RESPONSE] * 4),
+        (InsightRequestModes.ALL, 0.0, []),
+    ],
+)
+async def test_predict_insights_sampling(monkeypatch, load_runtime, mode_type, sample_rate, expected):
+    @model(name="logged-model", platform=ModelFramework.Custom)
+    def _logged_model(payload: np.ndarray) -> np.ndarray:
+        return payload
+
+    insights_options = InsightsOptions(
+        mode_type=mode_type, sample_rate=sample_rate, sampling_type=InsightsSamplingTypes.REQUEST_ID
+    )
+    runtime = await load_runtime(_logged_model, DockerOptions(insights_options=insights_options))
+
+    logged = []
+    monkeypatch.setattr(
+        runtime.insights_manager, "log", lambda data, insights_type: logged.append(InsightsTypes(insights_type))
+    )
+    for idx in range(4):
+        request = InferenceRequest(
+            id=f"request-{idx}", inputs=[RequestInput(name="payload", shape=[2], data=[1, 2], datatype="FP64")]
+        )
+        await runtime.predict(request)
+
+    assert logged == expected